@@ -15,7 +15,7 @@ from instrument.session_logs import logger
 logger.info(__file__)
 
 from .nxwriter_usaxs import NXWriterUascan
-from ..framework import RE, callback_db
+from ..framework import RE, callback_db, queued_subscription
 
 nxwriter = NXWriterUascan()
-callback_db['nxwriter'] = RE.subscribe(nxwriter.receiver)
+callback_db['nxwriter'] = queued_subscription(RE, nxwriter.receiver, 'nxwriter')
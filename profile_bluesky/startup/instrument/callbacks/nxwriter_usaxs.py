@@ -7,6 +7,7 @@ to replace ``instrument.framework.callbacks.newSpecFile()``
 """
 
 __all__ = [
+    "benchmark_column_buffers",
     # "NXWriterFlyScan",    # not yet tested
     "NXWriterUascan",
     # "NXWriterSaxsWaxs",    # not yet tested
@@ -16,14 +17,110 @@ from ..session_logs import logger
 logger.info(__file__)
 
 from apstools.filewriters import NXWriterAPS
+import datetime
+import event_model
+import h5py
 import numpy as np
 import os
+import tempfile
+import time
+import tracemalloc
 
 from ..devices import terms
 from ..devices.user_data import user_data
 from ..utils.cleanup_text import cleanupText
 from ..utils.setup_new_user import techniqueSubdirectory
 
+# HDF5 data types of streamed datasets, by descriptor dtype
+STREAMING_DTYPES = dict(
+    boolean="?",
+    integer="i8",
+    number="f8",
+    string=h5py.string_dtype(),
+)
+# numpy data types of column buffers (strings are kept in lists)
+COLUMN_DTYPES = dict(
+    boolean="?",
+    integer="i8",
+    number="f8",
+)
+
+
+class ColumnBuffer(object):
+    """
+    Values of one key (or its timestamps), in a numpy array.
+
+    ``append()`` and ``extend()`` add to a list (as fast as a list).
+    ``store()`` moves the values from the list to the array (the
+    writer calls it every ``chunk`` events).  The array doubles
+    in size when full.  If a value does not fit the data type
+    (such as a text or ``None`` for a number, a fraction or a too
+    large number for an integer, an array of another length), the
+    array changes to a 1-D ``object`` array, one value per event.
+    """
+
+    chunk = 256
+
+    def __init__(self, dtype, shape=()):
+        self._array = np.empty((self.chunk,) + tuple(shape), dtype=dtype)
+        self._length = 0        # values in the array
+        self._pending = []      # values not yet in the array
+        self.append = self._pending.append
+        self.extend = self._pending.extend
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array() if dtype is None else self.array().astype(dtype)
+
+    def __getitem__(self, item):
+        return self.array()[item]
+
+    def __len__(self):
+        return self._length + len(self._pending)
+
+    def array(self):
+        """The values (a view, not a copy)."""
+        self.store()
+        return self._array[:self._length]
+
+    def store(self):
+        """Move the values from the list to the array."""
+        n, m = self._length, len(self._pending)
+        if m == 0:
+            return
+        if n + m > len(self._array):
+            shape = (max(2*n, n+m),) + self._array.shape[1:]
+            bigger = np.empty(shape, dtype=self._array.dtype)
+            bigger[:n] = self._array[:n]
+            self._array = bigger
+        try:
+            values = np.array(self._pending)
+            if self._array.dtype.kind in "biuf" and values.dtype.kind not in "biuf":
+                # such as None (would be NaN) or text
+                raise ValueError(f"not a number: {values.dtype}")
+            if self._array.dtype.kind in "biu":
+                # integer (or boolean) array: a float (or large number) must not change
+                with np.errstate(invalid="ignore"):     # NaN: not equal, below
+                    cast = values.astype(self._array.dtype)
+                if not np.array_equal(cast, values):
+                    raise ValueError(f"values change as {self._array.dtype}")
+                values = cast
+            self._array[n:n+m] = values
+        except (OverflowError, TypeError, ValueError):
+            self._to_objects_()
+            for i, value in enumerate(self._pending):
+                self._array[n+i] = value
+        self._length = n + m
+        self._pending.clear()     # same list: append & extend are bound to it
+
+    def _to_objects_(self):
+        """Change to a 1-D object array (each item: the value of one event)."""
+        if self._array.dtype == object and self._array.ndim == 1:
+            return
+        objects = np.empty(len(self._array), dtype=object)
+        for i in range(self._length):
+            objects[i] = self._array[i]
+        self._array = objects
+
 
 class OurCustomNXWriterBase(NXWriterAPS):
     """
@@ -56,12 +153,50 @@ class OurCustomNXWriterBase(NXWriterAPS):
                     # constants and links to baseline start values
             sample:NXsample
                 # links to metadata and baseline start values
+
+    Streaming (when ``streaming = True``)
+
+    The file is created (HDF5 ``libver="latest"``) by the ``start``
+    document.  Each ``descriptor`` creates resizable datasets
+    (``value`` and ``EPOCH``) for its keys, each ``event`` (or
+    ``event_page``) is appended to them.  Memory does not grow with
+    the run.  The first event of the ``swmr_stream`` stream (its
+    descriptor comes after the baseline's) switches the file to SWMR
+    mode (single writer, multiple readers) and the file is flushed at
+    least every ``streaming_flush_s`` seconds so it can be read during
+    the scan (open it with ``h5py.File(name, "r", libver="latest",
+    swmr=True)``, ``refresh()`` a dataset to see new data).  SWMR mode
+    allows no new datasets: a stream described after that event is
+    collected in memory.  The ``stop`` document reopens the file (not
+    SWMR), writes everything else and closes the file.  Keys with
+    external data (or unknown shape) are collected in memory and
+    written at the end, as when not streaming.  Text is written as
+    variable-length UTF-8 strings whether streaming or not.
     """
 
     instrument_name = 'APS 9-ID-C USAXS'
     supported_plans = ("name", "the", "supported", "plans")
     file_extension = "h5"       # no dot
     config_version = "1.0"
+    streaming = False           # True: write each event as it arrives
+    streaming_flush_s = 5       # flush the streaming file this often (s)
+    swmr_stream = "primary"     # its first event starts SWMR mode
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.xref["event_page"] = self.event_page
+
+    def clear(self):
+        super().clear()
+        self._streamed_ = {}    # descriptor uid: {key: (value, EPOCH) datasets}
+        self._swmr_uid_ = None  # descriptor uid of swmr_stream
+
+    def create_NX_group(self, parent, specification):
+        """Create the group (or reuse it, if created while streaming)."""
+        local_address = specification.split(":")[0]
+        if self.streaming and local_address in parent:
+            return parent[local_address]
+        return super().create_NX_group(parent, specification)
 
     def write_entry(self):
         import apstools
@@ -93,24 +228,251 @@ class OurCustomNXWriterBase(NXWriterAPS):
                 ".h5"
             )
             self.file_name = os.path.join(path, fname)
+            if self.streaming:
+                self.open_streaming_file()
         else:
             self.scanning = False
             self.file_name = None
 
+    def open_streaming_file(self):
+        """Create the file now, events will be written as they arrive."""
+        if self.root is not None:
+            logger.warning("closing unfinished file: %s", self.root.filename)
+            self.root.close()
+        self.root = h5py.File(self.file_name, "w", libver="latest")
+        self.root.attrs["default"] = "entry"
+        group = self.root
+        for specification in "entry:NXentry instrument:NXinstrument bluesky:NXnote streams:NXnote".split():
+            group = super().create_NX_group(group, specification)
+        self._last_flush = time.time()
+        logger.info("streaming NeXus file: %s", self.file_name)
+
+    def descriptor(self, doc):
+        super().descriptor(doc)
+        if not self.scanning:
+            return
+        self.use_column_buffers(doc["uid"])
+        if self.root is None:
+            return      # not streaming
+        stream, uid = doc["name"], doc["uid"]
+        if len(self.streams[stream]) > 1:
+            logger.warning("stream %s has more than one descriptor, not streamed", stream)
+            return
+        if self.root.swmr_mode:
+            logger.info("stream %s described after SWMR start, not streamed", stream)
+            return
+
+        streams = self.root["/entry/instrument/bluesky/streams"]
+        group = super().create_NX_group(streams, f"{stream}:NXnote")
+        group.attrs["uid"] = uid
+        if stream == self.swmr_stream:
+            self._swmr_uid_ = uid
+        streamed = self._streamed_[uid] = {}
+        for k, v in self.acquisitions[uid]["data"].items():
+            dtype = STREAMING_DTYPES.get(v["dtype"])
+            shape = tuple(v["shape"] or [])
+            if v["dtype"] == "array" and len(shape) > 0:
+                dtype = "f8"
+            if v["external"] or dtype is None:
+                continue    # collect in memory, write at stop
+
+            subgroup = super().create_NX_group(group, k+":NXdata")
+            subgroup.attrs["signal"] = "value"
+            subgroup.attrs["axes"] = ["time",]
+            ds = subgroup.create_dataset(
+                "value", shape=(0,)+shape, maxshape=(None,)+shape,
+                dtype=dtype, chunks=True)
+            ds.attrs["target"] = ds.name
+            self.add_dataset_attributes(ds, v, k)
+            epoch = subgroup.create_dataset(
+                "EPOCH", shape=(0,), maxshape=(None,), dtype="f8", chunks=True)
+            epoch.attrs["units"] = "s"
+            epoch.attrs["long_name"] = "epoch time (s)"
+            epoch.attrs["target"] = epoch.name
+            streamed[k] = (ds, epoch)
+
+    def event(self, doc):
+        if doc["descriptor"] not in self._streamed_:
+            super().event(doc)
+            if doc["seq_num"] % ColumnBuffer.chunk == 0:
+                self.store_column_buffers(doc["descriptor"])
+            return
+        self.event_page(dict(
+            descriptor=doc["descriptor"],
+            data={k: [v] for k, v in doc["data"].items()},
+            timestamps={k: [v] for k, v in doc["timestamps"].items()},
+        ))
+
+    def event_page(self, doc):
+        """several "rows" of data"""
+        if not self.scanning:
+            return
+        streamed = self._streamed_.get(doc["descriptor"])
+        if streamed is None:
+            # not streaming: one event at a time
+            for i in range(len(doc["seq_num"])):
+                super().event(dict(
+                    descriptor=doc["descriptor"],
+                    data={k: v[i] for k, v in doc["data"].items()},
+                    timestamps={k: v[i] for k, v in doc["timestamps"].items()},
+                ))
+            self.store_column_buffers(doc["descriptor"])
+            return
+
+        if doc["descriptor"] == self._swmr_uid_ and not self.root.swmr_mode:
+            # datasets of the streams described so far are created:
+            # readers may open the file
+            self.root.swmr_mode = True
+        data = self.acquisitions[doc["descriptor"]]["data"]
+        for k, values in doc["data"].items():
+            if k in streamed:
+                ds, epoch = streamed[k]
+                n, m = len(ds), len(values)
+                if ds.dtype.kind == "O":
+                    values = [value or "" for value in values]
+                ds.resize(n + m, axis=0)
+                ds[n:] = values
+                epoch.resize(n + m, axis=0)
+                epoch[n:] = doc["timestamps"][k]
+            elif k in data:
+                data[k]["data"].extend(values)
+                data[k]["time"].extend(doc["timestamps"][k])
+
+        if time.time() - self._last_flush > self.streaming_flush_s:
+            self.root.flush()
+            self._last_flush = time.time()
+
+    def bulk_events(self, doc):
+        """events of several descriptors (from ``collect``)"""
+        for page in event_model.bulk_events_to_event_pages(doc):
+            self.event_page(page)
+
+    def store_column_buffers(self, uid):
+        """Move collected values from lists to arrays."""
+        acquisition = self.acquisitions.get(uid)
+        if acquisition is None:
+            return
+        for v in acquisition["data"].values():
+            for buffer in (v["data"], v["time"]):
+                if isinstance(buffer, ColumnBuffer):
+                    buffer.store()
+
+    def use_column_buffers(self, uid):
+        """Collect numbers (and all timestamps) in arrays, not lists."""
+        for k, v in self.acquisitions[uid]["data"].items():
+            v["time"] = ColumnBuffer("f8")
+            dtype = COLUMN_DTYPES.get(v["dtype"])
+            if v["dtype"] == "array" and len(v["shape"] or []) > 0:
+                dtype = "f8"
+            if dtype is not None and not v["external"]:
+                v["data"] = ColumnBuffer(dtype, v["shape"] or [])
+
     def writer(self):
         "write the data if this plan is supported"
         plan = self.metadata.get("plan_name")
         if plan not in self.supported_plans:
             return
 
-        super().writer()
+        if self.root is None:
+            super().writer()
+            return
+
+        # streaming: write the rest and close the file
+        fname = self.file_name
+        try:
+            self.reopen_streaming_file()
+            self.write_root(fname)
+        finally:
+            self.root.close()
+            self.root = None
+            self._streamed_ = {}
+        logger.info(f"wrote NeXus file: {fname}")
+        self.output_nexus_file = fname
+
+    def reopen_streaming_file(self):
+        """Reopen the file, not in SWMR mode, to add groups and datasets."""
+        if not self.root.swmr_mode:
+            return
+        names = {
+            uid: {k: (ds.name, epoch.name) for k, (ds, epoch) in streamed.items()}
+            for uid, streamed in self._streamed_.items()
+        }
+        self.root.close()
+        self.root = h5py.File(self.file_name, "r+")
+        self._streamed_ = {
+            uid: {k: (self.root[ds], self.root[epoch]) for k, (ds, epoch) in streamed.items()}
+            for uid, streamed in names.items()
+        }
+
+    def write_streams(self, parent):
+        """
+        group: /entry/instrument/bluesky/streams:NXnote
+
+        When streaming, complete the streamed datasets and write
+        the keys collected in memory.
+        """
+        if not self._streamed_:
+            return super().write_streams(parent)
+
+        bluesky = self.create_NX_group(parent, "streams:NXnote")
+        for stream_name, uids in self.streams.items():
+            group = self.create_NX_group(bluesky, stream_name+":NXnote")
+            group.attrs["uid"] = uids[0]
+            acquisition = self.acquisitions[uids[0]]
+            streamed = self._streamed_.get(uids[0], {})
+            for k, v in acquisition["data"].items():
+                if k in streamed:
+                    ds, epoch = streamed[k]
+                    subgroup = ds.parent
+                    t = epoch[()]
+                    if stream_name == "baseline" and len(ds) > 0:
+                        for key, item in dict(value_start=0, value_end=-1).items():
+                            ds_item = subgroup.create_dataset(key, data=ds[item], dtype=ds.dtype)
+                            self.add_dataset_attributes(ds_item, v, k)
+                            ds_item.attrs["target"] = ds_item.name
+                else:
+                    subgroup = self.create_NX_group(group, k+":NXdata")
+                    if v["external"]:
+                        self.write_stream_external(parent, v["data"], subgroup, stream_name, k, v)
+                    else:
+                        self.write_stream_internal(parent, v["data"], subgroup, stream_name, k, v)
+                    t = np.array(v["time"])
+                    epoch = subgroup.create_dataset("EPOCH", data=t)
+                    epoch.attrs["units"] = "s"
+                    epoch.attrs["long_name"] = "epoch time (s)"
+                    epoch.attrs["target"] = epoch.name
+
+                if len(t) == 0:
+                    continue
+                t_start = t[0]
+                ds = subgroup.create_dataset("time", data=t - t_start)
+                ds.attrs["units"] = "s"
+                ds.attrs["long_name"] = "time since first data (s)"
+                ds.attrs["target"] = ds.name
+                ds.attrs["start_time"] = t_start
+                ds.attrs["start_time_iso"] = datetime.datetime.fromtimestamp(t_start).isoformat()
+
+            # link images to parent names
+            for k in group:
+                if k.endswith("_image") and k[:-6] not in group:
+                    group[k[:-6]] = group[k]
+
+        return bluesky
 
     def write_stream_internal(self, parent, d, subgroup, stream_name, k, v):
         subgroup.attrs["signal"] = "value"
         subgroup.attrs["axes"] = ["time",]
-        if isinstance(d, list) and len(d) > 0:
+        if isinstance(d, ColumnBuffer):
+            d = d.array()
+            if d.dtype == object:
+                try:
+                    d = np.array(d.tolist())
+                except ValueError:
+                    pass    # arrays of different lengths: not written (logged below)
+        elif isinstance(d, list) and len(d) > 0:
             if v["dtype"] in ("string",):
-                d = self.h5string(d)
+                # variable-length UTF-8, as when streaming
+                d = np.array([t or "" for t in d], dtype=STREAMING_DTYPES["string"])
             elif v["dtype"] in ("integer", "number"):
                 d = np.array(d)
         try:
@@ -194,6 +556,7 @@ class NXWriterUascan(OurCustomNXWriterBase):
 
     nxdata_signal = "PD_USAXS"
     nxdata_signal_axes = ["a_stage_r",]
+    streaming = True
     supported_plans = ("uascan", )
 
     # convention: methods written in alphabetical order
@@ -209,3 +572,69 @@ class NXWriterUascan(OurCustomNXWriterBase):
             slit["y_gap"] = self.get_stream_link(f"{pre}_v_size")
             for key in "x y".split():
                 slit[key] = self.get_stream_link(f"{pre}_{key}")
+
+
+def benchmark_column_buffers(num_events=10000, num_keys=100, print_enable=True):
+    """
+    Memory and time to collect and write one stream: lists vs. column buffers.
+
+    Simulates ``num_events`` events of ``num_keys`` numbers (each
+    event is a new document, as from the RunEngine), collects the
+    value and timestamp of each key, then writes each key (values &
+    timestamps) to a temporary HDF5 file.  Memory is measured
+    (with ``tracemalloc``) in a separate pass from the times.
+
+    RETURNS
+
+    pyRestTable.Table with peak memory (MB), collect and write times (s)
+    """
+    import pyRestTable
+
+    keys = [f"key{i:03d}" for i in range(num_keys)]
+    rng = np.random.default_rng(0)
+
+    def collect(method):
+        if method == "lists":
+            columns = {k: ([], []) for k in keys}
+        else:
+            columns = {k: (ColumnBuffer("f8"), ColumnBuffer("f8")) for k in keys}
+        for i in range(num_events):
+            row = rng.random(num_keys).tolist()
+            data = dict(zip(keys, row))
+            timestamps = {k: 1.6e9 + i + v for k, v in data.items()}
+            for k, value in data.items():
+                columns[k][0].append(value)
+                columns[k][1].append(timestamps[k])
+            if method != "lists" and (i + 1) % ColumnBuffer.chunk == 0:
+                for values, times in columns.values():
+                    values.store()
+                    times.store()
+        return columns
+
+    def write(columns, fname):
+        with h5py.File(fname, "w") as root:
+            for k, (values, times) in columns.items():
+                group = root.create_group(k)
+                group.create_dataset("value", data=np.array(values))
+                group.create_dataset("EPOCH", data=np.array(times))
+
+    t = pyRestTable.Table()
+    t.labels = "method peak_MB collect_s write_s".split()
+    with tempfile.TemporaryDirectory() as path:
+        fname = os.path.join(path, "benchmark.h5")
+        for method in ("lists", "column buffers"):
+            t0 = time.time()
+            columns = collect(method)
+            t1 = time.time()
+            write(columns, fname)
+            t2 = time.time()
+            del columns
+
+            tracemalloc.start()
+            write(collect(method), fname)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            t.addRow((method, f"{peak/1e6:.1f}", f"{t1-t0:.3f}", f"{t2-t1:.3f}"))
+    if print_enable:
+        print(t)
+    return t
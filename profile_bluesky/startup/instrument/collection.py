@@ -6,6 +6,8 @@ configure for data collection in a console session
 from .session_logs import logger
 logger.info(__file__)
 
+from .startup_timing import *
+
 from . import mpl
 
 logger.info("bluesky framework")
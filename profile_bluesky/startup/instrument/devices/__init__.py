@@ -11,6 +11,7 @@ from .sample_data import *
 from .user_data import *
 
 # do these first
+from .device_connections import *
 from .scalers import *
 from .shutters import *
 from .stages import *
@@ -31,6 +32,7 @@ from .slits import *
 from .struck3820 import *
 from .suspenders import *
 from .trajectories import *
+from .tune_scheduler import *
 from .usaxs_fly_scan import *
 
 # finally these area detectors
@@ -20,6 +20,7 @@ from .area_detector_common import area_detector_EPICS_PV_prefix
 from .area_detector_common import DATABROKER_ROOT_PATH
 from .area_detector_common import EpicsDefinesHDF5FileNames
 from .area_detector_common import _validate_AD_FileWriter_path_
+from .device_connections import device_connections
 
 # path for HDF5 files (as seen by EPICS area detector HDF5 plugin)
 # path seen by detector IOC
@@ -60,6 +61,7 @@ try:
         prefix, name="alta_det",
         labels=["camera", "area_detector"])
     alta_det.read_attrs.append("hdf1")
+    device_connections.add(alta_det)
 except TimeoutError as exc_obj:
     msg = f"Timeout connecting with {nm} ({prefix})"
     logger.warning(msg)
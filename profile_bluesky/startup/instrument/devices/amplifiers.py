@@ -65,7 +65,11 @@ __all__ = """
     controls_list_UPD_I0_I00_TRD
 
     autoscale_amplifiers
+    benchmark_autoscale
+    dark_current_cache
+    DarkCurrentCache
     measure_background
+    measure_background_if_needed
     """.split()
 
 
@@ -74,9 +78,13 @@ logger.info(__file__)
 
 from apstools.synApps import SwaitRecord
 from bluesky import plan_stubs as bps
+from bluesky.utils import PersistentDict
 from collections import OrderedDict
 import epics
 import numpy as np
+import os
+import pyRestTable
+import time
 from ophyd import Component, Device, Signal
 from ophyd import EpicsSignal, EpicsSignalRO
 from ophyd import DynamicDeviceComponent, FormattedComponent
@@ -85,13 +93,17 @@ from .override_ScalerCH import ScalerCH, ScalerChannel
 from ophyd.utils import OrderedDefaultDict
 
 from .aps_source import aps
-from ..framework import RE, sd
+from ..framework import RE, sd, traced_plan
+from ..framework.initialize import get_md_path
 from .scalers import *
 from .scalers import I0_SIGNAL, I00_SIGNAL, UPD_SIGNAL, TRD_SIGNAL
 
 
 NUM_AUTORANGE_GAINS = 5     # common to all autorange sequence programs
+DARK_CURRENT_DIR_NAME = "Bluesky_dark_currents"
 AMPLIFIER_MINIMUM_SETTLING_TIME = 0.01    # reasonable?
+PREDICTIVE_AUTOSCALE = True     # predict gain from one count, then confirm
+PREDICTIVE_AUTOSCALE_TARGET = 0.5   # fraction of max_count_rate
 
 
 def _gain_to_str_(gain):    # convenience function
@@ -452,6 +464,7 @@ def _scaler_background_measurement_(control_list, count_time=0.2, num_readings=8
         )
 
 
+@traced_plan("dark_current")
 def measure_background(controls, shutter=None, count_time=0.2, num_readings=5):
     """
     plan: measure detector backgrounds simultaneously
@@ -473,8 +486,327 @@ def measure_background(controls, shutter=None, count_time=0.2, num_readings=5):
             yield from _scaler_background_measurement_(control_list, count_time, num_readings)
 
 
+class DarkCurrentCache(object):
+    """
+    Remember when (and in what conditions) backgrounds were measured.
+
+    The background values are in the EPICS PVs of each autorange
+    sequence program (``auto.ranges.gainN.background``).  This
+    local store (a ``PersistentDict``) keeps, for each control,
+    the time, count time, and (optional) temperature of its
+    last background measurement.
+
+    A background is *stale* when never measured (by this cache),
+    older than ``max_age_s``, or if the temperature (read from
+    ``temperature_signal``, if provided) has changed by more
+    than ``max_temperature_change``.
+
+    PARAMETERS
+
+    path : str
+        Directory of the local store.
+    """
+
+    max_age_s = 4 * 3600
+    max_temperature_change = 0.5
+    spot_check_sigma = 5        # spot check differs by this many sigma: drift
+    temperature_signal = None   # such as: monochromator.temperature
+
+    def __init__(self, path):
+        self.path = path
+        self._store = None
+
+    @property
+    def store(self):
+        """Local store of background measurements, opened on first use."""
+        if self._store is None:
+            if not os.path.exists(self.path):
+                logger.info("New directory to store dark currents: %s", self.path)
+                os.makedirs(self.path)
+            self._store = PersistentDict(self.path)
+        return self._store
+
+    def temperature(self):
+        if self.temperature_signal is None:
+            return None
+        return self.temperature_signal.get()
+
+    def record(self, control, count_time):
+        """Remember that this control's backgrounds were just measured."""
+        self.store[control.name] = dict(
+            time=time.time(),
+            count_time=count_time,
+            temperature=self.temperature(),
+        )
+
+    def forget(self, control=None):
+        """Mark backgrounds of this control (default: all) stale."""
+        for key in [control.name] if control else list(self.store.keys()):
+            self.store.pop(key, None)
+
+    def stale_reason(self, control, count_time):
+        """Return why backgrounds of this control are stale, or ``None``."""
+        entry = self.store.get(control.name)
+        if entry is None:
+            return "not measured"
+        if entry["count_time"] != count_time:
+            return "different count time"
+        if time.time() - entry["time"] > self.max_age_s:
+            return "too old"
+        t_now, t_then = self.temperature(), entry["temperature"]
+        if t_now is not None and t_then is not None:
+            if abs(t_now - t_then) > self.max_temperature_change:
+                return f"temperature changed from {t_then} to {t_now}"
+        return None
+
+    def report(self, print_enable=True):
+        """Table of the background measurements in the store."""
+        t = pyRestTable.Table()
+        t.labels = "control measured age_s count_time temperature".split()
+        now = time.time()
+        for key, entry in sorted(self.store.items()):
+            t.addRow((
+                key,
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["time"])),
+                f"{now - entry['time']:.0f}",
+                entry["count_time"],
+                entry["temperature"],
+            ))
+        if print_enable:
+            print(t)
+        return t
+
+
+dark_current_cache = DarkCurrentCache(
+    os.path.join(os.path.dirname(get_md_path()), DARK_CURRENT_DIR_NAME)
+)
+
+
+def _scaler_background_spot_check_(control_list, count_time=0.2):
+    """
+    plan: internal: return controls whose background has drifted
+
+    One count at the highest gain (most sensitive to dark current)
+    of each control, compared with its background in EPICS.
+    Scaler and amplifier settings are restored afterwards.
+    """
+    scaler = control_list[0].scaler
+    original = {}
+    original["scaler.preset_time"] = scaler.preset_time.get()
+    original["scaler.auto_count_delay"] = scaler.auto_count_delay.get()
+    yield from bps.mv(
+        scaler.preset_time, count_time,
+        scaler.auto_count_delay, 0
+        )
+
+    settling_time = AMPLIFIER_MINIMUM_SETTLING_TIME
+    ranges = {}
+    for control in control_list:
+        original[control.name] = dict(
+            mode=control.auto.mode.get(),
+            gain_index=control.auto.reqrange.get(),
+        )
+        yield from bps.mv(control.auto.mode, AutorangeSettings.manual)
+        gains = [
+            getattr(control.auto.ranges, f"gain{n}").gain.get()
+            for n in range(NUM_AUTORANGE_GAINS)
+        ]
+        ranges[control.name] = n = int(np.argmax(gains))
+        yield from control.auto.setGain(n)
+        settling_time = max(settling_time, control.femto.settling_time.get())
+    yield from bps.sleep(settling_time)
+    yield from bps.trigger(scaler, wait=True)
+
+    drifted = []
+    for control in control_list:
+        g = getattr(control.auto.ranges, f"gain{ranges[control.name]}")
+        value = control.signal.s.get()
+        background = g.background.get()
+        sigma = max(g.background_error.get(), np.sqrt(max(background, 1)))
+        deviation = abs(value - background) / sigma
+        logger.debug(
+            "%s spot check: %g counts, background %g +/- %g",
+            control.nickname, value, background, sigma)
+        if deviation > dark_current_cache.spot_check_sigma:
+            logger.info(
+                "%s: background drifted (%.1f sigma)", control.nickname, deviation)
+            drifted.append(control)
+
+    for control in control_list:
+        yield from control.auto.setGain(original[control.name]["gain_index"])
+        yield from bps.mv(control.auto.mode, original[control.name]["mode"])
+    yield from bps.mv(
+        scaler.preset_time, original["scaler.preset_time"],
+        scaler.auto_count_delay, original["scaler.auto_count_delay"],
+        )
+    return drifted
+
+
+@traced_plan("dark_current")
+def measure_background_if_needed(controls, shutter=None, count_time=0.2, num_readings=5):
+    """
+    plan: measure detector backgrounds only if stale or drifted
+
+    Backgrounds recorded in ``dark_current_cache`` are used until
+    stale (see ``DarkCurrentCache``).  If none are stale, one quick
+    count (shutter closed) checks for drift.  Only stale or drifted
+    controls are measured, all on one scaler in one gain sweep.
+
+    controls [obj]
+        list (or tuple) of ``DetectorAmplifierAutorangeDevice``
+    """
+    assert isinstance(controls, (tuple, list)), "controls must be a list"
+
+    if shutter is not None:
+        yield from bps.mv(shutter, "close")
+
+    needed = []
+    for control_list in group_controls_by_scaler(controls).values():
+        stale = []
+        for control in control_list:
+            reason = dark_current_cache.stale_reason(control, count_time)
+            if reason is not None:
+                logger.info("%s background: %s", control.nickname, reason)
+                stale.append(control)
+        fresh = [c for c in control_list if c not in stale]
+        if len(fresh) > 0:
+            stale += yield from _scaler_background_spot_check_(fresh, count_time)
+        needed += [c for c in control_list if c in stale]
+
+    if len(needed) == 0:
+        logger.info("Backgrounds are current, not measured again.")
+        return
+
+    yield from measure_background(needed, count_time=count_time, num_readings=num_readings)
+    for control in needed:
+        dark_current_cache.record(control, count_time)
+
+
 _last_autorange_gain_ = OrderedDefaultDict(dict)
 
+
+def _control_count_rate_(control):
+    """internal: count rate (counts/s) of most recent scaler count"""
+    if isinstance(control.signal, ScalerChannel):   # ophyd.ScalerCH
+        return control.signal.s.get() / control.scaler.time.get()
+    elif isinstance(control.signal, EpicsSignalRO): # ophyd.EpicsScaler
+        raise RuntimeError("This scaler needs to divide by time")
+    raise ValueError(f"unexpected control.signal: {control.signal}")
+
+
+def _predict_gain_index_(gains, gain_now, rate, max_rate, target=PREDICTIVE_AUTOSCALE_TARGET):
+    """
+    internal: index of highest gain predicted to count below ``target*max_rate``
+
+    Count rate is proportional to gain (the counts_per_volt of the
+    voltage-to-frequency converter is common to all gains and cancels).
+    Uses the lowest gain if none are predicted to be below the target.
+    """
+    order = np.argsort(gains)       # lowest to highest gain
+    if rate <= 0:
+        return int(order[-1])
+    choice = int(order[0])
+    for i in order:
+        if rate * gains[i] / gain_now <= target * max_rate:
+            choice = int(i)
+    return choice
+
+
+def _scaler_autoscale_predictive_(controls, count_time=0.05, max_iterations=9):
+    """
+    plan: internal: predict amplifier gains from one count, then confirm
+
+    With the gains in manual mode, count once.  From the measured
+    rate and the known gain ladder (``auto.ranges.gainN.gain``),
+    set each amplifier to the highest gain that keeps its rate well
+    below ``max_count_rate``.  Then count once more in automatic mode
+    to confirm the sequence program keeps these gains.
+
+    Falls back to the iterative ``_scaler_autoscale_()`` (starting
+    from the predicted gains) if any detector is saturated on the
+    first count or the confirmation count changes a gain.
+    """
+
+    scaler = controls[0].scaler
+    originals = {}
+
+    originals["preset_time"] = scaler.preset_time.get()
+    originals["delay"] = scaler.delay.get()
+    originals["count_mode"] = scaler.count_mode.get()
+    yield from bps.mv(
+        scaler.preset_time, count_time,
+        scaler.delay, 0.2,
+        scaler.count_mode, "OneShot",
+    )
+
+    def restore():
+        yield from bps.mv(
+            scaler.preset_time, originals["preset_time"],
+            scaler.delay, originals["delay"],
+            scaler.count_mode, originals["count_mode"],
+        )
+
+    last_gain_dict = _last_autorange_gain_[scaler.name]
+
+    # measure at the last known gains, without the sequence program changing them
+    settling_time = AMPLIFIER_MINIMUM_SETTLING_TIME
+    for control in controls:
+        yield from bps.mv(control.auto.mode, AutorangeSettings.manual)
+        gain = last_gain_dict.get(control.auto.gain.name)
+        if gain is not None:    # be cautious, might be unknown
+            yield from control.auto.setGain(gain)
+        settling_time = max(settling_time, control.femto.settling_time.get())
+    yield from bps.sleep(settling_time)
+    yield from bps.trigger(scaler, wait=True)
+
+    saturated = False
+    for control in controls:
+        rate = _control_count_rate_(control)
+        max_rate = control.auto.max_count_rate.get()
+        if rate >= max_rate:
+            saturated = True
+            logger.debug("%s saturated: rate=%g  max=%g", control.nickname, rate, max_rate)
+            continue
+        gains = [
+            getattr(control.auto.ranges, f"gain{n}").gain.get()
+            for n in range(NUM_AUTORANGE_GAINS)
+        ]
+        index = _predict_gain_index_(gains, control.auto.gain.get(), rate, max_rate)
+        logger.debug(
+            "%s: rate=%g at gain=%g, predict gain=%g",
+            control.nickname, rate, control.auto.gain.get(), gains[index])
+        yield from control.auto.setGain(index)
+
+    if not saturated:
+        # confirm: the sequence program should not change any gain now
+        settling_time = AMPLIFIER_MINIMUM_SETTLING_TIME
+        for control in controls:
+            last_gain_dict[control.auto.gain.name] = control.auto.gain.get()
+            yield from bps.mv(control.auto.mode, AutorangeSettings.automatic)
+            settling_time = max(settling_time, control.femto.settling_time.get())
+        yield from bps.sleep(settling_time)
+        yield from bps.trigger(scaler, wait=True)
+
+        confirmed = True
+        for control in controls:
+            gain_now = control.auto.gain.get()
+            confirmed &= gain_now == last_gain_dict[control.auto.gain.name]
+            confirmed &= _control_count_rate_(control) <= control.auto.max_count_rate.get()
+            last_gain_dict[control.auto.gain.name] = gain_now
+        if confirmed:
+            for control in controls:
+                yield from bps.mv(control.auto.mode, "manual")
+            yield from restore()
+            logger.debug("predicted gains confirmed")
+            return
+
+    logger.debug("predicted gains not confirmed, autoscale by iteration")
+    for control in controls:
+        last_gain_dict[control.auto.gain.name] = control.auto.gain.get()
+    yield from restore()
+    yield from _scaler_autoscale_(controls, count_time=count_time, max_iterations=max_iterations)
+
+
 def _scaler_autoscale_(controls, count_time=0.05, max_iterations=9):
     """plan: internal: autoscale amplifiers for signals sharing a common scaler"""
     global _last_autorange_gain_
@@ -524,13 +856,7 @@ def _scaler_autoscale_(controls, count_time=0.05, max_iterations=9):
 
             # are we topped up on any detector?
             max_rate = control.auto.max_count_rate.get()
-            if isinstance(control.signal, ScalerChannel):   # ophyd.ScalerCH
-                actual_rate = control.signal.s.get() / control.scaler.time.get()
-            elif isinstance(control.signal, EpicsSignalRO): # ophyd.EpicsScaler
-                # actual_rate = control.signal.get()      # FIXME
-                raise RuntimeError("This scaler needs to divide by time")
-            else:
-                raise ValueError(f"unexpected control.signal: {control.signal}")
+            actual_rate = _control_count_rate_(control)
             converged.append(actual_rate <= max_rate)
             logger.debug(f"gain={gain_now}  rate: {actual_rate}  max: {max_rate}  converged={converged}")
 
@@ -556,6 +882,7 @@ def _scaler_autoscale_(controls, count_time=0.05, max_iterations=9):
             raise AutoscaleError(msg)
 
 
+@traced_plan("autoscale")
 def autoscale_amplifiers(controls, shutter=None, count_time=0.05, max_iterations=9):
     """
     bluesky plan: autoscale detector amplifiers simultaneously
@@ -576,8 +903,12 @@ def autoscale_amplifiers(controls, shutter=None, count_time=0.05, max_iterations
                 "Autoscaling amplifier for: %s",
                 control_list[0].nickname
             )
+            if PREDICTIVE_AUTOSCALE:
+                autoscale = _scaler_autoscale_predictive_
+            else:
+                autoscale = _scaler_autoscale_
             try:
-                yield from _scaler_autoscale_(
+                yield from autoscale(
                     control_list,
                     count_time=count_time,
                     max_iterations=max_iterations)
@@ -593,6 +924,92 @@ def autoscale_amplifiers(controls, shutter=None, count_time=0.05, max_iterations
                 )
 
 
+
+def benchmark_autoscale(num_trials=1000, count_time=0.05, delay=0.2,
+                        settling_time=0.08, max_count_rate=950000,
+                        saturation_rate=1.0e6, gains=(1e4, 1e5, 1e6, 1e7, 1e8),
+                        seed=None, print_enable=True):
+    """
+    compare iterative & predictive autoscale with a simulated detector
+
+    The simulated photocurrent is random (log-uniform, from dark
+    current to near the limit of the lowest gain).  The starting gain is
+    random.  Counts are Poisson and the voltage-to-frequency converter
+    saturates at ``saturation_rate``.  The simulated sequence program
+    steps the gain one range per count: down if the rate is over
+    ``max_count_rate``, up if under ``max_count_rate/25``.
+    Each count costs ``count_time + delay`` plus ``settling_time``
+    after each gain change.
+
+    RETURNS
+
+    pyRestTable.Table with the mean & maximum counts and time of each method
+    """
+    rng = np.random.default_rng(seed)
+    gains = np.array(gains, dtype=float)
+    top = len(gains) - 1
+    low_rate = max_count_rate / 25
+
+    def count(current, g):
+        rate = rng.poisson(current * gains[g] * count_time) / count_time
+        return min(rate, saturation_rate)
+
+    def ioc_step(rate, g):
+        if rate > max_count_rate and g > 0:
+            return g - 1
+        if rate < low_rate and g < top:
+            return g + 1
+        return g
+
+    def iterative(current, g, n=0, t=0.0, max_iterations=50):
+        for _ in range(max_iterations):
+            rate = count(current, g)
+            n, t = n + 1, t + count_time + delay
+            g_next = ioc_step(rate, g)
+            if g_next == g and rate <= max_count_rate:
+                break
+            g = g_next
+            t += settling_time
+        return n, t
+
+    def predictive(current, g):
+        rate = count(current, g)
+        n, t = 1, count_time + delay
+        if rate < max_count_rate:
+            g_new = _predict_gain_index_(gains, gains[g], rate, max_count_rate)
+            t += settling_time if g_new != g else 0
+            g = g_new
+            rate = count(current, g)
+            n, t = n + 1, t + count_time + delay
+            if ioc_step(rate, g) == g and rate <= max_count_rate:
+                return n, t
+        return iterative(current, g, n, t)
+
+    results = dict(iterative=[], predictive=[])
+    for _ in range(num_trials):
+        current = 10**rng.uniform(-11, np.log10(0.9 * max_count_rate / gains[0]))
+        g = int(rng.integers(len(gains)))
+        results["iterative"].append(iterative(current, g))
+        results["predictive"].append(predictive(current, g))
+
+    table = pyRestTable.Table()
+    table.labels = "method mean_counts max_counts mean_time_s max_time_s saved_s".split()
+    baseline = np.mean([t for n, t in results["iterative"]])
+    for method, values in results.items():
+        n, t = np.array(values).T
+        table.addRow((
+            method,
+            f"{n.mean():.2f}",
+            int(n.max()),
+            f"{t.mean():.3f}",
+            f"{t.max():.3f}",
+            f"{baseline - t.mean():.3f}",
+        ))
+    if print_enable:
+        print(table)
+    return table
+
+
 # ------------
 
 _amplifier_id_upd = epics.caget("9idcLAX:femto:model", as_string=True)
@@ -620,6 +1037,13 @@ sd.baseline.append(upd_autorange_controls)
 sd.baseline.append(trd_autorange_controls)
 sd.baseline.append(I0_autorange_controls)
 sd.baseline.append(I00_autorange_controls)
+# gains & readings change with each count (autoscale): not a reason for a full baseline
+for _controls in (upd_autorange_controls, trd_autorange_controls,
+                  I0_autorange_controls, I00_autorange_controls):
+    sd.untracked += [
+        getattr(_controls, attr)
+        for attr in "reqrange mode selected lurange lucounts lurate lucurrent status updating".split()
+    ]
 
 upd_controls = DetectorAmplifierAutorangeDevice(
     "PD_USAXS",
@@ -634,7 +1058,7 @@ upd_controls = DetectorAmplifierAutorangeDevice(
 upd_photocurrent_calc = SwaitRecord(
     "9idcLAX:USAXS:upd",
     name="upd_photocurrent_calc")
-upd_photocurrent = upd_photocurrent_calc.get()
+upd_photocurrent = upd_photocurrent_calc.val
 
 trd_controls = DetectorAmplifierAutorangeDevice(
     "TR diode",
@@ -649,7 +1073,7 @@ trd_controls = DetectorAmplifierAutorangeDevice(
 trd_photocurrent_calc = SwaitRecord(
     "9idcLAX:USAXS:trd",
     name="trd_photocurrent_calc")
-trd_photocurrent = trd_photocurrent_calc.get()
+trd_photocurrent = trd_photocurrent_calc.val
 
 I0_controls = DetectorAmplifierAutorangeDevice(
     "I0_USAXS",
@@ -664,7 +1088,7 @@ I0_controls = DetectorAmplifierAutorangeDevice(
 I0_photocurrent_calc = SwaitRecord(
     "9idcLAX:USAXS:I0",
     name="I0_photocurrent_calc")
-I0_photocurrent = I0_photocurrent_calc.get()
+I0_photocurrent = I0_photocurrent_calc.val
 
 I00_controls = DetectorAmplifierAutorangeDevice(
     "I00_USAXS",
@@ -679,13 +1103,13 @@ I00_controls = DetectorAmplifierAutorangeDevice(
 I00_photocurrent_calc = SwaitRecord(
     "9idcLAX:USAXS:I00",
     name="I00_photocurrent_calc")
-I00_photocurrent = I00_photocurrent_calc.get()
+I00_photocurrent = I00_photocurrent_calc.val
 
 
 I000_photocurrent_calc = SwaitRecord(
     "9idcLAX:USAXS:I000",
     name="I000_photocurrent_calc")
-I000_photocurrent = I000_photocurrent_calc.get()
+I000_photocurrent = I000_photocurrent_calc.val
 
 
 controls_list_I0_I00_TRD = [I0_controls, I00_controls, trd_controls]
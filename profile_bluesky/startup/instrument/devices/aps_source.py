@@ -29,7 +29,9 @@ class ApsSpecialMode(apstools.devices.ApsMachineParametersDevice):
 
 aps = ApsSpecialMode(name="aps")
 sd.baseline.append(aps)
+sd.volatile.append(aps)     # ring current & lifetime: read in every run
 
 undulator = apstools.devices.ApsUndulatorDual(
     "ID09", name="undulator")
 sd.baseline.append(undulator)
+sd.volatile.append(undulator)
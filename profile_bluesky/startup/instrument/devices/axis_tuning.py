@@ -29,6 +29,21 @@ For reference, `apstools.plans.TuneAxis().tune()` uses these default attributes:
     peak_choice : str
         either "cen" (default: peak value) or "com" (center of mass)
 
+Our `UsaxsTuneAxis` adds these attributes for a fly tune
+(sweep the axis while the Struck MCS records)::
+
+    fly_signal : obj
+        Struck MCS channel (such as ``struck.mca3``) for the tune signal,
+        `None` if this signal is not recorded by the MCS
+
+    fly_controls : obj
+        amplifier controls (such as ``upd_controls``) of the tune signal:
+        the gain is locked (autorange off) during the sweep
+
+    use_fly_tune : bool
+        if `True` (and ``fly_signal`` is defined),
+        ``tune()`` will call ``fly_tune()``
+
 These attributes, set internally, are available for reference::
 
     axis : instance of `EpicsMotor` (or other positioner with `APS_devices.AxisTunerMixin`)
@@ -59,6 +74,7 @@ These attributes, set internally, are results of the tune scan::
 __all__ = [
     'axis_tune_range',
     "TUNE_METHOD_PEAK_CHOICE",
+    "USE_FLY_TUNE",
     "USING_MS_STAGE",
     "TUNING_DET_SIGNAL",
     ]
@@ -67,7 +83,6 @@ from ..session_logs import logger
 logger.info(__file__)
 
 from apstools.plans import TuneAxis
-from apstools.utils import trim_plot_by_name
 from bluesky import plan_stubs as bps
 from ophyd import Component, Device, EpicsSignal
 from ophyd import Kind
@@ -77,7 +92,7 @@ from .override_ScalerCH import ScalerCH
 
 
 logger.debug("before instrument imports")
-from ..framework import bec
+from ..framework import bec, live_plots
 from .amplifiers import autoscale_amplifiers
 from .amplifiers import I0_controls, I00_controls, upd_controls
 from .general_terms import terms
@@ -85,6 +100,7 @@ from .miscellaneous import usaxs_q_calc
 from .scalers import scaler0, I0_SIGNAL, I00_SIGNAL, UPD_SIGNAL
 from .shutters import mono_shutter, ti_filter_shutter
 from .stages import m_stage, ms_stage, s_stage, a_stage, as_stage, d_stage
+from .struck3820 import struck
 
 # replace the definition from apstools.plans
 from .axis_tuning_patches import UsaxsTuneAxis as TuneAxis
@@ -95,6 +111,9 @@ TUNE_METHOD_PEAK_CHOICE = "com"
 USING_MS_STAGE = False
 TUNING_DET_SIGNAL = {True: I00_SIGNAL, False: I0_SIGNAL}[USING_MS_STAGE]
 
+# sweep the axis while the Struck MCS records (instead of step scan)
+USE_FLY_TUNE = False
+
 
 class TuneRanges(Device):
     """
@@ -132,7 +151,7 @@ def mr_pretune_hook():
     y_name = TUNING_DET_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, TUNING_DET_SIGNAL)
 
 
@@ -152,6 +171,23 @@ def _getScalerSignalName_(scaler, signal):
     elif isinstance(scaler, EpicsScaler):
         return signal.name
 
+def _getMcsChannel_(signal):
+    """Struck MCS channel that records the same detector, or None"""
+    mcs_channels = {
+        I0_SIGNAL.name: struck.mca2,
+        UPD_SIGNAL.name: struck.mca3,
+    }
+    return mcs_channels.get(signal.name)
+
+def _getAmplifierControls_(signal):
+    """amplifier controls of the detector of ``signal``, or None"""
+    controls = {
+        I0_SIGNAL.name: I0_controls,
+        I00_SIGNAL.name: I00_controls,
+        UPD_SIGNAL.name: upd_controls,
+    }
+    return controls.get(signal.name)
+
 m_stage.r.tuner = TuneAxis(
     [scaler0],
     m_stage.r,
@@ -159,6 +195,9 @@ m_stage.r.tuner = TuneAxis(
     width_signal=axis_tune_range.mr,
 )
 m_stage.r.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+m_stage.r.tuner.fly_signal = _getMcsChannel_(TUNING_DET_SIGNAL)
+m_stage.r.tuner.fly_controls = _getAmplifierControls_(TUNING_DET_SIGNAL)
+m_stage.r.tuner.use_fly_tune = USE_FLY_TUNE
 m_stage.r.tuner.num = 31
 m_stage.r.tuner.width = axis_tune_range.mr.get()     # -0.004
 
@@ -176,7 +215,7 @@ def m2rp_pretune_hook():
     y_name = TUNING_DET_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, TUNING_DET_SIGNAL)
 
 
@@ -202,6 +241,9 @@ m_stage.r2p.tuner = TuneAxis(
     width_signal=axis_tune_range.m2rp,
 )
 m_stage.r2p.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+m_stage.r2p.tuner.fly_signal = _getMcsChannel_(TUNING_DET_SIGNAL)
+m_stage.r2p.tuner.fly_controls = _getAmplifierControls_(TUNING_DET_SIGNAL)
+m_stage.r2p.tuner.use_fly_tune = USE_FLY_TUNE
 m_stage.r2p.tuner.num = 21
 m_stage.r2p.tuner.width = axis_tune_range.m2rp.get()     -8
 
@@ -219,7 +261,7 @@ def msrp_pretune_hook():
     y_name = TUNING_DET_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, TUNING_DET_SIGNAL)
 
 
@@ -241,6 +283,9 @@ ms_stage.rp.tuner = TuneAxis(
     width_signal=axis_tune_range.msrp,
 )
 ms_stage.rp.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+ms_stage.rp.tuner.fly_signal = _getMcsChannel_(TUNING_DET_SIGNAL)
+ms_stage.rp.tuner.fly_controls = _getAmplifierControls_(TUNING_DET_SIGNAL)
+ms_stage.rp.tuner.use_fly_tune = USE_FLY_TUNE
 ms_stage.rp.tuner.num = 21
 ms_stage.rp.tuner.width = axis_tune_range.msrp.get()     # 6
 
@@ -257,7 +302,7 @@ def ar_pretune_hook():
     y_name = UPD_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, UPD_SIGNAL)
 
 
@@ -283,6 +328,9 @@ a_stage.r.tuner = TuneAxis(
         width_signal=axis_tune_range.ar,
 )
 a_stage.r.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+a_stage.r.tuner.fly_signal = _getMcsChannel_(UPD_SIGNAL)
+a_stage.r.tuner.fly_controls = _getAmplifierControls_(UPD_SIGNAL)
+a_stage.r.tuner.use_fly_tune = USE_FLY_TUNE
 a_stage.r.tuner.num = 35
 a_stage.r.tuner.width = axis_tune_range.ar.get()     # -0.004
 
@@ -299,7 +347,7 @@ def asrp_pretune_hook():
     y_name = UPD_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, UPD_SIGNAL)
 
 
@@ -322,6 +370,9 @@ as_stage.rp.tuner = TuneAxis(
     width_signal=axis_tune_range.asrp,
 )
 as_stage.rp.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+as_stage.rp.tuner.fly_signal = _getMcsChannel_(UPD_SIGNAL)
+as_stage.rp.tuner.fly_controls = _getAmplifierControls_(UPD_SIGNAL)
+as_stage.rp.tuner.use_fly_tune = USE_FLY_TUNE
 as_stage.rp.tuner.num = 21
 as_stage.rp.tuner.width = axis_tune_range.asrp.get()     # 6
 
@@ -339,7 +390,7 @@ def a2rp_pretune_hook():
     y_name = UPD_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, UPD_SIGNAL)
 
 
@@ -364,6 +415,9 @@ a_stage.r2p.tuner = TuneAxis(
     width_signal=axis_tune_range.a2rp,
 )
 a_stage.r2p.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+a_stage.r2p.tuner.fly_signal = _getMcsChannel_(UPD_SIGNAL)
+a_stage.r2p.tuner.fly_controls = _getAmplifierControls_(UPD_SIGNAL)
+a_stage.r2p.tuner.use_fly_tune = USE_FLY_TUNE
 a_stage.r2p.tuner.num = 31
 a_stage.r2p.tuner.width = axis_tune_range.a2rp.get()     # -8
 a_stage.r2p.pre_tune_method = a2rp_pretune_hook
@@ -379,7 +433,7 @@ def dx_pretune_hook():
     y_name = UPD_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, UPD_SIGNAL)
 
 
@@ -400,6 +454,9 @@ d_stage.x.tuner = TuneAxis(
     width_signal=axis_tune_range.dx,
 )
 d_stage.x.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+d_stage.x.tuner.fly_signal = _getMcsChannel_(UPD_SIGNAL)
+d_stage.x.tuner.fly_controls = _getAmplifierControls_(UPD_SIGNAL)
+d_stage.x.tuner.use_fly_tune = USE_FLY_TUNE
 d_stage.x.tuner.num = 35
 d_stage.x.tuner.width = axis_tune_range.dx.get()     # 10
 
@@ -416,7 +473,7 @@ def dy_pretune_hook():
     y_name = UPD_SIGNAL.chname.get()
     scaler0.select_channels([y_name])
     scaler0.channels.chan01.kind = Kind.config
-    trim_plot_by_name(n=5)
+    live_plots.trim(n=5)
     # trim_plot_lines(bec, 5, stage, UPD_SIGNAL)
 
 
@@ -437,6 +494,9 @@ d_stage.y.tuner = TuneAxis(
     width_signal=axis_tune_range.dy,
 )
 d_stage.y.tuner.peak_choice = TUNE_METHOD_PEAK_CHOICE
+d_stage.y.tuner.fly_signal = _getMcsChannel_(UPD_SIGNAL)
+d_stage.y.tuner.fly_controls = _getAmplifierControls_(UPD_SIGNAL)
+d_stage.y.tuner.use_fly_tune = USE_FLY_TUNE
 d_stage.y.tuner.num = 35
 d_stage.y.tuner.width = axis_tune_range.dy.get()     # 10
 
@@ -23,6 +23,11 @@ from ophyd import Component, Device, Signal
 from ophyd import EpicsMotor
 import pyRestTable
 
+from .amplifiers import AutorangeSettings
+from .struck3820 import struck
+from ..utils.peak_centers import peak_statistics
+from ..utils.peak_fit import fit_peak, PEAK_FIT_PROFILES
+
 
 class TuningResults(Device):
     """
@@ -43,9 +48,19 @@ class TuningResults(Device):
     max = Component(Signal)
     crossings = Component(Signal)
     peakstats_attrs = "x y cen com fwhm min max crossings".split()
+    # - - - - - from a model fit (peak_choice is a profile name)
+    fit_profile = Component(Signal, value="")
+    fit_center = Component(Signal)
+    fit_center_error = Component(Signal)
+    fit_fwhm = Component(Signal)
+    fit_r_squared = Component(Signal)
+    fit_chi2_reduced = Component(Signal)
+    fit_attrs = "center center_error fwhm r_squared chi2_reduced".split()
 
     def report(self, title=None, print_enable=True):
         keys = self.peakstats_attrs + "tune_ok center initial_position final_position".split()
+        if self.fit_profile.get():
+            keys += ["fit_profile"] + [f"fit_{k}" for k in self.fit_attrs]
         t = pyRestTable.Table()
         t.addLabel("key")
         t.addLabel("result")
@@ -61,11 +76,35 @@ class TuningResults(Device):
     def put_results(self, peaks):
         """copy values from PeakStats"""
         for key in self.peakstats_attrs:
-            v = getattr(peaks, key)
-            if key in ("crossings", "min", "max"):
+            v = getattr(peaks, key, None)
+            if key in ("crossings", "min", "max") and v is not None:
                 v = np.array(v)
             getattr(self, key).put(v)
 
+    def put_fit_results(self, fit):
+        """copy values from fit_peak()"""
+        self.fit_profile.put(fit["profile"])
+        for key in self.fit_attrs:
+            getattr(self, f"fit_{key}").put(fit[key])
+
+
+class FlyPeakStats(object):
+    """
+    Peak statistics from a fly tune, same attributes as ``PeakStats``
+
+    Arrays are already complete when created,
+    so ``compute()`` has nothing more to do.
+    """
+
+    def __init__(self, x, y):
+        self.x_data = list(x)
+        self.y_data = list(y)
+        for key, value in peak_statistics(x, y).items():
+            setattr(self, key, value)
+
+    def compute(self):
+        pass
+
 
 class UsaxsTuneAxis(TuneAxis):
     """use bp.rel_scan() for the tune()"""
@@ -73,6 +112,27 @@ class UsaxsTuneAxis(TuneAxis):
     width_signal = None
     _width_default = 1      # fallback default when width_signal is None
 
+    # fly tune: sweep at constant speed while the Struck MCS records
+    use_fly_tune = False    # if True, tune() calls fly_tune()
+    fly_signal = None       # Struck MCS channel (struck.mcaN) of the tune signal
+    fly_controls = None     # amplifier controls of fly_signal: gain locked during a sweep
+    fly_clock = struck.mca1     # counts of the MCS clock in each channel
+    fly_sweep_time = 3      # seconds at constant speed across the width
+
+    # peak_choice may also name a profile for a least-squares fit
+    _peak_choices_ = "cen com".split() + list(PEAK_FIT_PROFILES)
+    fit = None              # results of the most recent fit_peak()
+    fit_r_squared_min = 0.8     # acceptable fit quality
+    fit_num_min = 9         # fewest points when adapting the number of points
+    fit_points_per_fwhm = 4     # points to sample within the expected FWHM
+    fit_width_factor = 5    # multi_pass_tune: next width = factor * fitted FWHM
+    _last_fit_fwhm = None   # fitted FWHM of the last successful tune
+
+    # multi_pass_tune: stop when the center has converged
+    convergence_shift_fraction = 0.05   # center shift, relative to the scan width
+    convergence_error_fraction = 0.02   # fitted center uncertainty, relative to FWHM
+    stop_reason = None      # why the most recent multi_pass_tune stopped
+
     def __init__(self, signals, axis, signal_name=None,
                  width_signal=None):
         """
@@ -110,6 +170,23 @@ class UsaxsTuneAxis(TuneAxis):
         else:
             self.width_signal.put(value)
 
+    @property
+    def fitting(self):
+        """Is the peak located by a least-squares fit?"""
+        return self.peak_choice in PEAK_FIT_PROFILES
+
+    def adaptive_num(self, width):
+        """
+        Number of tune points for a fit, from the last fitted FWHM.
+
+        Enough points to sample the expected peak with
+        ``fit_points_per_fwhm`` points, no more than ``self.num``.
+        """
+        if not self.fitting or not self._last_fit_fwhm:
+            return self.num
+        n = int(np.ceil(abs(width) / self._last_fit_fwhm * self.fit_points_per_fwhm)) + 1
+        return max(self.fit_num_min, min(self.num, n))
+
     def peak_analysis(self, initial_position):
         if self.peak_detected():
             self.tune_ok = True
@@ -117,6 +194,9 @@ class UsaxsTuneAxis(TuneAxis):
                 final_position = self.peaks.cen
             elif self.peak_choice == "com":
                 final_position = self.peaks.com
+            elif self.fitting:
+                final_position = self.fit["center"]
+                self._last_fit_fwhm = self.fit["fwhm"]
             else:
                 final_position = None
             self.center = final_position
@@ -138,6 +218,8 @@ class UsaxsTuneAxis(TuneAxis):
             results.put_results({})
         else:
             results.put_results(self.peaks)
+        if self.fit is not None:
+            results.put_fit_results(self.fit)
         self.stats.append(results)
 
         t = results.report(print_enable=False)
@@ -163,7 +245,10 @@ class UsaxsTuneAxis(TuneAxis):
             metadata
         """
         width = width or self.width
-        num = num or self.num
+        num = num or self.adaptive_num(width)
+
+        if self.use_fly_tune and self.fly_signal is not None:
+            return (yield from self.fly_tune(width=width, num=num, md=md))
 
         if self.peak_choice not in self._peak_choices_:
             raise ValueError(
@@ -217,6 +302,192 @@ class UsaxsTuneAxis(TuneAxis):
 
         yield from _scan()
 
+    def fly_tune(self, width=None, num=None, sweep_time=None, md=None):
+        """
+        Bluesky plan to tune this axis while it moves at constant speed
+
+        Sweep ``self.axis`` once across ``width`` (centered about
+        the current position) in ``sweep_time`` seconds while the
+        Struck MCS advances channels on its internal clock.  Each
+        MCS channel is located from the axis readback (by time),
+        and the peak is computed from the arrays (same terms as
+        ``PeakStats``).  Then, ``peak_analysis()`` moves to the result.
+
+        All times are EPICS (IOC) timestamps: the axis readback and
+        the MCS ``current_channel`` updates (which locate the start
+        of the MCS on the same clock).  The gain of ``fly_controls``
+        is locked (autorange off) during the sweep, so the counts of
+        all channels have the same gain.  The velocity and the
+        autorange mode are restored, even if the plan is interrupted.
+        Each point (position, count rate) is an event of the run.
+
+        PARAMETERS
+
+        width : float
+            width of the sweep in the units of ``self.axis``
+            Default value in ``self.width``
+        num : int
+            number of MCS channels across the width
+            Default value in ``self.num``
+        sweep_time : float
+            seconds to cross the width
+            Default value in ``self.fly_sweep_time`` (initially 3)
+        md : dict, optional
+            metadata
+        """
+        width = width or self.width
+        num = num or self.num
+        sweep_time = sweep_time or self.fly_sweep_time
+
+        if self.fly_signal is None:
+            raise ValueError(f"{self.axis.name}: fly_signal is not defined")
+        if self.peak_choice not in self._peak_choices_:
+            raise ValueError(
+                f"peak_choice must be one of {self._peak_choices_},"
+                f" gave {self.peak_choice}"
+            )
+
+        axis = self.axis
+        initial_position = axis.position
+        start = initial_position - width/2
+        finish = initial_position + width/2
+        self.tune_ok = False
+
+        # run up to speed before start, ramp down after finish
+        speed = abs(finish - start) / sweep_time
+        ramp = speed * axis.acceleration.get()
+        direction = 1 if finish > start else -1
+        original_velocity = axis.velocity.get()
+        dwell_time = sweep_time / num
+        # ramps are recorded, too
+        num_channels = num + int(2 * 2 * axis.acceleration.get() / dwell_time) + 2
+
+        _md = {
+            'plan_name': self.__class__.__name__ + '.fly_tune',
+            'tune_parameters': dict(
+                num = num,
+                width = width,
+                sweep_time = sweep_time,
+                initial_position = initial_position,
+                peak_choice = self.peak_choice,
+                x_axis = axis.name,
+                y_axis = self.fly_signal.name,
+                ),
+            'motors': (axis.name,),
+            'detectors': (self.fly_signal.name,),
+            }
+        _md.update(md or {})
+
+        if "pass_max" not in _md:
+            self.stats = []
+
+        # record (IOC timestamp, value) during the sweep:
+        # axis readback and the MCS channel number
+        readbacks = []
+        channels = []
+        subscriptions = []
+
+        def _record_readback_(value=None, timestamp=None, **kwargs):
+            readbacks.append((timestamp, value))
+
+        def _record_channel_(value=None, timestamp=None, **kwargs):
+            channels.append((timestamp, value))
+
+        controls = self.fly_controls
+        original_mode = None if controls is None else controls.auto.mode.get()
+        if controls is not None:
+            _md["tune_parameters"]["gain"] = controls.auto.gain.get()
+
+        def _sweep_():
+            yield from bps.mv(axis, start - direction*ramp)
+            if controls is not None:
+                # same gain for every channel of the sweep
+                yield from bps.mv(controls.auto.mode, AutorangeSettings.manual)
+            yield from bps.mv(
+                axis.velocity, speed,
+                struck.channel_advance, 0,      # internal (dwell time)
+                struck.dwell_time, dwell_time,
+                struck.channels_used, num_channels,
+                struck.preset_real_time, 0,
+            )
+            subscriptions.append(
+                (axis.user_readback, axis.user_readback.subscribe(_record_readback_)))
+            subscriptions.append(
+                (struck.current_channel, struck.current_channel.subscribe(_record_channel_)))
+            yield from bps.mv(struck.erase_start, 1)
+            yield from bps.mv(axis, finish + direction*ramp)
+            yield from bps.mv(struck.stop_all, 1)
+
+        def _restore_():
+            for signal, cid in subscriptions:
+                signal.unsubscribe(cid)
+            yield from bps.mv(axis.velocity, original_velocity)
+            if controls is not None:
+                yield from bps.mv(controls.auto.mode, original_mode)
+
+        yield from bps.open_run(md=_md)
+        # finalize_wrapper: restore also on RE.abort() (GeneratorExit)
+        yield from bpp.finalize_wrapper(_sweep_(), _restore_())
+
+        clock = np.array(self.fly_clock.spectrum.get(), dtype=float)
+        counts = np.array(self.fly_signal.spectrum.get(), dtype=float)
+        n = min(struck.current_channel.get(), len(clock), len(counts))
+        clock, counts = clock[:n], counts[:n]
+
+        clock_frequency = struck.clock_frequency.get()
+        t_end = np.cumsum(clock) / clock_frequency      # after MCS start
+        t_start = self._mcs_start_time_(channels, t_end)
+        t_rb = np.array([t for t, v in readbacks])
+        x_rb = np.array([v for t, v in readbacks])
+        usable = clock > 0
+        self.peaks = None
+        if len(t_rb) < 2 or usable.sum() < 3 or t_start is None:
+            logger.warning("%s: fly tune recorded no usable data", axis.name)
+        else:
+            # IOC time at middle of each channel
+            t_mid = t_start + t_end - clock/2 / clock_frequency
+            x = np.interp(t_mid[usable], t_rb, x_rb)
+            rate = counts[usable] * clock_frequency / clock[usable]
+            # only the constant-speed part of the sweep
+            low, high = min(start, finish), max(start, finish)
+            inside = (x >= low) & (x <= high)
+            if inside.sum() >= 3:
+                yield from self._emit_points_(x[inside], rate[inside])
+                self.peaks = FlyPeakStats(x[inside], rate[inside])
+
+        yield from self.peak_analysis(initial_position)
+        yield from bps.close_run()
+
+    @staticmethod
+    def _mcs_start_time_(channels, t_end):
+        """
+        IOC time of the MCS start, from ``current_channel`` updates
+
+        When ``current_channel`` is ``k``, channel ``k`` ended
+        ``t_end[k-1]`` after the start.  Updates are never early,
+        so the earliest estimate is the best.  None if no updates.
+        """
+        estimates = [
+            timestamp - t_end[k-1]
+            for timestamp, k in channels
+            if timestamp is not None and 1 <= k <= len(t_end)
+        ]
+        if len(estimates) == 0:
+            return None
+        return min(estimates)
+
+    def _emit_points_(self, x, y):
+        """plan: (internal) each (x, y) point of a fly tune as an event"""
+        x_signal = Signal(name=self.axis.name, value=0.0)
+        y_signal = Signal(name=self.fly_signal.name, value=0.0)
+        for xi, yi in zip(x, y):
+            x_signal.put(xi)
+            y_signal.put(yi)
+            yield from bps.create("primary")
+            yield from bps.read(x_signal)
+            yield from bps.read(y_signal)
+            yield from bps.save()
+
     def multi_pass_tune(self, width=None, step_factor=None,
                         num=None, pass_max=None, snake=None, md=None):
         """
@@ -246,9 +517,13 @@ class UsaxsTuneAxis(TuneAxis):
             Default value in ``self.snake`` (initially True)
         md : dict, optional
             metadata
+
+        Passes stop early once the center has converged
+        (see :meth:`convergence`).  The reason is reported in
+        the results table and kept in ``self.stop_reason``.
         """
         width = width or self.width
-        num = num or self.num
+        num = num or (None if self.fitting else self.num)   # fit: adaptive
         step_factor = step_factor or self.step_factor
         snake = snake or self.snake
         pass_max = pass_max or self.pass_max
@@ -256,6 +531,8 @@ class UsaxsTuneAxis(TuneAxis):
         self.stats = []
 
         def _scan(width=1, step_factor=10, num=10, snake=True):
+            previous_center = None
+            self.stop_reason = f"pass_max={pass_max}"
             for _pass_number in range(pass_max):
                 _md = {'pass': _pass_number+1,
                        'pass_max': pass_max,
@@ -266,13 +543,26 @@ class UsaxsTuneAxis(TuneAxis):
                 yield from self.tune(width=width, num=num, md=_md)
 
                 if not self.tune_ok:
+                    self.stop_reason = "tune failed"
+                    break
+                reason = self.convergence(previous_center, width)
+                if reason is not None:
+                    self.stop_reason = reason
                     break
-                width /= step_factor
+                previous_center = self.center
+                if self.fitting:
+                    # no wider than the peak needs
+                    sign = 1 if width > 0 else -1
+                    width = sign * min(
+                        abs(width) / step_factor,
+                        self.fit_width_factor * self.fit["fwhm"])
+                else:
+                    width /= step_factor
                 if snake:
                     width *= -1
 
             t = pyRestTable.Table()
-            t.labels = "pass Ok? center width max.X max.Y".split()
+            t.labels = "pass Ok? center width max.X max.Y stopped".split()
             for i, stat in enumerate(self.stats):
                 row = [i+1,]
                 row.append(stat.tune_ok.get())
@@ -280,6 +570,7 @@ class UsaxsTuneAxis(TuneAxis):
                 row.append(stat.fwhm.get())
                 x, y = stat.max.get()
                 row += [x, y]
+                row.append(self.stop_reason if i == len(self.stats)-1 else "")
                 t.addRow(row)
             logger.info("Results\n%s", str(t))
             logger.info("Final tune position: %s = %f", self.axis.name, self.axis.position)
@@ -291,6 +582,29 @@ class UsaxsTuneAxis(TuneAxis):
                 num=num,
                 snake=snake))
 
+    def convergence(self, previous_center, width):
+        """
+        returns reason (str) if the tune center has converged, otherwise None
+
+        Converged when either:
+
+        * the fitted center uncertainty is less than
+          ``convergence_error_fraction`` of the fitted FWHM
+          (only when ``peak_choice`` is a fit profile)
+        * the center moved less than ``convergence_shift_fraction``
+          of the scan ``width`` since the previous pass
+        """
+        if self.fit is not None and self.fit["fwhm"] > 0:
+            limit = self.convergence_error_fraction * self.fit["fwhm"]
+            if self.fit["center_error"] < limit:
+                return f"center uncertainty {self.fit['center_error']:g} < {limit:g}"
+        if previous_center is not None and self.center is not None:
+            shift = abs(self.center - previous_center)
+            limit = self.convergence_shift_fraction * abs(width)
+            if shift < limit:
+                return f"center shift {shift:g} < {limit:g}"
+        return None
+
     def peak_detected(self):
         """
         returns True if a peak was detected, otherwise False
@@ -299,6 +613,7 @@ class UsaxsTuneAxis(TuneAxis):
         value is four times the minimum value.  Change this routine
         by subclassing :class:`TuneAxis` and override :meth:`peak_detected`.
         """
+        self.fit = None
         if self.peaks is None:
             logger.info("PeakStats = None")
             return False
@@ -307,9 +622,48 @@ class UsaxsTuneAxis(TuneAxis):
             logger.info("PeakStats : no max reported")
             return False
 
+        if self.fitting:
+            return self.fit_detected()
+
         ymax = self.peaks.max[-1]
         ymin = self.peaks.min[-1]
         ok = ymax > 4*ymin        # this works for USAXS@APS
         if not ok:
             logger.info("ymax/yman not big enough: is it a peak?")
         return ok
+
+    def fit_detected(self):
+        """
+        returns True if a model fit found a peak, otherwise False
+
+        Fit ``self.peak_choice`` profile to the tune data.
+        A peak is found if the fit converged with acceptable quality,
+        the amplitude is significant, and the center is within
+        the scanned range.
+        """
+        x = np.array(self.peaks.x_data, dtype=float)
+        y = np.array(self.peaks.y_data, dtype=float)
+        try:
+            self.fit = fit_peak(x, y, self.peak_choice)
+        except (ValueError, np.linalg.LinAlgError) as exc:
+            logger.info("peak fit failed: %s", exc)
+            return False
+        fit = self.fit
+        logger.info(
+            "%s fit: center=%g +/- %g  fwhm=%g  r^2=%g  chi2_r=%g",
+            fit["profile"], fit["center"], fit["center_error"],
+            fit["fwhm"], fit["r_squared"], fit["chi2_reduced"],
+        )
+        if not fit["converged"]:
+            logger.info("peak fit did not converge")
+            return False
+        if fit["r_squared"] < self.fit_r_squared_min:
+            logger.info("peak fit quality too low: r^2=%g", fit["r_squared"])
+            return False
+        if fit["amplitude"] <= 3 * fit["amplitude_error"]:
+            logger.info("peak fit amplitude not significant: is it a peak?")
+            return False
+        if not x.min() <= fit["center"] <= x.max():
+            logger.info("peak fit center outside of scan range")
+            return False
+        return True
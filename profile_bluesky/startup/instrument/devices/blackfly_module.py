@@ -14,6 +14,7 @@ from ..session_logs import logger
 logger.info(__file__)
 
 from .area_detector_common import Override_AD_plugin_primed
+from .device_connections import device_connections
 # from apstools.devices import AD_prime_plugin2
 from bluesky import plan_stubs as bps
 
@@ -158,6 +159,7 @@ try:
     blackfly_det = MyPointGreyDetector(
         prefix, name="blackfly_det",
         labels=["camera", "area_detector"])
+    device_connections.add(blackfly_det)
 except TimeoutError as exc_obj:
     msg = f"Timeout connecting with {nm} ({prefix})"
     logger.warning(msg)
@@ -171,6 +173,16 @@ _flag_save_sample_image_ = EpicsSignal(
     )
 
 
+def _check_jpeg_plugin_primed_(det):
+    """warn if the JPEG plugin is not primed, once connected"""
+    if not Override_AD_plugin_primed(det.jpeg1):
+        warnings.warn(
+            f"NOTE: {det.name}.jpeg1 has not been primed yet."
+            "  BEFORE using this detector in bluesky, call: "
+            f"  AD_prime_plugin2({det.name}.jpeg1)"
+        )
+
+
 try:
     nm = OPTICAL_CAMERA
     prefix = area_detector_EPICS_PV_prefix[nm]
@@ -179,12 +191,7 @@ try:
         labels=["camera", "area_detector"])
     blackfly_optical.read_attrs.append("jpeg1")
     blackfly_optical.jpeg1.stage_sigs["file_write_mode"] = "Single"
-    if not Override_AD_plugin_primed(blackfly_optical.jpeg1):
-        warnings.warn(
-            "NOTE: blackfly_optical.jpeg1 has not been primed yet."
-            "  BEFORE using this detector in bluesky, call: "
-            "  AD_prime_plugin2(blackfly_optical.jpeg1)"
-        )
+    device_connections.add(blackfly_optical, setup=_check_jpeg_plugin_primed_)
 except TimeoutError as exc_obj:
     logger.warning(
         "Timeout connecting with %s (%s): %s",
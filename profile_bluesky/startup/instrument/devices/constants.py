@@ -17,5 +17,7 @@ constants = {
     "TR_MAX_ALLOWED_COUNTS" : 980000, # maximum allowed counts for upd before assume topped up
     "USAXS_AY_OFFSET" : 8, # USAXS transmission diode AY offset, calibrated by JIL 2018/04/10 For Delhi crystals diode is between 5 - 10 mm .. center is 8mm
     "MEASURE_DARK_CURRENTS" : True, # MEASURE dark currents on start of data collection
+    "CACHE_DARK_CURRENTS" : True, # re-MEASURE dark currents only when stale or drifted
     "SYNC_ORDER_NUMBERS" : True, # sync order numbers among devices on start of collect data sequence
+    "USE_TUNE_SCHEDULER" : False, # preUSAXStune tunes only axes predicted (from tune history) to have drifted
 }
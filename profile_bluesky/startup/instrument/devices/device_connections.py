@@ -0,0 +1,125 @@
+
+"""
+connect ophyd devices in parallel, in background threads
+
+Devices are declared (constructed) at import, as usual.  Devices
+that are slow to connect (such as area detectors, which wait for
+a timeout when their IOC is not running) are added here.  Their
+connection, and any setup that needs the connection, runs in
+background threads.  The RunEngine waits for these to finish
+before it runs its first plan.
+
+EXAMPLE::
+
+    some_det = MyDetector(prefix, name="some_det")
+    device_connections.add(some_det, setup=configure_some_det)
+
+    device_connections.wait(some_det)     # block until done
+    device_connections.report()           # connection time of each device
+"""
+
+__all__ = [
+    'DeviceConnections',
+    'device_connections',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from collections import OrderedDict
+import concurrent.futures
+import pyRestTable
+import time
+
+from ..framework import RE
+
+
+class DeviceConnections(object):
+    """
+    Connect ophyd objects in parallel, in background threads.
+
+    Each object is connected (``wait_for_connection()``) and then
+    its ``setup`` function (if given) is called with the object.
+    Timeouts and errors are logged, not raised.
+    """
+
+    timeout = 10        # seconds, for each device
+    max_workers = 8
+
+    def __init__(self):
+        self._executor = None
+        self._futures = OrderedDict()
+        self.results = {}       # name: (seconds, status)
+
+    def add(self, obj, setup=None, timeout=None):
+        """Start connecting this ophyd object in the background, returns obj."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="device_connections",
+            )
+        self._futures[obj.name] = self._executor.submit(
+            self._connect_, obj, setup, timeout or self.timeout)
+        return obj
+
+    def _connect_(self, obj, setup, timeout):
+        t0 = time.time()
+        try:
+            obj.wait_for_connection(timeout=timeout)
+            if setup is not None:
+                setup(obj)
+            status = "connected"
+        except TimeoutError as exc:
+            logger.warning("Timeout connecting with %s: %s", obj.name, exc)
+            status = "timeout"
+        except Exception as exc:
+            logger.error("Error connecting with %s: %s", obj.name, exc)
+            status = exc.__class__.__name__
+        self.results[obj.name] = (time.time() - t0, status)
+        return status == "connected"
+
+    def wait(self, obj=None, timeout=None):
+        """
+        Block until connection of obj (default: all) is done.
+
+        Returns ``True`` if connected.
+        """
+        if obj is None:
+            futures = list(self._futures.values())
+        else:
+            name = obj if isinstance(obj, str) else obj.name
+            futures = [self._futures[name]] if name in self._futures else []
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        return len(not_done) == 0 and all(f.result() for f in done)
+
+    def connected(self, obj):
+        """Is this object connected (without waiting)?"""
+        name = obj if isinstance(obj, str) else obj.name
+        return self.results.get(name, (None, None))[1] == "connected"
+
+    def report(self, print_enable=True):
+        """Table of the connection time of each device."""
+        t = pyRestTable.Table()
+        t.labels = "device connect_s status".split()
+        for name in self._futures:
+            seconds, status = self.results.get(name, (None, "pending"))
+            t.addRow((
+                name,
+                None if seconds is None else f"{seconds:.3f}",
+                status,
+            ))
+        if print_enable:
+            print(t)
+        return t
+
+
+device_connections = DeviceConnections()
+
+
+def _wait_for_device_connections_(plan):
+    """RunEngine preprocessor: connections must finish before any plan runs"""
+    device_connections.wait()
+    return plan
+
+
+RE.preprocessors.append(_wait_for_device_connections_)
@@ -21,6 +21,7 @@ from ..session_logs import logger
 logger.info(__file__)
 
 from .area_detector_common import area_detector_EPICS_PV_prefix
+from .device_connections import device_connections
 from .area_detector_common import _validate_AD_FileWriter_path_
 
 
@@ -67,6 +68,18 @@ class MyDexelaDetector(SingleTrigger, DexelaDetector):
     proc1 = ADComponent(MyProcessPlugin, "Proc1:")
 
 
+def _setup_dexela_(det):
+    """configure the detector, once connected"""
+    # configure the processing plugin into the chain for file writing
+    proc_port = det.proc1.port_name.get()
+    det.hdf1.nd_array_port.put(proc_port)
+
+    # MUST come before staging writes file_path
+    det.hdf1.create_directory.put(-5)
+
+    det.hdf1.file_name.put("bluesky")
+
+
 try:
     nm = "Dexela 2315"
     prefix = area_detector_EPICS_PV_prefix[nm]
@@ -74,16 +87,7 @@ try:
         prefix, name="dexela_det", labels=["camera", "area_detector"]
     )
     dexela_det.read_attrs.append("hdf1")
-
-    # configure the processing plugin into the chain for file writing
-    proc_port = dexela_det.proc1.port_name.get()
-    dexela_det.hdf1.nd_array_port.put(proc_port)
-
-    # MUST come before staging writes file_path
-    dexela_det.hdf1.create_directory.put(-5)
-
-    dexela_det.hdf1.file_name.put("bluesky")
-
+    device_connections.add(dexela_det, setup=_setup_dexela_)
 
 except TimeoutError as exc_obj:
     logger.warning("Timeout connecting with %s (%s): %s", nm, prefix, exc_obj)
@@ -121,3 +121,4 @@ class DiagnosticsParameters(Device):
 
 diagnostics = DiagnosticsParameters(name="diagnostics")
 sd.baseline.append(diagnostics)
+sd.volatile.append(diagnostics)
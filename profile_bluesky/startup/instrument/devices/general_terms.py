@@ -1,10 +1,17 @@
 
 """
 general parameters and terms
+
+Plans can read many terms at once, as a snapshot::
+
+    usaxs = terms.snapshot("USAXS").USAXS
+    yield from bps.mv(a_stage.r, usaxs.ar_val_center)
 """
 
 __all__ = [
+    'benchmark_terms_snapshot',
     'terms',
+    'TermsSnapshot',
     ]
 
 from ..session_logs import logger
@@ -12,6 +19,10 @@ logger.info(__file__)
 
 from ophyd import Component, Device, Signal
 from ophyd import EpicsSignal
+from ophyd.signal import EpicsSignalBase
+import epics
+import functools
+import pyRestTable
 import time
 
 from .amplifiers import upd_controls
@@ -282,6 +293,45 @@ class Parameters_HeaterProcess(Device):
     linkam_trigger = Component(EpicsSignal, "9idcLAX:bit16")
 
 
+class TermsSnapshot(object):
+    """
+    Read-only values of ``terms`` signals, all read at one moment.
+
+    Attributes follow the structure of ``terms``, such as
+    ``snap.USAXS.ar_val_center`` or ``snap.USAXS.diode.dy``.
+    ``timestamp`` is the time the values were read.
+    """
+
+    __slots__ = ("_values", "_groups", "_prefix", "timestamp")
+
+    def __init__(self, values, timestamp, prefix="", groups=None):
+        if groups is None:
+            groups = set()
+            for key in values:
+                parts = key.split(".")
+                for i in range(1, len(parts)):
+                    groups.add(".".join(parts[:i]))
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_groups", groups)
+        object.__setattr__(self, "_prefix", prefix)
+        object.__setattr__(self, "timestamp", timestamp)
+
+    def __getattr__(self, name):
+        key = self._prefix + name
+        if key in self._values:
+            return self._values[key]
+        if key in self._groups:
+            return TermsSnapshot(self._values, self.timestamp, key + ".", self._groups)
+        raise AttributeError(f"no '{key}' in this snapshot")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("snapshot is read-only")
+
+    def __repr__(self):
+        n = sum(1 for k in self._values if k.startswith(self._prefix))
+        return f"TermsSnapshot('{self._prefix}', {n} values)"
+
+
 class GeneralParameters(Device):
     """
     cache of parameters to share with/from EPICS
@@ -304,7 +354,95 @@ class GeneralParameters(Device):
 
     HeaterProcess = Component(Parameters_HeaterProcess)
 
+    def snapshot(self, *components, timeout=2):
+        """
+        Read all signals (of these components) at once, as a TermsSnapshot.
+
+        EPICS PVs are read with one concurrent Channel Access request
+        (``epics.caget_many()``), not one blocking ``get()`` per
+        signal.  A PV not read in ``timeout`` seconds is read with
+        its ``get()`` (which raises as usual).
+
+        PARAMETERS
+
+        components : str
+            Names of components, such as ``"USAXS"`` or ``"SAXS.filters"``.
+            Default: all of ``terms``.
+
+        EXAMPLE::
+
+            snap = terms.snapshot("USAXS", "FlyScan")
+            snap.USAXS.ar_val_center
+        """
+        signals = {}
+        for name in components or [""]:
+            obj = functools.reduce(getattr, name.split("."), self) if name else self
+            prefix = name + "." if name else ""
+            for walk in obj.walk_signals():
+                signals[prefix + walk.dotted_name] = walk.item
+
+        values = {}
+        epics_signals = {}      # as_string: {key: signal}
+        for key, signal in signals.items():
+            if isinstance(signal, EpicsSignalBase):
+                epics_signals.setdefault(signal.as_string, {})[key] = signal
+            else:
+                values[key] = signal.get()
+        timestamp = time.time()
+        for as_string, group in epics_signals.items():
+            results = epics.caget_many(
+                [signal.pvname for signal in group.values()],
+                as_string=as_string,
+                timeout=timeout,
+            )
+            for (key, signal), value in zip(group.items(), results):
+                values[key] = signal.get() if value is None else value
+        return TermsSnapshot(values, timestamp)
+
 
 # NOTE: ALL referenced PVs **MUST** exist or get() operations will fail!
 terms = GeneralParameters(name="terms")
 sd.baseline.append(terms)
+# counters & results written by the plans in every run: not a reason for a full baseline
+sd.untracked += [
+    terms.FlyScan.order_number,
+    terms.preUSAXStune.epoch_last_tune,
+    terms.preUSAXStune.num_scans_last_tune,
+    terms.preUSAXStune.run_tune_next,
+    terms.SAXS.collecting,
+    terms.SAXS_WAXS,
+    terms.USAXS.transmission.diode_counts,
+    terms.USAXS.transmission.diode_gain,
+    terms.USAXS.transmission.I0_counts,
+    terms.USAXS.transmission.I0_gain,
+    terms.WAXS.collecting,
+]
+
+
+def benchmark_terms_snapshot(component="USAXS", repeat=5, print_enable=True):
+    """
+    Time to read all signals of a component: one ``get()`` each vs. snapshot.
+
+    RETURNS
+
+    pyRestTable.Table with the signals and the mean time of each method
+    """
+    obj = functools.reduce(getattr, component.split("."), terms)
+    signals = [walk.item for walk in obj.walk_signals()]
+
+    def one_by_one():
+        return [signal.get() for signal in signals]
+
+    t = pyRestTable.Table()
+    t.labels = "method signals mean_ms".split()
+    for method, read in (
+            ("get() each", one_by_one),
+            ("snapshot", lambda: terms.snapshot(component)),
+            ):
+        t0 = time.time()
+        for _ in range(repeat):
+            read()
+        t.addRow((method, len(signals), f"{1000*(time.time()-t0)/repeat:.1f}"))
+    if print_enable:
+        print(t)
+    return t
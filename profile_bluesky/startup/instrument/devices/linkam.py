@@ -17,7 +17,7 @@ from ophyd import Component, Device, DeviceStatus
 from ophyd import EpicsSignal, EpicsSignalRO, EpicsSignalWithRBV, Signal
 import time
 
-from ..framework import specwriter
+from ..framework import spec_cmt
 
 
 class UsaxsProcessController(ProcessController):
@@ -137,10 +137,9 @@ class Linkam_CI94(UsaxsProcessController):
 
     def record_signal(self):
         """write signal to the logger AND SPEC file"""
-        global specwriter
         msg = f"{self.controller_name} signal: {self.get():.2f}{self.units.get()}"
         logger.info(msg)
-        specwriter._cmt("event", msg)
+        spec_cmt("event", msg)
         return msg
 
 
@@ -180,25 +179,23 @@ class Linkam_T96(UsaxsProcessController):
 
     def record_signal(self):
         """write signal to the logger AND SPEC file"""
-        global specwriter
         msg = (
             f"{self.controller_name} signal:"
             f" {self.value:.2f}{self.units.get()}"
         )
         logger.info(msg)
-        specwriter._cmt("event", msg)
+        spec_cmt("event", msg)
         return msg
 
     def set_target(self, target, wait=True, timeout=None, timeout_fail=False):
         """change controller to new temperature set point"""
-        global specwriter
 
         yield from bps.mv(self.target, target)
         yield from bps.sleep(0.1)   # settling delay for slow IOC
         yield from bps.mv(self.heating, 1)
 
         msg = f"Set {self.controller_name} to {self.target.setpoint:.2f}{self.units.get()}"
-        specwriter._cmt("event", msg)
+        spec_cmt("event", msg)
         logger.info(msg)
 
         if wait:
@@ -39,7 +39,7 @@ class ScalerChannel(Device):
         self._ch_num = ch_num
 
         super().__init__(prefix, **kwargs)
-        self.match_name()
+        # ScalerCH calls match_name() once all channels are created
 
     def match_name(self):
         self.s.name = self.chname.get()
@@ -78,6 +78,11 @@ class ScalerCH(Device):
 
     egu = Cpt(EpicsSignal, '.EGU', kind=Kind.config)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # all channel name PVs now connect in parallel, read them after
+        self.match_names()
+
     def match_names(self):
         for s in self.channels.component_names:
             getattr(self.channels, s).match_name()
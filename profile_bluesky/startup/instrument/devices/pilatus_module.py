@@ -22,6 +22,7 @@ from .area_detector_common import area_detector_EPICS_PV_prefix
 from .area_detector_common import DATABROKER_ROOT_PATH
 from .area_detector_common import EpicsDefinesHDF5FileNames
 from .area_detector_common import _validate_AD_FileWriter_path_
+from .device_connections import device_connections
 
 
 # path for HDF5 files (as seen by EPICS area detector HDF5 plugin)
@@ -58,6 +59,7 @@ try:
     saxs_det = MyPilatusDetector(
         prefix, name="saxs_det", labels=["camera", "area_detector"])
     saxs_det.read_attrs.append("hdf1")
+    device_connections.add(saxs_det)
 except TimeoutError as exc_obj:
     msg = f"Timeout connecting with {nm} ({prefix})"
     logger.warning(msg)
@@ -69,6 +71,7 @@ try:
     waxs_det = MyPilatusDetector(
         prefix, name="waxs_det", labels=["camera", "area_detector"])
     waxs_det.read_attrs.append("hdf1")
+    device_connections.add(waxs_det)
 except TimeoutError as exc_obj:
     msg = f"Timeout connecting with {nm} ({prefix})"
     logger.warning(msg)
@@ -73,6 +73,13 @@ class GSlitDevice(MotorBundle):
     v_step_into = 0.4     # 0.4mm step into the beam (blocks the beam)
     tuning_intensity_threshold = 500
 
+    # adaptive search for each blade edge (falls back to full scan if it fails)
+    adaptive_edge_search = True
+    edge_coarse_points = 20     # first scan, over the full range
+    edge_fine_points = 20       # each refinement scan, around the edge
+    edge_refinements = 1        # number of refinement scans
+    edge_span_factor = 3        # refinement range, in edge widths
+
     def set_size(self, *args, h=None, v=None):
         """move the slits to the specified size"""
         if h is None:
@@ -0,0 +1,192 @@
+"""
+history-driven scheduling of the preUSAXStune axes
+
+Each tune of an optical axis records how far the tune moved
+the axis (the *shift*) and the fitted peak width.  That history
+is kept in a local store between sessions.  From it, a simple
+drift model predicts how far each axis has wandered since its
+last tune.  ``preUSAXStune()`` will tune only those axes
+predicted to have drifted past their tolerance.
+
+Enable with ``constants["USE_TUNE_SCHEDULER"] = True``.
+
+EXAMPLE::
+
+    In [1]: tune_scheduler.report()
+    In [2]: tune_scheduler.tune_is_needed(a_stage.r)
+"""
+
+__all__ = [
+    'TuneScheduler',
+    'tune_scheduler',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from bluesky.utils import PersistentDict
+import numpy as np
+import os
+import pyRestTable
+import time
+
+from ..framework.initialize import get_md_path
+
+
+TUNE_HISTORY_DIR_NAME = "Bluesky_tune_history"
+
+
+class TuneScheduler(object):
+    """
+    Record axis tune results and decide which axes need a tune.
+
+    The drift model for each axis is a drift *rate*: the
+    shift found by each tune divided by the time since the
+    previous tune of that axis.  A conservative percentile
+    of the recent rates, times the time since the last tune,
+    is the predicted drift.  A tune is needed when the
+    predicted drift exceeds ``tolerance_fraction`` of the
+    most recent peak FWHM.
+
+    PARAMETERS
+
+    path : str
+        Directory of the local store (a ``PersistentDict``).
+    """
+
+    history_length = 50         # keep this many tunes per axis
+    min_history = 3             # need this many good tunes to predict
+    rate_percentile = 90        # conservative estimate of drift rate
+    tolerance_fraction = 0.1    # of the FWHM
+    max_interval_s = 8 * 3600   # always tune after this long
+
+    def __init__(self, path):
+        self.path = path
+        self._store = None
+
+    @property
+    def store(self):
+        """Local store of tune history, opened on first use."""
+        if self._store is None:
+            if not os.path.exists(self.path):
+                logger.info("New directory to store tune history: %s", self.path)
+                os.makedirs(self.path)
+            self._store = PersistentDict(self.path)
+        return self._store
+
+    def history(self, axis_name):
+        """Return list of tune history entries for the named axis."""
+        return list(self.store.get(axis_name, []))
+
+    def record(self, axis_name, initial_position, final_position, tune_ok, fwhm=None, t=None):
+        """Append one tune result to the history of the named axis."""
+        entry = dict(
+            time=t or time.time(),
+            initial_position=float(initial_position),
+            final_position=float(final_position),
+            shift=float(final_position) - float(initial_position),
+            tune_ok=bool(tune_ok),
+            fwhm=None if fwhm is None else abs(float(fwhm)),
+        )
+        entries = self.history(axis_name) + [entry]
+        # PersistentDict only writes on __setitem__, replace the whole list
+        self.store[axis_name] = entries[-self.history_length:]
+        logger.debug("tune history %s: %s", axis_name, entry)
+
+    def drift_rate(self, axis_name):
+        """
+        Return predicted drift rate (axis units/s) or ``None`` if not known.
+        """
+        entries = self.history(axis_name)
+        times = np.array([e["time"] for e in entries])
+        shifts = np.array([abs(e["shift"]) for e in entries])
+        ok = np.array([e["tune_ok"] for e in entries], dtype=bool)
+        if len(entries) < 2:
+            return None
+
+        intervals = np.diff(times)
+        # rate of each tune is measured since the previous tune
+        usable = ok[1:] & ok[:-1] & (intervals > 0)
+        if usable.sum() < self.min_history - 1:
+            return None
+        rates = shifts[1:][usable] / intervals[usable]
+        return float(np.percentile(rates, self.rate_percentile))
+
+    def tolerance(self, axis_name):
+        """Return allowed drift for the named axis, or ``None`` if not known."""
+        fwhm = [e["fwhm"] for e in self.history(axis_name) if e["tune_ok"] and e["fwhm"]]
+        if len(fwhm) == 0:
+            return None
+        return self.tolerance_fraction * fwhm[-1]
+
+    def predicted_drift(self, axis_name, t=None):
+        """Return predicted drift since the last tune, or ``None`` if not known."""
+        entries = self.history(axis_name)
+        rate = self.drift_rate(axis_name)
+        if rate is None:
+            return None
+        elapsed = (t or time.time()) - entries[-1]["time"]
+        return rate * elapsed
+
+    def tune_is_needed(self, axis, t=None):
+        """
+        Decide if this axis should be tuned now.
+
+        Tune when there is not enough history, the last tune failed,
+        the last tune is too old, or the predicted drift exceeds
+        the tolerance.
+        """
+        axis_name = axis if isinstance(axis, str) else axis.name
+        t = t or time.time()
+        entries = self.history(axis_name)
+        if len(entries) < self.min_history:
+            reason, needed = "not enough history", True
+        elif not entries[-1]["tune_ok"]:
+            reason, needed = "last tune failed", True
+        elif t - entries[-1]["time"] > self.max_interval_s:
+            reason, needed = "last tune is too old", True
+        else:
+            drift = self.predicted_drift(axis_name, t)
+            tolerance = self.tolerance(axis_name)
+            if drift is None or tolerance is None:
+                reason, needed = "no drift model", True
+            else:
+                needed = drift > tolerance
+                reason = f"predicted drift {drift:g}, tolerance {tolerance:g}"
+        logger.info("tune %s needed? %s (%s)", axis_name, needed, reason)
+        return needed
+
+    def shift_exceeded_tolerance(self, axis):
+        """Did the most recent tune of this axis move it past its tolerance?"""
+        axis_name = axis if isinstance(axis, str) else axis.name
+        entries = self.history(axis_name)
+        tolerance = self.tolerance(axis_name)
+        if len(entries) == 0 or tolerance is None:
+            return True
+        return abs(entries[-1]["shift"]) > tolerance
+
+    def report(self, print_enable=True):
+        """Table of the drift model for each axis in the history."""
+        t = pyRestTable.Table()
+        t.labels = "axis tunes last_tune rate/h drift tolerance needed?".split()
+        now = time.time()
+        for axis_name in sorted(self.store.keys()):
+            entries = self.history(axis_name)
+            rate = self.drift_rate(axis_name)
+            t.addRow((
+                axis_name,
+                len(entries),
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entries[-1]["time"])),
+                None if rate is None else rate * 3600,
+                self.predicted_drift(axis_name, now),
+                self.tolerance(axis_name),
+                self.tune_is_needed(axis_name, now),
+            ))
+        if print_enable:
+            print(t)
+        return t
+
+
+tune_scheduler = TuneScheduler(
+    os.path.join(os.path.dirname(get_md_path()), TUNE_HISTORY_DIR_NAME)
+)
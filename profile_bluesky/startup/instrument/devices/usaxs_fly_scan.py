@@ -3,7 +3,10 @@
 USAXS Fly Scan setup
 """
 
-__all__ = ["usaxs_flyscan",]
+__all__ = [
+    "benchmark_fly_scan_logging",
+    "usaxs_flyscan",
+    ]
 
 from ..session_logs import logger
 logger.info(__file__)
@@ -14,11 +17,16 @@ from apstools.utils import run_in_thread
 from bluesky import plan_stubs as bps
 from collections import OrderedDict
 import datetime
+import logging
+import numpy
 from ophyd import Component, Device, EpicsSignal, Signal
 import os
+import pyRestTable
+import tempfile
 import time
 import uuid
 
+from usaxs_support import saveFlyData
 from usaxs_support.saveFlyData import SaveFlyScan
 # NOTES for testing SaveFlyScan() command
 """
@@ -27,7 +35,7 @@ sfs.preliminaryWriteFile()
 sfs.saveFile()
 """
 
-from ..framework import RE, specwriter
+from ..framework import RE, spec_cmt, timeline
 from .amplifiers import upd_controls, AutorangeSettings
 from .general_terms import terms
 from .scalers import use_EPICS_scaler_channels
@@ -35,6 +43,7 @@ from .shutters import ti_filter_shutter
 from .stages import a_stage, d_stage
 from .struck3820 import struck
 from .user_data import user_data
+from ..session_logs import queue_handler
 
 
 FALLBACK_DIR = "/share1/USAXS_data"
@@ -121,50 +130,51 @@ class UsaxsFlyScanDevice(Device):
 
         @run_in_thread
         def prepare_HDF5_file():
-            fname = os.path.abspath(self.saveFlyData_HDF5_dir)
-            if not os.path.exists(fname):
-                msg = f"Must save fly scan data to an existing directory.  Gave {fname}"
-                fname = os.path.abspath(self.fallback_dir)
-                msg += f"  Using fallback directory {self.fallback_dir}"
-                logger.error(msg)
-
-            s = self.saveFlyData_HDF5_file
-            _s_ = os.path.join(fname, s)      # for testing here
-            if os.path.exists(_s_):
-                msg = f"File {_s_} exists.  Will not overwrite."
-                s = datetime.datetime.isoformat(datetime.datetime.now(), sep="_").split(".")[0]
-                s = s.replace(":", "").replace("-", "")
-                # s = "flyscan_" + s + ".h5"
-                _s_ = os.path.join(fname, s)
-                msg += f"  Using fallback file name {_s_}"
-                logger.error(msg)
-            fname = os.path.join(fname, s)
-
-            logger.info(f"HDF5 config: {self.saveFlyData_config}")
-            logger.info(f"HDF5 output: {fname}")
-            self._output_HDF5_file_ = fname
-            user_data.set_state_blocking("FlyScanning: " + os.path.split(fname)[-1])
-
-            # logger.debug(resource_usage("before SaveFlyScan()"))
-            self.saveFlyData = SaveFlyScan(
-                fname,
-                config_file=self.saveFlyData_config)
-            # logger.debug(resource_usage("before saveFlyData.preliminaryWriteFile()"))
-            self.saveFlyData.preliminaryWriteFile()
-            # logger.debug(resource_usage("after saveFlyData.preliminaryWriteFile()"))
+            with timeline.span("prepare_HDF5_file", "file"):
+                fname = os.path.abspath(self.saveFlyData_HDF5_dir)
+                if not os.path.exists(fname):
+                    msg = f"Must save fly scan data to an existing directory.  Gave {fname}"
+                    fname = os.path.abspath(self.fallback_dir)
+                    msg += f"  Using fallback directory {self.fallback_dir}"
+                    logger.error(msg)
+
+                s = self.saveFlyData_HDF5_file
+                _s_ = os.path.join(fname, s)      # for testing here
+                if os.path.exists(_s_):
+                    msg = f"File {_s_} exists.  Will not overwrite."
+                    s = datetime.datetime.isoformat(datetime.datetime.now(), sep="_").split(".")[0]
+                    s = s.replace(":", "").replace("-", "")
+                    # s = "flyscan_" + s + ".h5"
+                    _s_ = os.path.join(fname, s)
+                    msg += f"  Using fallback file name {_s_}"
+                    logger.error(msg)
+                fname = os.path.join(fname, s)
+
+                logger.info(f"HDF5 config: {self.saveFlyData_config}")
+                logger.info(f"HDF5 output: {fname}")
+                self._output_HDF5_file_ = fname
+                user_data.set_state_blocking("FlyScanning: " + os.path.split(fname)[-1])
+
+                # logger.debug(resource_usage("before SaveFlyScan()"))
+                self.saveFlyData = SaveFlyScan(
+                    fname,
+                    config_file=self.saveFlyData_config)
+                # logger.debug(resource_usage("before saveFlyData.preliminaryWriteFile()"))
+                self.saveFlyData.preliminaryWriteFile()
+                # logger.debug(resource_usage("after saveFlyData.preliminaryWriteFile()"))
 
         @run_in_thread
         def finish_HDF5_file():
-            if self.saveFlyData is None:
-                raise RuntimeError("Must first call prepare_HDF5_file()")
-            self.saveFlyData.saveFile()
+            with timeline.span("finish_HDF5_file", "file", filename=self._output_HDF5_file_):
+                if self.saveFlyData is None:
+                    raise RuntimeError("Must first call prepare_HDF5_file()")
+                self.saveFlyData.saveFile()
 
-            logger.info(f"HDF5 output complete: {self._output_HDF5_file_}")
-            self.saveFlyData = None
+                logger.info(f"HDF5 output complete: {self._output_HDF5_file_}")
+                self.saveFlyData = None
 
         ######################################################################
         # plan starts here
-        global specwriter
 
         # remember our starting conditions
         self.ar0 = a_stage.r.position
@@ -177,7 +187,7 @@ class UsaxsFlyScanDevice(Device):
         _md["hdf5_path"] = self.saveFlyData_HDF5_dir
 
         yield from bps.open_run(md=_md)
-        specwriter._cmt("start", "start USAXS Fly scan")
+        spec_cmt("start", "start USAXS Fly scan")
         yield from bps.mv(
             upd_controls.auto.mode, AutorangeSettings.auto_background,
         )
@@ -189,7 +199,7 @@ class UsaxsFlyScanDevice(Device):
         if bluesky_runengine_running:
             prepare_HDF5_file()      # prepare HDF5 file to save fly scan data (background thread)
         # path = os.path.abspath(self.saveFlyData_HDF5_dir)
-        specwriter._cmt("start", f"HDF5 configuration file: {self.saveFlyData_config}")
+        spec_cmt("start", f"HDF5 configuration file: {self.saveFlyData_config}")
 
         g = uuid.uuid4()
         yield from bps.abs_set(
@@ -206,7 +216,7 @@ class UsaxsFlyScanDevice(Device):
         yield from bps.wait(group=g)
         yield from bps.abs_set(self.flying, False)
         elapsed = time.time() - self.t0
-        specwriter._cmt("stop", f"fly scan completed in {elapsed} s")
+        spec_cmt("stop", f"fly scan completed in {elapsed} s")
 
         if bluesky_runengine_running:
             msg = f"writing fly scan HDF5 file: {self._output_HDF5_file_}"
@@ -226,7 +236,7 @@ class UsaxsFlyScanDevice(Device):
             # logger.debug(resource_usage("before saveFlyData.finish_HDF5_file()"))
             finish_HDF5_file()    # finish saving data to HDF5 file (background thread)
             # logger.debug(resource_usage("after saveFlyData.finish_HDF5_file()"))
-            specwriter._cmt("stop", f"finished {msg}")
+            spec_cmt("stop", f"finished {msg}")
             logger.info(f"finished {msg}")
 
         yield from bps.mv(
@@ -251,3 +261,57 @@ usaxs_flyscan.saveFlyData_config = "/share1/AreaDetectorConfig/FlyScan_config/sa
 # Flyscan() will override these and set them in the way the isntrument prefers.
 usaxs_flyscan.saveFlyData_HDF5_dir ="/share1/USAXS_data/test"   # developer
 usaxs_flyscan.saveFlyData_HDF5_file ="sfs.h5"
+
+
+def benchmark_fly_scan_logging(
+        num_arrays=12, num_points=8000, num_scalars=150,
+        repeat=3, print_enable=True):
+    """
+    Time to write a fly scan file: saveFlyData DEBUG logging on vs. off.
+
+    Writes (with ``saveFlyData.makeDataset()``, as ``SaveFlyScan``)
+    ``num_scalars`` values and ``num_arrays`` arrays of ``num_points``
+    into a temporary HDF5 file.  With DEBUG on, the saveFlyData
+    messages go to the session log (through its queue).
+
+    RETURNS
+
+    pyRestTable.Table with the mean write time with each setting
+    """
+    import h5py
+
+    sfd_logger = saveFlyData.logger
+    level = sfd_logger.level
+    arrays = [numpy.random.random(num_points) for _ in range(num_arrays)]
+    scalars = [[numpy.random.random()] for _ in range(num_scalars)]
+
+    def write_file(path):
+        with h5py.File(path, "w") as root:
+            group = root.create_group("entry")
+            for i, value in enumerate(scalars):
+                saveFlyData.makeDataset(group, f"scalar_{i}", value)
+            for i, value in enumerate(arrays):
+                saveFlyData.makeDataset(group, f"array_{i}", value)
+
+    t = pyRestTable.Table()
+    t.labels = "DEBUG datasets mean_ms".split()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "benchmark.h5")
+        for debug in (True, False):
+            sfd_logger.setLevel(logging.DEBUG if debug else logging.INFO)
+            sfd_logger.addHandler(queue_handler)
+            try:
+                t0 = time.time()
+                for _ in range(repeat):
+                    write_file(path)
+                elapsed = (time.time() - t0) / repeat
+            finally:
+                sfd_logger.removeHandler(queue_handler)
+                sfd_logger.setLevel(level)
+            t.addRow((
+                "on" if debug else "off",
+                num_arrays + num_scalars,
+                f"{1000*elapsed:.1f}"))
+    if print_enable:
+        print(t)
+    return t
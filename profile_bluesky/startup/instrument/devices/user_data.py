@@ -172,3 +172,12 @@ sd.baseline.append(apsbss.esaf.raw)
 
 user_data = UserDataDevice(name="user_data")
 sd.baseline.append(user_data)
+# written by the plans in every run: not a reason for a full baseline
+sd.untracked += [
+    user_data.collection_in_progress,
+    user_data.macro_file_time,
+    user_data.scanning,
+    user_data.spec_scan,
+    user_data.state,
+    user_data.time_stamp,
+]
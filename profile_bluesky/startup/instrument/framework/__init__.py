@@ -2,6 +2,13 @@ from .check_python import *
 from .check_bluesky import *
 
 from .initialize import *
+from .baseline import *
+from .batched_insert import *
+from .document_queue import *
+from .background_writer import *
 from .user_dir import *
 from .metadata import *
 from .callbacks import *
+from .message_profiler import *
+from .timeline import *
+from .live_plots import *
@@ -0,0 +1,223 @@
+
+"""
+write bookkeeping files from a background thread, in order
+
+Before the first sample of a command list is measured, the session
+writes the command table for the livedata WWW page and archives the
+command table and the user's code (``instrument_archive()``).  With
+slow NFS, these writes stalled the start of data collection.  Now,
+they are jobs for :data:`bookkeeping_writer`: the plan continues
+at once and a worker thread does the jobs, in the order submitted.
+
+* each job is tried up to ``retries`` times (``retry_delay_s`` apart)
+* a file that still cannot be written is written in ``fallback_dir``
+  (on the local disk) and the failure is logged
+* each job returns a ``concurrent.futures.Future`` (completion tracking),
+  ``flush()`` waits for all jobs
+* at exit, the jobs are finished within ``EXIT_TIMEOUT_S`` seconds;
+  jobs still waiting then go to their fallback (local disk), so a
+  hung file system does not hang the exit of the session
+
+EXAMPLE::
+
+    bookkeeping_writer.write_file("/share1/local_livedata/commands.txt", text)
+
+    In [1]: bookkeeping_writer.report()
+"""
+
+__all__ = [
+    'BackgroundWriter',
+    'bookkeeping_writer',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from concurrent.futures import Future
+import atexit
+import os
+import pyRestTable
+import queue
+import threading
+import time
+
+from usaxs_support.surveillance import archive
+
+
+FALLBACK_DIR = os.path.join(os.getcwd(), ".logs", "unwritten")
+EXIT_TIMEOUT_S = 10     # at exit, wait this long for the jobs
+
+
+class BackgroundWriter(object):
+    """
+    Do write jobs, in order, in a worker thread; retry, then fall back.
+
+    PARAMETERS
+
+    name : str
+        Name for reports and the worker thread.
+    retries : int
+        Number of tries of each job.
+    retry_delay_s : float
+        Wait between tries (seconds).
+    fallback_dir : str
+        Local directory for files that cannot be written.
+    """
+
+    def __init__(self, name, retries=3, retry_delay_s=2, fallback_dir=FALLBACK_DIR):
+        self.name = name
+        self.retries = retries
+        self.retry_delay_s = retry_delay_s
+        self.fallback_dir = fallback_dir
+        self.queue = queue.Queue()
+        self.num_jobs = 0
+        self.num_retries = 0
+        self.num_fallbacks = 0
+        self.num_failed = 0
+        self.job_time = 0           # seconds, in the worker thread
+        self._thread = threading.Thread(
+            target=self._worker_, name=f"writer {name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, description=None, fallback=None):
+        """
+        Call ``func(*args)`` in the worker thread, return a Future.
+
+        If all tries fail, ``fallback(*args)`` is called (if given).
+        The Future has the result of ``func`` (or ``fallback``) or the
+        exception of the last try.
+        """
+        future = Future()
+        description = description or getattr(func, "__name__", str(func))
+        self.queue.put((future, description, func, fallback, args))
+        return future
+
+    def write_file(self, filename, text, mode="w"):
+        """Write ``text`` to ``filename`` (fallback: ``fallback_dir``), return a Future."""
+        return self.submit(
+            _write_text_, filename, text, mode,
+            description=f"write {filename}",
+            fallback=self._write_fallback_,
+        )
+
+    def _write_fallback_(self, filename, text, mode):
+        os.makedirs(self.fallback_dir, exist_ok=True)
+        local = os.path.join(self.fallback_dir, os.path.basename(filename))
+        _write_text_(local, text, mode)
+        logger.warning("could not write %s, written to %s", filename, local)
+        return local
+
+    def _worker_(self):
+        while True:
+            future, description, func, fallback, args = self.queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    t0 = time.perf_counter()
+                    self._run_job_(future, description, func, fallback, args)
+                    self.job_time += time.perf_counter() - t0
+                self.num_jobs += 1
+            finally:
+                self.queue.task_done()
+
+    def _run_job_(self, future, description, func, fallback, args):
+        for attempt in range(1, self.retries + 1):
+            try:
+                future.set_result(func(*args))
+                return
+            except Exception as exc:
+                error = exc
+                logger.debug("%s: try %d failed: %s", description, attempt, exc)
+                if attempt < self.retries:
+                    self.num_retries += 1
+                    time.sleep(self.retry_delay_s)
+        if fallback is not None:
+            try:
+                future.set_result(fallback(*args))
+                self.num_fallbacks += 1
+                return
+            except Exception as exc:
+                error = exc
+        logger.error("%s: failed after %d tries: %s", description, self.retries, error)
+        self.num_failed += 1
+        future.set_exception(error)
+
+    def flush(self, timeout=None):
+        """Wait until all submitted jobs are done, return True if done."""
+        if timeout is None:
+            self.queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self.pending > 0:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=EXIT_TIMEOUT_S):
+        """
+        Finish the jobs (at exit): wait up to ``timeout`` seconds.
+
+        Then, the jobs still waiting are not tried again: each calls
+        its fallback (here, in this thread) or is logged as failed.
+        A job in progress (such as a write to a hung file system) is
+        left to the (daemon) worker thread.
+        """
+        if self.flush(timeout):
+            return
+        logger.error(
+            "writer %s: jobs not done after %s s, using fallbacks", self.name, timeout)
+        while True:
+            try:
+                future, description, func, fallback, args = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if fallback is None:
+                    logger.error("%s: not done at exit", description)
+                    self.num_failed += 1
+                    future.set_exception(TimeoutError(f"{description}: not done at exit"))
+                    continue
+                try:
+                    future.set_result(fallback(*args))
+                    self.num_fallbacks += 1
+                except Exception as exc:
+                    logger.error("%s: fallback failed at exit: %s", description, exc)
+                    self.num_failed += 1
+                    future.set_exception(exc)
+            finally:
+                self.queue.task_done()
+
+    @property
+    def pending(self):
+        """Number of jobs not yet done."""
+        return self.queue.unfinished_tasks
+
+    def report(self, print_enable=True):
+        """Table of jobs, retries, fallbacks, and failures."""
+        t = pyRestTable.Table()
+        t.labels = "writer jobs pending retries fallbacks failed job_s".split()
+        t.addRow((
+            self.name,
+            self.num_jobs,
+            self.pending,
+            self.num_retries,
+            self.num_fallbacks,
+            self.num_failed,
+            f"{self.job_time:.3f}",
+        ))
+        if print_enable:
+            print(t)
+        return t
+
+
+def _write_text_(filename, text, mode):
+    with open(filename, mode) as fp:
+        fp.write(text)
+    return filename
+
+
+bookkeeping_writer = BackgroundWriter("bookkeeping")
+archive.writer = bookkeeping_writer     # instrument_archive() writes, in order
+atexit.register(bookkeeping_writer.close)
@@ -0,0 +1,215 @@
+
+"""
+baseline stream recorded only when its values changed
+
+Each run used to read every baseline device (``user_data``,
+``apsbss``, the amplifiers, ``terms``, ...) at its start and end,
+also tune scans and ``documentation_run``.  With
+:class:`ChangeOnlyBaseline` (``sd``), the signals of the baseline
+devices are monitored (their values come from the monitor
+callbacks, not from new reads).  A run records the full baseline
+only when:
+
+* it is the first run of the session,
+* a monitored value differs from its value in the last full
+  baseline (numbers: more than ``rtol``, relative),
+* its plan is in ``full_baseline_plans`` (the NeXus writers link
+  to baseline values), or
+* ``sd.change_only`` is False.
+
+Other runs have ``baseline_snapshot`` in their start document: the
+uid of the run with the last full baseline.  Devices in
+``sd.volatile`` (such as the storage ring current) change all the
+time: they are not monitored, they are read at the start and end
+of every run.  A value that changes during a run is recorded in
+the full baseline of the next run.  Signals in ``sd.untracked``
+(or of devices in it) are recorded in the full baseline but their
+changes do not make one: the plans write them in every run (such as
+``user_data.state`` and the amplifier gains set by autoscale).
+
+EXAMPLE::
+
+    In [1]: sd.report()
+    In [2]: sd.change_only = False      # full baseline in every run
+"""
+
+__all__ = [
+    'ChangeOnlyBaseline',
+    'FULL_BASELINE_PLANS',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from bluesky import SupplementalData
+from bluesky.plan_stubs import trigger_and_read
+from bluesky.preprocessors import fly_during_wrapper
+from bluesky.preprocessors import monitor_during_wrapper
+from bluesky.preprocessors import plan_mutator
+import numpy as np
+import pyRestTable
+
+
+# plans written by the NeXus writers (callbacks/nxwriter_usaxs.py)
+FULL_BASELINE_PLANS = ("Flyscan", "SAXS", "uascan", "WAXS")
+
+
+class ChangeOnlyBaseline(SupplementalData):
+    """
+    SupplementalData: record the baseline when its values changed.
+
+    PARAMETERS
+
+    full_baseline_plans : [str]
+        Runs of these plans (``plan_name``) always record the full baseline.
+    """
+
+    def __init__(self, *args, full_baseline_plans=FULL_BASELINE_PLANS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.change_only = True
+        self.full_baseline_plans = list(full_baseline_plans)
+        self.volatile = []              # baseline devices read in every run
+        self.untracked = []             # signals (or devices) written by the plans
+        self.rtol = 1e-6                # numbers: relative change that counts
+        self.snapshot_uid = None        # run with the last full baseline
+        self.full_runs = 0
+        self.change_only_runs = 0
+        self._watched = set()           # baseline devices (id) monitored
+        self._reference = {}            # signal name: value in the last full baseline
+        self._current = {}              # signal name: value (monitor)
+
+    def __call__(self, plan):
+        # as SupplementalData, with the change-only baseline
+        plan = fly_during_wrapper(plan, self.flyers)
+        plan = monitor_during_wrapper(plan, self.monitors)
+        plan = self.baseline_wrapper(plan)
+        return (yield from plan)
+
+    def _watch_(self, devices):
+        """Monitor the read signals of devices not yet watched."""
+        for obj in devices:
+            if id(obj) in self._watched:
+                continue
+            read_keys = set(obj.describe())
+            if hasattr(obj, "walk_signals"):
+                signals = [walk.item for walk in obj.walk_signals()]
+            else:
+                signals = [obj]
+            for signal in signals:
+                if signal.name in read_keys:
+                    signal.subscribe(self._value_changed_, run=False)
+            self._watched.add(id(obj))
+
+    def _value_changed_(self, *args, value=None, obj=None, **kwargs):
+        self._current[getattr(obj, "name", str(obj))] = value
+
+    def _untracked_names_(self):
+        names = set()
+        for obj in self.untracked:
+            if hasattr(obj, "walk_signals"):
+                names.update(walk.item.name for walk in obj.walk_signals())
+            else:
+                names.add(obj.name)
+        return names
+
+    def _same_(self, value, reference):
+        try:
+            if isinstance(value, str) or isinstance(reference, str):
+                return value == reference
+            a, b = np.asarray(value), np.asarray(reference)
+            if a.shape != b.shape:
+                return False
+            if a.dtype.kind in "biuf" and b.dtype.kind in "biuf":
+                return bool(np.allclose(a, b, rtol=self.rtol, atol=0, equal_nan=True))
+            return bool(np.all(a == b))
+        except Exception:
+            return False
+
+    @property
+    def changed(self):
+        """Names of (tracked) signals changed since the last full baseline."""
+        untracked = self._untracked_names_()
+        return set(
+            name
+            for name, value in list(self._current.items())
+            if name in self._reference
+            and name not in untracked
+            and not self._same_(value, self._reference[name])
+        )
+
+    def _full_baseline_(self, plan_name):
+        """Should this run record the full baseline?"""
+        return (
+            not self.change_only
+            or self.snapshot_uid is None
+            or plan_name in self.full_baseline_plans
+            or len(self.changed) > 0
+        )
+
+    def baseline_wrapper(self, plan, name="baseline"):
+        """Preprocessor: as ``bluesky.preprocessors.baseline_wrapper``, change only."""
+        run = dict(full=True)
+
+        def insert_baseline(msg):
+            if msg.command not in ("open_run", "close_run"):
+                return None, None
+            # compare by identity (ophyd objects are not hashable)
+            volatile_ids = [id(obj) for obj in self.volatile]
+            stable = [obj for obj in self.baseline if id(obj) not in volatile_ids]
+            volatile = [obj for obj in self.baseline if id(obj) in volatile_ids]
+
+            if msg.command == "open_run":
+                run["full"] = self._full_baseline_(msg.kwargs.get("plan_name"))
+                if run["full"]:
+                    def full_baseline():
+                        uid = yield msg
+                        readings = yield from trigger_and_read(self.baseline, name=name)
+                        # reference: values in this baseline (changes after are kept)
+                        self._reference = {
+                            k: reading["value"]
+                            for k, reading in (readings or {}).items()
+                        }
+                        self._watch_(stable)
+                        self.snapshot_uid = uid
+                        self.full_runs += 1
+                        return uid
+                    return full_baseline(), None
+
+                def change_only_baseline():
+                    # same message (a new one would be mutated again)
+                    msg.kwargs["baseline_snapshot"] = self.snapshot_uid
+                    uid = yield msg
+                    if len(volatile) > 0:
+                        yield from trigger_and_read(volatile, name=name)
+                    self.change_only_runs += 1
+                    return uid
+                return change_only_baseline(), None
+
+            # close_run: same devices as at open_run (one descriptor)
+            devices = self.baseline if run["full"] else volatile
+
+            def post_baseline():
+                if len(devices) > 0:
+                    yield from trigger_and_read(devices, name=name)
+                return (yield msg)
+            return post_baseline(), None
+
+        if not self.baseline:
+            return (yield from plan)
+        return (yield from plan_mutator(plan, insert_baseline))
+
+    def report(self, print_enable=True):
+        """Table of baseline status."""
+        t = pyRestTable.Table()
+        t.labels = "item value".split()
+        t.addRow(("change_only", self.change_only))
+        t.addRow(("full baseline runs", self.full_runs))
+        t.addRow(("change-only runs", self.change_only_runs))
+        t.addRow(("snapshot uid", self.snapshot_uid))
+        t.addRow(("monitored devices", len(self._watched)))
+        t.addRow(("changed signals", " ".join(sorted(self.changed)) or "none"))
+        t.addRow(("volatile devices", " ".join(obj.name for obj in self.volatile)))
+        t.addRow(("untracked signals", len(self._untracked_names_())))
+        if print_enable:
+            print(t)
+        return t
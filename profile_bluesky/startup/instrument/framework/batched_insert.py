@@ -0,0 +1,402 @@
+
+"""
+insert documents into the database in batches, spool when it is slow or down
+
+Events (and datums) are grouped into EventPages (and DatumPages),
+inserted in bulk: one database call for ``batch_size`` events
+instead of one call per event.  Other documents flush the pending
+events first, so the database receives documents in order.
+
+When an insert fails, or takes longer than ``slow_s`` seconds,
+documents are appended to a local spool file (JSON lines) instead.
+The spool is replayed into the database, in order, when it responds
+again (tried every ``retry_s`` seconds).  No document is lost and
+data collection does not wait for (or fail with) the database.
+
+* pending events are inserted after ``flush_s`` seconds (timer), at
+  ``batch_size``, and before any other document (such as ``stop``)
+* inserts are idempotent: a duplicate key error (a document inserted
+  before, such as part of a page that failed) is not an error
+* a spooled document that is rejected ``max_failures`` times (not a
+  database outage) is set aside in ``<spool_file>.rejected`` so it
+  does not block the spool
+
+EXAMPLE::
+
+    In [1]: db_inserter.report()
+    In [2]: db_inserter.replay_spool()
+    In [3]: simulate_batched_inserts()
+"""
+
+__all__ = [
+    'BatchedInserter',
+    'simulate_batched_inserts',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from collections import defaultdict
+import event_model
+import json
+import numpy as np
+import os
+import pyRestTable
+import threading
+import time
+
+
+OUTAGE_ERRORS = (
+    # names of exception classes: database not available, try again later
+    "ConnectionError",
+    "ConnectionFailure",        # pymongo: also AutoReconnect, NetworkTimeout
+    "TimeoutError",
+)
+DUPLICATE_KEY = 11000           # MongoDB error code
+
+
+def _is_outage_(exc):
+    """Is ``exc`` an outage of the database (not a bad document)?"""
+    return any(c.__name__ in OUTAGE_ERRORS for c in type(exc).__mro__)
+
+
+def _is_duplicate_(exc):
+    """Is ``exc`` only duplicate key errors (already inserted)?"""
+    if getattr(exc, "code", None) == DUPLICATE_KEY:
+        return True
+    details = getattr(exc, "details", None)     # pymongo BulkWriteError
+    if not isinstance(details, dict):
+        return False
+    errors = details.get("writeErrors", [])
+    return len(errors) > 0 and all(e.get("code") == DUPLICATE_KEY for e in errors)
+
+
+def _json_default_(obj):
+    """JSON for numpy values in documents"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{obj.__class__.__name__} is not JSON serializable")
+
+
+class BatchedInserter(object):
+    """
+    Bluesky callback: batched inserts into ``insert(name, doc)``, local spool.
+
+    PARAMETERS
+
+    insert : obj
+        Database insert function, such as ``db.insert``.
+        Must accept ``event_page`` and ``datum_page`` documents.
+    spool_file : str
+        Append-only JSON lines file of documents not yet inserted.
+    batch_size : int
+        Insert the events of a descriptor when this many are pending.
+    flush_s : float
+        ... or when the oldest pending event is this old (seconds).
+    slow_s : float
+        Spool (not insert) after an insert takes longer than this.
+    retry_s : float
+        Minimum time between attempts to replay the spool.
+    max_failures : int
+        Set a spooled document aside after it is rejected this many times.
+    """
+
+    def __init__(self, insert, spool_file, batch_size=100, flush_s=2,
+                 slow_s=5, retry_s=60, max_failures=3):
+        self.insert = insert
+        self.spool_file = spool_file
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.slow_s = slow_s
+        self.retry_s = retry_s
+        self.max_failures = max_failures
+
+        self._lock = threading.RLock()
+        self._events = defaultdict(list)    # descriptor uid: [event]
+        self._datums = defaultdict(list)    # resource uid: [datum]
+        self._oldest = None                 # time of oldest pending event or datum
+        self._last_attempt = 0
+        self._slow = False
+        self._timer = None                  # flushes after flush_s
+        self._head_failures = ("", 0)       # (first spool line, rejections)
+        self.inserts = 0
+        self.inserted_documents = 0
+        self.insert_time = 0
+        self.spooled_documents = 0
+        self.replayed_documents = 0
+        self.rejected_documents = 0
+
+    @property
+    def spooling(self):
+        """Are documents going to the spool (not the database)?"""
+        if self._slow:
+            return True
+        return os.path.exists(self.spool_file) and os.path.getsize(self.spool_file) > 0
+
+    def __call__(self, name, doc):
+        with self._lock:
+            if name == "event":
+                self._pend_(self._events[doc["descriptor"]], doc)
+            elif name == "event_page":
+                for event in event_model.unpack_event_page(doc):
+                    self._pend_(self._events[doc["descriptor"]], event)
+            elif name == "bulk_events":
+                for page in event_model.bulk_events_to_event_pages(doc):
+                    self("event_page", page)
+            elif name == "datum":
+                self._pend_(self._datums[doc["resource"]], doc)
+            else:
+                self.flush()
+                self._write_(name, doc, 1)
+
+    def _pend_(self, pending, doc):
+        pending.append(doc)
+        if self._oldest is None:
+            self._oldest = time.time()
+            # flush even if no more documents arrive
+            self._timer = threading.Timer(self.flush_s, self._timed_flush_)
+            self._timer.daemon = True
+            self._timer.start()
+        if len(pending) >= self.batch_size or time.time() - self._oldest > self.flush_s:
+            self.flush()
+
+    def _timed_flush_(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Database: timed flush")
+
+    def flush(self):
+        """Insert (or spool) all pending events and datums."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for events in self._events.values():
+                if len(events) > 0:
+                    self._write_("event_page", event_model.pack_event_page(*events), len(events))
+            for datums in self._datums.values():
+                if len(datums) > 0:
+                    self._write_("datum_page", event_model.pack_datum_page(*datums), len(datums))
+            self._events.clear()
+            self._datums.clear()
+            self._oldest = None
+
+    def _write_(self, name, doc, num_docs):
+        if self.spooling:
+            if time.time() - self._last_attempt > self.retry_s:
+                self.replay_spool()
+        if not self.spooling:
+            t0 = time.time()
+            self._last_attempt = t0
+            try:
+                self._insert_(name, doc)
+            except Exception as exc:
+                logger.warning(
+                    "Database insert failed (%s), spooling to %s", exc, self.spool_file)
+            else:
+                elapsed = time.time() - t0
+                self.inserts += 1
+                self.inserted_documents += num_docs
+                self.insert_time += elapsed
+                if elapsed > self.slow_s:
+                    logger.warning(
+                        "Database insert took %.1f s, spooling to %s",
+                        elapsed, self.spool_file)
+                    self._slow = True
+                return
+        with open(self.spool_file, "a") as f:
+            f.write(json.dumps([name, doc], default=_json_default_) + "\n")
+        self.spooled_documents += num_docs
+
+    def _insert_(self, name, doc):
+        """Insert ``doc``; documents already in the database are skipped."""
+        try:
+            self.insert(name, doc)
+        except Exception as exc:
+            if not _is_duplicate_(exc):
+                raise
+            if name not in ("event_page", "datum_page"):
+                return      # already inserted
+            # part of the page was inserted: insert the rest, one by one
+            if name == "event_page":
+                item_name, items = "event", event_model.unpack_event_page(doc)
+            else:
+                item_name, items = "datum", event_model.unpack_datum_page(doc)
+            for item in items:
+                try:
+                    self.insert(item_name, item)
+                except Exception as exc:
+                    if not _is_duplicate_(exc):
+                        raise
+
+    def _reject_(self, line, error):
+        """Set a spooled document aside (it blocked the spool)."""
+        with open(self.spool_file + ".rejected", "a") as f:
+            f.write(json.dumps(dict(error=str(error), line=line.rstrip("\n"))) + "\n")
+        self.rejected_documents += 1
+        logger.error(
+            "Database rejected a spooled document (%s), set aside in %s.rejected",
+            error, self.spool_file)
+
+    def replay_spool(self):
+        """
+        Insert the spooled documents, in order, into the database.
+
+        Stops at the first failed (or slow) insert, keeping the rest of
+        the spool for the next attempt.  A document that cannot be read,
+        or is rejected (not an outage) ``max_failures`` times, is set
+        aside (see ``_reject_()``).
+
+        RETURNS
+
+        True if the spool is empty
+        """
+        with self._lock:
+            self._last_attempt = time.time()
+            if not os.path.exists(self.spool_file):
+                self._slow = False
+                return True
+            with open(self.spool_file, "r") as f:
+                lines = f.readlines()
+            done = 0
+            for line in lines:
+                if line.strip():
+                    try:
+                        name, doc = json.loads(line)
+                    except ValueError as exc:
+                        self._reject_(line, exc)
+                        done += 1
+                        continue
+                    t0 = time.time()
+                    try:
+                        self._insert_(name, doc)
+                    except Exception as exc:
+                        if _is_outage_(exc):
+                            logger.info("Database not available (%s), keep spooling", exc)
+                            break
+                        head, failures = self._head_failures
+                        failures = failures + 1 if head == line else 1
+                        self._head_failures = (line, failures)
+                        if failures < self.max_failures:
+                            logger.warning(
+                                "Database insert of spooled %s failed (%s),"
+                                " try %d of %d", name, exc, failures, self.max_failures)
+                            break
+                        self._reject_(line, exc)
+                        done += 1
+                        continue
+                    self.replayed_documents += 1
+                    if time.time() - t0 > self.slow_s:
+                        done += 1
+                        break
+                done += 1
+            remaining = lines[done:]
+            if len(remaining) == 0:
+                os.remove(self.spool_file)
+                self._slow = False
+                logger.info("Database spool replayed (%d documents)", done)
+            elif done > 0:
+                # rewrite the spool with what is left (a new file, then replace)
+                with open(self.spool_file + ".tmp", "w") as f:
+                    f.writelines(remaining)
+                os.replace(self.spool_file + ".tmp", self.spool_file)
+            return len(remaining) == 0
+
+    def report(self, print_enable=True):
+        """Table of inserts and spool status."""
+        t = pyRestTable.Table()
+        t.labels = "item value".split()
+        t.addRow(("inserts (bulk)", self.inserts))
+        t.addRow(("documents inserted", self.inserted_documents))
+        t.addRow(("insert time, s", f"{self.insert_time:.3f}"))
+        t.addRow(("documents spooled", self.spooled_documents))
+        t.addRow(("documents replayed", self.replayed_documents))
+        t.addRow(("documents set aside", self.rejected_documents))
+        t.addRow(("spooling", self.spooling))
+        t.addRow(("spool file", self.spool_file))
+        if print_enable:
+            print(t)
+        return t
+
+
+class _StandInDatabase(object):
+    """in-memory database for ``simulate_batched_inserts()``"""
+
+    def __init__(self, latency=0.002):
+        self.latency = latency
+        self.available = True
+        self.calls = 0
+        self.documents = []     # (name, uid or seq_num)
+
+    def insert(self, name, doc):
+        self.calls += 1
+        time.sleep(self.latency)
+        if not self.available:
+            raise ConnectionError("stand-in database is down")
+        if name == "event":
+            self.documents.append((name, doc["seq_num"]))
+        elif name == "event_page":
+            self.documents += [("event", s) for s in doc["seq_num"]]
+        else:
+            self.documents.append((name, doc.get("uid")))
+
+
+def simulate_batched_inserts(num_events=1000, latency=0.002, outage=(300, 600),
+                             spool_file=None, print_enable=True):
+    """
+    Insert a simulated run into a stand-in database: one by one, then batched.
+
+    The stand-in database is down for events ``outage[0]`` to
+    ``outage[1]`` (batched run only).  After the run, the spool is
+    replayed.  The documents in the database are checked to be complete
+    and in order.
+
+    RETURNS
+
+    pyRestTable.Table with database calls and time of each method
+    """
+    import tempfile
+    spool_file = spool_file or os.path.join(tempfile.mkdtemp(), "spool.jsonl")
+
+    run = [("start", dict(uid="start")), ("descriptor", dict(uid="descriptor"))]
+    for i in range(num_events):
+        run.append(("event", dict(
+            uid=f"event{i+1}", descriptor="descriptor", seq_num=i + 1,
+            time=time.time(), data=dict(I0=np.float64(i)),
+            timestamps=dict(I0=time.time()), filled={},
+        )))
+    run.append(("stop", dict(uid="stop")))
+    expected = [("start", "start"), ("descriptor", "descriptor")]
+    expected += [("event", i + 1) for i in range(num_events)]
+    expected += [("stop", "stop")]
+
+    t = pyRestTable.Table()
+    t.labels = "method db_calls time_s spooled complete".split()
+
+    one_by_one = _StandInDatabase(latency)
+    t0 = time.time()
+    for name, doc in run:
+        one_by_one.insert(name, doc)
+    t.addRow((
+        "one by one", one_by_one.calls, f"{time.time()-t0:.2f}",
+        0, one_by_one.documents == expected))
+
+    batched = _StandInDatabase(latency)
+    inserter = BatchedInserter(batched.insert, spool_file, retry_s=0)
+    t0 = time.time()
+    for name, doc in run:
+        if name == "event":
+            batched.available = not (outage[0] <= doc["seq_num"] < outage[1])
+        inserter(name, doc)
+    batched.available = True
+    inserter.replay_spool()
+    t.addRow((
+        "batched", batched.calls, f"{time.time()-t0:.2f}",
+        inserter.spooled_documents, batched.documents == expected))
+
+    if print_enable:
+        print(t)
+    return t
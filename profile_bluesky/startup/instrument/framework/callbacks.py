@@ -4,6 +4,8 @@ custom callbacks
 
 __all__ = [
     "specwriter",
+    "specwriter_submit",
+    "spec_cmt",
     "spec_comment",
     "newSpecFile",
 ]
@@ -16,6 +18,9 @@ import os
 
 logger.info(__file__)
 
+from concurrent.futures import Future
+from .document_queue import page_documents, QueuedCallback
+from . import document_queue
 from .initialize import RE, callback_db
 # from ..utils.check_file_exists import filename_exists
 
@@ -26,7 +31,14 @@ _path = (
     os.getcwd()
 )  # make the SPEC file in current working directory (assumes is writable)
 specwriter.newfile(os.path.join(_path, specwriter.spec_filename))
-callback_db["specwriter"] = RE.subscribe(specwriter.receiver)
+if document_queue.QUEUE_CALLBACKS:
+    _specwriter_queue = QueuedCallback(
+        page_documents(specwriter.receiver, events=True), "specwriter")
+    callback_db["specwriter"] = RE.subscribe(_specwriter_queue)
+else:
+    _specwriter_queue = None
+    callback_db["specwriter"] = RE.subscribe(
+        page_documents(specwriter.receiver, events=True))
 
 logger.info(f"writing to SPEC file: {specwriter.spec_filename}")
 logger.info("   >>>>   Using default SPEC file name   <<<<")
@@ -34,9 +46,35 @@ logger.info("   file will be created when bluesky ends its next scan")
 logger.info("   to change SPEC file, use command:   newUser(user)")
 
 
+def specwriter_submit(func, *args, **kwargs):
+    """
+    Call ``func(*args, **kwargs)`` in order with the SPEC file's documents.
+
+    The SPEC file is written from a worker thread (see
+    ``QueuedCallback``).  Calls that change ``specwriter`` (comments,
+    ``newfile()``) are made from the same thread, after the documents
+    already received.  Returns a ``concurrent.futures.Future``.
+
+    EXAMPLE::
+
+        specwriter_submit(specwriter.newfile, fname, RE=RE).result()
+    """
+    if _specwriter_queue is not None:
+        return _specwriter_queue.submit(func, *args, **kwargs)
+    future = Future()
+    future.set_result(func(*args, **kwargs))
+    return future
+
+
+def spec_cmt(key, text):
+    """add a comment (to the ``key`` document) of the current SPEC scan"""
+    return specwriter_submit(specwriter._cmt, key, text)
+
+
 def spec_comment(comment, doc=None):
     # supply our specwriter to the standard routine
-    apstools.filewriters.spec_comment(comment, doc, specwriter)
+    specwriter_submit(
+        apstools.filewriters.spec_comment, comment, doc, specwriter)
 
 
 def newSpecFile(title, scan_id=1):
@@ -0,0 +1,350 @@
+
+"""
+deliver documents to slow callbacks from worker threads
+
+File writers (SPEC, NeXus) and the databroker insert are subscribed
+to the RunEngine through a :class:`QueuedCallback`.  The RunEngine
+only puts each document into a bounded queue; a worker thread
+delivers the documents, in order, to the callback.  Slow NFS writes
+or database latency no longer stall the plan between points.
+
+* backpressure: when the queue is full, the RunEngine waits for room
+  (or, with ``drop_when_full``, for callbacks that are not essential
+  such as the live plots, the documents are dropped until the next
+  ``start`` document finds room: the callback never sees part of a run)
+* ``start`` and ``stop`` documents wait until the callback has
+  handled them, so a run's files are complete when the run ends,
+  except for runs of the plans in ``NO_SYNC_PLANS`` (``documentation_run``)
+* other calls to the callback's object (such as ``specwriter._cmt()``
+  or ``specwriter.newfile()``) must not run in another thread while
+  the worker writes: :meth:`QueuedCallback.submit` calls them from
+  the worker, in order with the documents
+* errors in the callback are logged and re-raised in the RunEngine
+  at the next ``start`` or ``stop`` document
+* the queue is flushed when closed (also at exit of the session)
+
+The BestEffortCallback is not queued (matplotlib must plot
+from the main thread).
+
+EXAMPLE::
+
+    In [1]: queued_callbacks_report()
+    In [2]: benchmark_queued_callbacks()
+"""
+
+__all__ = [
+    'benchmark_queued_callbacks',
+    'flush_queued_callbacks',
+    'page_documents',
+    'QueuedCallback',
+    'queued_callbacks_report',
+    'queued_subscription',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from concurrent.futures import Future
+import atexit
+import event_model
+import numpy as np
+import pyRestTable
+import queue
+import threading
+import time
+
+
+QUEUE_CALLBACKS = True      # False: subscribe callbacks directly to the RunEngine
+QUEUE_SIZE = 10000          # documents waiting for each callback
+NO_SYNC_PLANS = ("documentation_run",)  # runs that do not wait for their files
+
+_queued_callbacks = []
+_CALL = object()            # queue item: a call, not a document
+
+
+class QueuedCallbackError(RuntimeError):
+    """A queued callback raised an exception."""
+
+
+class QueuedCallback(object):
+    """
+    Callable: deliver documents to ``callback`` from a worker thread.
+
+    PARAMETERS
+
+    callback : obj
+        Bluesky callback, ``callback(name, doc)``
+    name : str
+        Name for reports and the worker thread.
+    maxsize : int
+        Maximum number of documents waiting in the queue.
+    sync_documents : [str]
+        Wait until these documents are handled before returning.
+    drop_when_full : bool
+        Drop documents (do not wait) when the queue is full.
+
+    EXAMPLE::
+
+        RE.subscribe(QueuedCallback(specwriter.receiver, "specwriter"))
+    """
+
+    def __init__(self, callback, name=None, maxsize=QUEUE_SIZE,
+                 sync_documents=("start", "stop"), drop_when_full=False):
+        self.callback = callback
+        self.name = name or getattr(callback, "__name__", str(callback))
+        self.sync_documents = sync_documents
+        self.drop_when_full = drop_when_full
+        self.num_dropped = 0
+        self._dropping = False      # dropping the documents of this run
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.errors = []            # (document name, exception) not yet re-raised
+        self.num_errors = 0
+        self.num_documents = 0
+        self.max_depth = 0
+        self.callback_time = 0      # seconds, in the worker thread
+        self.enqueue_time = 0       # seconds, in the RunEngine (not waiting for start & stop)
+        self.blocked_time = 0       # seconds, RunEngine waiting for room in the queue
+        self._closed = False
+        self._sync_run = True       # this run waits for start & stop
+        self._thread = threading.Thread(
+            target=self._worker_, name=f"callback {self.name}", daemon=True)
+        self._thread.start()
+        _queued_callbacks.append(self)
+
+    def __call__(self, name, doc):
+        if self._closed:
+            self.callback(name, doc)
+            return
+
+        t0 = time.perf_counter()
+        if self.drop_when_full:
+            if name == "start":
+                self._dropping = False
+            if not self._dropping:
+                try:
+                    self.queue.put((name, doc), block=False)
+                except queue.Full:
+                    logger.warning("%s: queue full, dropping this run", self.name)
+                    self._dropping = True
+            if self._dropping:
+                self.num_dropped += 1
+                self.enqueue_time += time.perf_counter() - t0
+                return
+        else:
+            try:
+                self.queue.put((name, doc), block=False)
+            except queue.Full:
+                self.queue.put((name, doc))
+                self.blocked_time += time.perf_counter() - t0
+        self.enqueue_time += time.perf_counter() - t0
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+        if name == "start":
+            self._sync_run = doc.get("plan_name") not in NO_SYNC_PLANS
+        if name in self.sync_documents and self._sync_run:
+            self.flush()
+            self.raise_errors()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Call ``func(*args, **kwargs)`` in the worker thread, return a Future.
+
+        The call is made in order with the documents: after those
+        already in the queue, before those received later.
+        """
+        future = Future()
+        if self._closed:
+            _call_(future, func, args, kwargs)
+        else:
+            self.queue.put((_CALL, (future, func, args, kwargs)))
+        return future
+
+    def _worker_(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                name, doc = item
+                if name is _CALL:
+                    _call_(*doc)
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    self.callback(name, doc)
+                except Exception as exc:
+                    logger.exception(
+                        "queued callback %s, %s document", self.name, name)
+                    self.errors.append((name, exc))
+                    self.num_errors += 1
+                self.callback_time += time.perf_counter() - t0
+                self.num_documents += 1
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until all documents in the queue are handled."""
+        self.queue.join()
+
+    def raise_errors(self):
+        """Raise the first callback error since the last call (if any)."""
+        if len(self.errors) > 0:
+            errors, self.errors = self.errors, []
+            name, exc = errors[0]
+            raise QueuedCallbackError(
+                f"{self.name}: {len(errors)} error(s),"
+                f" first with {name} document: {exc}"
+            ) from exc
+
+    def close(self):
+        """Flush the queue, stop the worker, then call the callback directly."""
+        if self._closed:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        if hasattr(self.callback, "flush"):
+            self.callback.flush()       # callback has its own buffer
+        self._closed = True
+        if self in _queued_callbacks:
+            _queued_callbacks.remove(self)
+
+
+def _call_(future, func, args, kwargs):
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as exc:
+        logger.exception("queued call %s", getattr(func, "__name__", func))
+        future.set_exception(exc)
+
+
+def queued_subscription(RE, callback, name):
+    """
+    Subscribe ``callback`` to ``RE``, through a queue if ``QUEUE_CALLBACKS``.
+
+    RETURNS
+
+    subscription token (for ``RE.unsubscribe()``)
+    """
+    if QUEUE_CALLBACKS:
+        callback = QueuedCallback(callback, name)
+    return RE.subscribe(callback)
+
+
+def page_documents(callback, events=False):
+    """
+    Wrap ``callback``: receive ``bulk_events`` as ``event_page`` documents.
+
+    ``collect`` (such as :class:`~instrument.plans.BatchedStream`)
+    emits ``bulk_events``, which a callback that only handles events
+    (such as the BestEffortCallback) would drop.  With
+    ``events=True``, pages are unpacked into events (for callbacks
+    that do not handle pages, such as the SPEC writer).
+
+    EXAMPLE::
+
+        RE.subscribe(page_documents(bec))
+    """
+    def receiver(name, doc):
+        if name == "bulk_events":
+            for page in event_model.bulk_events_to_event_pages(doc):
+                receiver("event_page", page)
+        elif name == "event_page" and events:
+            for event in event_model.unpack_event_page(doc):
+                callback("event", event)
+        else:
+            callback(name, doc)
+
+    return receiver
+
+
+def flush_queued_callbacks():
+    """Wait until all queued callbacks have handled their documents."""
+    for qcb in list(_queued_callbacks):
+        qcb.flush()
+
+
+def _close_all_():
+    for qcb in list(_queued_callbacks):
+        qcb.close()
+
+
+atexit.register(_close_all_)
+
+
+def queued_callbacks_report(print_enable=True):
+    """
+    Table of documents, time, and errors of each queued callback.
+
+    *callback_s* is the time moved out of the RunEngine thread,
+    *enqueue_s* the time left in the RunEngine thread (including
+    *blocked_s*, waiting for room in a full queue).
+    """
+    t = pyRestTable.Table()
+    t.labels = "callback documents callback_s enqueue_s blocked_s max_depth waiting dropped errors".split()
+    for qcb in _queued_callbacks:
+        t.addRow((
+            qcb.name,
+            qcb.num_documents,
+            f"{qcb.callback_time:.3f}",
+            f"{qcb.enqueue_time:.3f}",
+            f"{qcb.blocked_time:.3f}",
+            qcb.max_depth,
+            qcb.queue.qsize(),
+            qcb.num_dropped,
+            qcb.num_errors,
+        ))
+    if print_enable:
+        print(t)
+    return t
+
+
+def benchmark_queued_callbacks(num_points=200, callback_delay=0.005,
+                               point_time=0.01, print_enable=True):
+    """
+    Per-point latency of a slow callback: direct vs. queued.
+
+    A simulated scan emits one event each ``point_time`` seconds
+    (the time to move and count).  The simulated callback takes
+    ``callback_delay`` seconds for each document (a slow write).
+
+    RETURNS
+
+    pyRestTable.Table with the mean & maximum latency added to
+    each point and the total scan time
+    """
+    def slow_callback(name, doc):
+        time.sleep(callback_delay)
+
+    def scan(callback):
+        latency = []
+        t_start = time.perf_counter()
+        callback("start", dict(uid="start"))
+        for i in range(num_points):
+            time.sleep(point_time)
+            t0 = time.perf_counter()
+            callback("event", dict(seq_num=i + 1))
+            latency.append(time.perf_counter() - t0)
+        callback("stop", dict(uid="stop"))
+        return np.array(latency), time.perf_counter() - t_start
+
+    results = dict(direct=scan(slow_callback))
+    qcb = QueuedCallback(slow_callback, "benchmark")
+    try:
+        results["queued"] = scan(qcb)
+    finally:
+        qcb.close()
+
+    t = pyRestTable.Table()
+    t.labels = "method mean_ms max_ms scan_s".split()
+    for method, (latency, total) in results.items():
+        t.addRow((
+            method,
+            f"{1000*latency.mean():.3f}",
+            f"{1000*latency.max():.3f}",
+            f"{total:.2f}",
+        ))
+    if print_enable:
+        print(t)
+    return t
@@ -3,7 +3,7 @@ initialize the bluesky framework
 """
 
 __all__ = """
-    RE  db  sd  bec  peaks
+    RE  db  db_inserter  sd  bec  peaks
     bp  bps  bpp
     summarize_plan
     np
@@ -29,7 +29,6 @@ sys.path.append(
 # fmt: on
 
 from bluesky import RunEngine
-from bluesky import SupplementalData
 from bluesky.callbacks.best_effort import BestEffortCallback
 from bluesky.magics import BlueskyMagics
 from bluesky.simulators import summarize_plan
@@ -42,6 +41,10 @@ import databroker
 import ophyd
 import warnings
 
+from .baseline import ChangeOnlyBaseline
+from .batched_insert import BatchedInserter
+from .document_queue import page_documents, queued_subscription
+
 # convenience imports
 import bluesky.plans as bp
 import bluesky.plan_stubs as bps
@@ -87,10 +90,15 @@ db = databroker.catalog["mongodb_config"].v1
 
 # Subscribe metadatastore to documents.
 # If this is removed, data is not saved to metadatastore.
-callback_db["db"] = RE.subscribe(db.insert)
+# Events are inserted in batches, spooled locally if mongodb is slow or down.
+db_inserter = BatchedInserter(
+    db.insert,
+    os.path.join(os.path.dirname(md_path), "Bluesky_db_spool.jsonl"),
+)
+callback_db["db"] = queued_subscription(RE, db_inserter, "databroker")
 
-# Set up SupplementalData.
-sd = SupplementalData()
+# Set up SupplementalData, baseline recorded when changed.
+sd = ChangeOnlyBaseline()
 RE.preprocessors.append(sd)
 
 # Add a progress bar.
@@ -102,7 +110,7 @@ get_ipython().register_magics(BlueskyMagics)
 
 # Set up the BestEffortCallback.
 bec = BestEffortCallback()
-callback_db["bec"] = RE.subscribe(bec)
+callback_db["bec"] = RE.subscribe(page_documents(bec))
 peaks = bec.peaks  # just as alias for less typing
 bec.disable_baseline()
 
@@ -0,0 +1,205 @@
+
+"""
+live plots in a separate process
+
+Documents are sent over a local socket (``multiprocessing.connection``)
+to a viewer process (``usaxs_support/live_plot_viewer.py``) that runs
+its own BestEffortCallback and matplotlib.  Rendering never competes
+with data collection for the GIL.  The BestEffortCallback in this
+session still prints the table, with its plots disabled.
+
+The peak statistics (``peaks``, as from ``bec.peaks``) are still
+computed in this session, without plots.
+
+The viewer is started (if not already running) when this module
+is imported.  Set ``LIVE_PLOTS_PROCESS = False`` to plot in this
+session (as before).
+
+EXAMPLE::
+
+    In [1]: live_plots.start_viewer()      # if the window was closed
+    In [2]: live_plots.trim(5)             # keep only the last 5 lines
+"""
+
+__all__ = [
+    'live_plots',
+    'LivePlots',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from apstools.utils import trim_plot_by_name
+from bluesky.callbacks.best_effort import hinted_fields
+from bluesky.callbacks.core import CallbackBase
+from bluesky.callbacks.fitting import PeakStats
+from multiprocessing.connection import Client
+import os
+import subprocess
+import sys
+import time
+
+from .document_queue import page_documents, QueuedCallback
+from .initialize import bec, RE
+
+
+LIVE_PLOTS_PROCESS = True
+VIEWER_ADDRESS = ("localhost", 5578)
+VIEWER_AUTHKEY = b"usaxs live plots"
+VIEWER_SCRIPT = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "..",
+        "usaxs_support",
+        "live_plot_viewer.py",
+    )
+)
+
+
+class PeakStatsCallback(CallbackBase):
+    """
+    Peak statistics of each 1-D scan (as BestEffortCallback), without plots.
+
+    Results are put in ``peak_results`` (such as ``bec.peaks``).
+    """
+
+    def __init__(self, peak_results):
+        super().__init__()
+        self.peak_results = peak_results
+        self._start_doc = None
+        self._dim_fields = []
+        self._all_dim_fields = []
+        self._dim_stream = None
+        self._guessed_ = False
+        self._peak_stats = {}   # y_key: PeakStats
+
+    def start(self, doc):
+        self.peak_results.clear()
+        self._peak_stats = {}
+        self._start_doc = doc
+        dimensions = doc.get("hints", {}).get("dimensions")
+        if dimensions is None or len(set(d[1] for d in dimensions)) != 1:
+            # as BestEffortCallback: motor (object) names, fields found later
+            dimensions = [([motor], "primary") for motor in doc.get("motors", [])]
+            self._guessed_ = True
+        else:
+            self._guessed_ = False
+        self._dim_fields = [fields[0] for fields, stream in dimensions]
+        self._all_dim_fields = [f for fields, stream in dimensions for f in fields]
+        self._dim_stream = dimensions[0][1] if dimensions else None
+
+    def descriptor(self, doc):
+        if doc.get("name", "primary") != self._dim_stream:
+            return
+        if self._guessed_:
+            fields = []
+            for obj_name in self._dim_fields:
+                hints = doc.get("hints", {}).get(obj_name, {})
+                fields += hints.get("fields", doc["object_keys"].get(obj_name, []))
+            self._dim_fields = self._all_dim_fields = fields
+        if len(self._dim_fields) != 1:
+            return      # BestEffortCallback computes peaks only for 1-D scans
+        x_key = self._dim_fields[0]
+        for y_key in hinted_fields(doc):
+            if y_key in self._all_dim_fields:
+                continue
+            if doc["data_keys"][y_key]["dtype"] not in ("number", "integer"):
+                continue
+            ps = PeakStats(x=x_key, y=y_key)
+            ps("start", self._start_doc)
+            ps("descriptor", doc)
+            self._peak_stats[y_key] = ps
+
+    def event(self, doc):
+        for ps in self._peak_stats.values():
+            ps("event", doc)
+
+    def stop(self, doc):
+        for ps in self._peak_stats.values():
+            ps("stop", doc)
+        self.peak_results.update(self._peak_stats)
+
+
+class LivePlots(object):
+    """
+    Send documents to the live plot viewer process, keep ``peaks`` here.
+
+    Plans call :meth:`disable_plots`, :meth:`enable_plots`, and
+    :meth:`trim` (instead of ``bec`` and ``trim_plot_by_name()``)
+    so the same code works with plots in either process.
+    """
+
+    retry_s = 10    # minimum time between attempts to connect with viewer
+
+    def __init__(self, bec, RE, remote=LIVE_PLOTS_PROCESS):
+        self.bec = bec
+        self.remote = remote
+        self._connection = None
+        self._last_attempt = 0
+        self._viewer = None
+        if remote:
+            bec.disable_plots()
+            RE.subscribe(page_documents(PeakStatsCallback(bec.peaks)))
+            # plots are not essential: never wait for start & stop, nor
+            # for room in the queue (a viewer not reading blocks _send_)
+            self.queue = QueuedCallback(
+                self._send_, "live plots", sync_documents=(), drop_when_full=True)
+            RE.subscribe(page_documents(self.queue))
+
+    def _connect_(self):
+        if self._connection is None and time.time() - self._last_attempt > self.retry_s:
+            self._last_attempt = time.time()
+            try:
+                self._connection = Client(VIEWER_ADDRESS, authkey=VIEWER_AUTHKEY)
+                logger.info("Connected with live plot viewer at %s", VIEWER_ADDRESS)
+            except OSError:
+                self._connection = None
+        return self._connection
+
+    def _send_(self, name, doc):
+        connection = self._connect_()
+        if connection is None:
+            return      # no viewer: documents are not plotted
+        try:
+            connection.send((name, doc))
+        except (OSError, EOFError):
+            logger.info("Live plot viewer disconnected")
+            self._connection = None
+
+    def start_viewer(self):
+        """Start the viewer process (unless one is running)."""
+        self._last_attempt = 0
+        if self._connect_() is not None:
+            return
+        host, port = VIEWER_ADDRESS
+        self._viewer = subprocess.Popen(
+            [sys.executable, VIEWER_SCRIPT, "--host", host, "--port", str(port)],
+        )
+        logger.info("Started live plot viewer, PID %d", self._viewer.pid)
+        self._last_attempt = 0      # connect with the next document
+
+    def disable_plots(self):
+        """Stop plotting in this session (not needed with a viewer)."""
+        if not self.remote:
+            self.bec.disable_plots()
+
+    def enable_plots(self):
+        """Resume plotting in this session (not needed with a viewer)."""
+        if not self.remote:
+            self.bec.enable_plots()
+
+    def trim(self, n=3):
+        """Keep only the last ``n`` lines on each plot."""
+        if self.remote:
+            self.queue("trim", dict(n=n))
+        else:
+            trim_plot_by_name(n=n)
+
+
+live_plots = LivePlots(bec, RE)
+if live_plots.remote:
+    try:
+        live_plots.start_viewer()
+    except Exception as exc:
+        logger.warning("Could not start live plot viewer: %s", exc)
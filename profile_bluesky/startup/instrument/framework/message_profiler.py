@@ -0,0 +1,197 @@
+
+"""
+RunEngine message latency profiler
+
+Times each ``set``, ``trigger``, ``read``, ``save``, and ``wait``
+message, by plan and by device (or signal).  The latency of a
+``set`` or ``trigger`` is measured until the device reports it is
+done, so slow PVs and IOCs stand out.  A ``wait`` is labeled by the
+devices set or triggered in its group.  Each device is assigned
+to an IOC by the first part of its PV names (such as ``9idcLAX``
+or ``9idcRIO``).
+
+After a command list, a summary is logged (and written as JSON
+if ``message_profiler.json_file`` is set).
+
+EXAMPLE::
+
+    In [1]: message_profiler.enable()
+    In [2]: RE(some_plan())
+    In [3]: message_profiler.report()
+    In [4]: message_profiler.disable()
+"""
+
+__all__ = [
+    'MessageProfiler',
+    'message_profiler',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from collections import defaultdict
+import json
+import numpy as np
+import pyRestTable
+import time
+
+from .initialize import RE
+
+
+PROFILED_COMMANDS = "set trigger read save wait".split()
+HISTOGRAM_BINS = np.logspace(-4, 3, 15)   # seconds
+
+
+class MessageProfiler(object):
+    """
+    Measure latency of RunEngine messages, by plan, command, and device.
+
+    Wraps the RunEngine's command functions while enabled.
+    """
+
+    json_file = None        # write summary here after each command list
+
+    def __init__(self, RE):
+        self.RE = RE
+        self._originals = {}
+        self.plan_name = None
+        self.latencies = defaultdict(list)  # (plan, command, name): [seconds]
+        self.iocs = {}                      # name: IOC
+        self._group_names = defaultdict(set)
+
+    @property
+    def enabled(self):
+        return len(self._originals) > 0
+
+    def enable(self):
+        """Start profiling RunEngine messages."""
+        if self.enabled:
+            return
+        for command in PROFILED_COMMANDS + ["open_run"]:
+            # RunEngine has no public getter for a registered command
+            original = self.RE._command_registry[command]
+            self._originals[command] = original
+            self.RE.register_command(command, self._wrap_(command, original))
+
+    def disable(self):
+        """Stop profiling, keep the results."""
+        for command, original in self._originals.items():
+            self.RE.register_command(command, original)
+        self._originals = {}
+
+    def clear(self):
+        """Forget all results."""
+        self.latencies.clear()
+        self._group_names.clear()
+
+    def _ioc_(self, obj):
+        """first part of the object's (or its first signal's) PV name"""
+        pvname = getattr(obj, "pvname", None) or getattr(obj, "prefix", None)
+        if not pvname and hasattr(obj, "walk_signals"):
+            for walk in obj.walk_signals():
+                pvname = getattr(walk.item, "pvname", None)
+                if pvname:
+                    break
+        if not pvname or ":" not in pvname:
+            return "(not EPICS)"
+        return pvname.split(":")[0]
+
+    def _wrap_(self, command, original):
+        async def profiled(msg):
+            if command == "open_run":
+                self.plan_name = msg.kwargs.get("plan_name")
+                return await original(msg)
+
+            if command == "wait":
+                group = msg.args[0] if msg.args else msg.kwargs.get("group")
+                name = ",".join(sorted(self._group_names.pop(group, []))) or "(nothing)"
+            else:
+                name = getattr(msg.obj, "name", str(msg.obj))
+                if name not in self.iocs:
+                    self.iocs[name] = self._ioc_(msg.obj)
+            key = (self.plan_name or "(no run)", command, name)
+
+            t0 = time.time()
+            result = await original(msg)
+            if command in ("set", "trigger") and hasattr(result, "add_callback"):
+                self._group_names[msg.kwargs.get("group")].add(name)
+
+                def done(status=None):
+                    self.latencies[key].append(time.time() - t0)
+
+                result.add_callback(done)
+            else:
+                self.latencies[key].append(time.time() - t0)
+            return result
+
+        return profiled
+
+    def summary(self):
+        """Return list of statistics (and histogram) for each plan, command, and name."""
+        results = []
+        for (plan, command, name), values in self.latencies.items():
+            v = np.array(values)
+            results.append(dict(
+                plan=plan,
+                command=command,
+                name=name,
+                ioc=self.iocs.get(name, ""),
+                count=len(v),
+                total_s=v.sum(),
+                mean_s=v.mean(),
+                p50_s=np.percentile(v, 50),
+                p90_s=np.percentile(v, 90),
+                max_s=v.max(),
+                histogram=np.histogram(v, HISTOGRAM_BINS)[0].tolist(),
+            ))
+        return sorted(results, key=lambda r: -r["total_s"])
+
+    def report(self, rows=30, print_enable=True):
+        """Tables of the slowest messages and of the time for each IOC."""
+        summary = self.summary()
+        t = pyRestTable.Table()
+        t.labels = "plan command name ioc count total_s mean_ms p90_ms max_ms".split()
+        for r in summary[:rows]:
+            t.addRow((
+                r["plan"], r["command"], r["name"], r["ioc"], r["count"],
+                f"{r['total_s']:.3f}",
+                f"{1000*r['mean_s']:.1f}",
+                f"{1000*r['p90_s']:.1f}",
+                f"{1000*r['max_s']:.1f}",
+            ))
+
+        # wait is excluded, it is time already counted by set & trigger
+        by_ioc = defaultdict(lambda: [0, 0.0])
+        for r in summary:
+            if r["command"] != "wait":
+                by_ioc[r["ioc"]][0] += r["count"]
+                by_ioc[r["ioc"]][1] += r["total_s"]
+        ioc_table = pyRestTable.Table()
+        ioc_table.labels = "ioc messages total_s".split()
+        for ioc, (count, total) in sorted(by_ioc.items(), key=lambda kv: -kv[1][1]):
+            ioc_table.addRow((ioc, count, f"{total:.3f}"))
+
+        if print_enable:
+            print(t)
+            print(ioc_table)
+        return t, ioc_table
+
+    def write_json(self, filename):
+        """Write the summary to a JSON file."""
+        with open(filename, "w") as f:
+            json.dump(
+                dict(histogram_bins_s=HISTOGRAM_BINS.tolist(), results=self.summary()),
+                f, indent=2)
+
+    def dump(self):
+        """Log the report (and write JSON file, if configured), then clear."""
+        if not self.enabled or len(self.latencies) == 0:
+            return
+        t, ioc_table = self.report(print_enable=False)
+        logger.info("RunEngine message latency:\n%s\n%s", t, ioc_table)
+        if self.json_file is not None:
+            self.write_json(self.json_file)
+        self.clear()
+
+
+message_profiler = MessageProfiler(RE)
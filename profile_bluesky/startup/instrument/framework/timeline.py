@@ -0,0 +1,186 @@
+
+"""
+timeline of command list execution, as a Chrome trace
+
+Records nested spans (start and duration) of each command file line,
+of plan phases (mode changes, tunes, transmission, autoscale,
+acquisition, ...), and of background threads (such as the HDF5
+file of a fly scan).  The file is Chrome trace event JSON, view it
+with https://ui.perfetto.dev or ``chrome://tracing``.
+
+Disabled by default.  When disabled, each span costs one attribute
+test.  When enabled, each span appends one dictionary to a list
+(a few microseconds), much less than 1% of any plan that moves
+or counts.  The trace is written after each command list.
+
+EXAMPLE::
+
+    In [1]: timeline.enable("/share1/USAXS_data/timeline.json")
+    In [2]: RE(run_command_file("overnight.txt"))
+    In [3]: timeline.disable()
+"""
+
+__all__ = [
+    'ChromeTimeline',
+    'timeline',
+    'traced_plan',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from contextlib import contextmanager
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+
+
+class ChromeTimeline(object):
+    """
+    Collect spans as Chrome trace events, write them as JSON.
+
+    Spans in the RunEngine thread are recorded from plans with
+    :meth:`plan_span` (or the :func:`traced_plan` decorator).
+    Spans in other threads (or any ordinary code) are recorded
+    with the :meth:`span` context manager.
+    """
+
+    max_events = 1_000_000  # stop recording (but keep running) beyond this
+
+    def __init__(self):
+        self.enabled = False
+        self.filename = None
+        self.events = []
+        self._t0 = time.perf_counter()
+        self._started = datetime.datetime.now()
+        self._pid = os.getpid()
+        self._threads = set()
+
+    def enable(self, filename=None):
+        """Start recording, write to ``filename`` after each command list."""
+        if filename is not None:
+            self.filename = os.path.abspath(filename)
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording, keep the events."""
+        self.enabled = False
+
+    def clear(self):
+        """Forget all events, restart the clock."""
+        self.events = []
+        self._threads = set()
+        self._t0 = time.perf_counter()
+        self._started = datetime.datetime.now()
+
+    def _now_(self):
+        """microseconds since the clock started"""
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def _add_(self, name, category, ts, dur, args):
+        if len(self.events) >= self.max_events:
+            return
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads.add(tid)
+            self.events.append(dict(
+                name="thread_name", ph="M", pid=self._pid, tid=tid,
+                args=dict(name=threading.current_thread().name),
+            ))
+        event = dict(
+            name=name, cat=category, ph="X",
+            ts=ts, dur=dur, pid=self._pid, tid=tid,
+        )
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category="task", **args):
+        """
+        Context manager: record the time spent in the ``with`` block.
+
+        EXAMPLE::
+
+            with timeline.span("finish_HDF5_file", "file", filename=fname):
+                ...
+        """
+        if not self.enabled:
+            yield
+            return
+        ts = self._now_()
+        try:
+            yield
+        finally:
+            self._add_(name, category, ts, self._now_() - ts, args)
+
+    def plan_span(self, plan, name, category="plan", **args):
+        """
+        Plan: run ``plan``, record the time from its first to its last message.
+
+        EXAMPLE::
+
+            yield from timeline.plan_span(mode_USAXS(), "mode_USAXS", "mode")
+        """
+        if not self.enabled:
+            return (yield from plan)
+        ts = self._now_()
+        try:
+            return (yield from plan)
+        finally:
+            self._add_(name, category, ts, self._now_() - ts, args)
+
+    def instant(self, name, category="event", **args):
+        """Record a moment (such as an exception or a retry)."""
+        if not self.enabled or len(self.events) >= self.max_events:
+            return
+        event = dict(
+            name=name, cat=category, ph="i", s="t",
+            ts=self._now_(), pid=self._pid, tid=threading.get_ident(),
+        )
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        self.events.append(event)
+
+    def write(self, filename=None):
+        """Write the events (so far) to a Chrome trace JSON file."""
+        filename = filename or self.filename
+        if filename is None:
+            raise ValueError("No file name for the timeline.")
+        trace = dict(
+            traceEvents=list(self.events),
+            displayTimeUnit="ms",
+            otherData=dict(started=self._started.isoformat(" ")),
+        )
+        with open(filename, "w") as f:
+            json.dump(trace, f)
+        logger.info("Wrote %d timeline events to %s", len(trace["traceEvents"]), filename)
+
+    def dump(self):
+        """Write the file, if enabled and configured (after a command list)."""
+        if self.enabled and self.filename is not None and len(self.events) > 0:
+            self.write()
+
+
+timeline = ChromeTimeline()
+
+
+def traced_plan(category="plan"):
+    """
+    Decorator: record each call of a plan function as a span in the timeline.
+
+    EXAMPLE::
+
+        @traced_plan("mode")
+        def mode_USAXS(md=None):
+            ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return timeline.plan_span(func(*args, **kwargs), func.__name__, category)
+        return wrapper
+    return decorator
@@ -8,7 +8,11 @@ syntax or passed to the bluesky RunEngine such as ``RE(plan())``.
 
 from .area_detector import *
 from .axis_tuning import *
+from .batched_stream import *
+from .benchmarks import *
+from .command_journal import *
 from .command_list import *
+from .command_order import *
 from .doc_run import *
 from .filters import *
 from .mode_changes import *
@@ -41,7 +41,8 @@ from ..devices.monochromator import monochromator
 from ..devices.scalers import scaler0, I0_SIGNAL, I00_SIGNAL, UPD_SIGNAL
 from ..devices.general_terms import terms
 from ..devices.suspenders import suspend_BeamInHutch
-from ..framework import RE
+from ..devices.tune_scheduler import tune_scheduler
+from ..framework import RE, traced_plan
 from .mode_changes import mode_USAXS
 from .requested_stop import IfRequestedStopBeforeNextScan
 
@@ -77,7 +78,16 @@ def _tune_base_(axis, md={}):
         logger.info(f"  fwhm: {axis.tuner.peaks.fwhm}")
     logger.info(f"final position: {axis.position}")
 
+    tune_scheduler.record(
+        axis.name,
+        axis_start,
+        axis.position,
+        found,
+        fwhm=axis.tuner.peaks.fwhm if found else None,
+    )
+
 
+@traced_plan("tune")
 def tune_mr(md={}):
     yield from bps.mv(scaler0.preset_time, 0.1)
     md['plan_name'] = "tune_mr"
@@ -85,6 +95,7 @@ def tune_mr(md={}):
     yield from _tune_base_(m_stage.r, md=md)
 
 
+@traced_plan("tune")
 def tune_m2rp(md={}):
     yield from bps.sleep(0.2)   # piezo is fast, give the system time to react
     yield from bps.mv(scaler0.preset_time, 0.1)
@@ -105,12 +116,14 @@ if m_stage.isChannelCut:
     tune_m2rp = empty_plan
 
 
+@traced_plan("tune")
 def tune_msrp(md={}):
     yield from bps.mv(scaler0.preset_time, 0.1)
     md['plan_name'] = "tune_msrp"
     yield from _tune_base_(ms_stage.rp, md=md)
 
 
+@traced_plan("tune")
 def tune_ar(md={}):
     yield from bps.mv(ti_filter_shutter, "open")
     ##redundant## yield from autoscale_amplifiers([upd_controls])
@@ -121,6 +134,7 @@ def tune_ar(md={}):
     yield from bps.mv(upd_controls.auto.mode, "auto+background")
 
 
+@traced_plan("tune")
 def tune_asrp(md={}):
     yield from bps.mv(ti_filter_shutter, "open")
     ##redundant## yield from autoscale_amplifiers([upd_controls])
@@ -131,6 +145,7 @@ def tune_asrp(md={}):
     yield from bps.mv(upd_controls.auto.mode, "auto+background")
 
 
+@traced_plan("tune")
 def tune_a2rp(md={}):
     yield from bps.mv(ti_filter_shutter, "open")
     yield from bps.sleep(0.1)   # piezo is fast, give the system time to react
@@ -143,6 +158,7 @@ def tune_a2rp(md={}):
     yield from bps.sleep(0.1)   # piezo is fast, give the system time to react
 
 
+@traced_plan("tune")
 def tune_dx(md={}):
     yield from bps.mv(ti_filter_shutter, "open")
     ##redundant## yield from autoscale_amplifiers([upd_controls])
@@ -153,6 +169,7 @@ def tune_dx(md={}):
     yield from bps.mv(upd_controls.auto.mode, "auto+background")
 
 
+@traced_plan("tune")
 def tune_dy(md={}):
     yield from bps.mv(ti_filter_shutter, "open")
     ##redundant## yield from autoscale_amplifiers([upd_controls])
@@ -163,6 +180,7 @@ def tune_dy(md={}):
     yield from bps.mv(upd_controls.auto.mode, "auto+background")
 
 
+@traced_plan("tune")
 def tune_diode(md={}):
     yield from tune_dx(md=md)
     yield from tune_dy(md=md)
@@ -171,6 +189,7 @@ def tune_diode(md={}):
 # -------------------------------------------
 
 
+@traced_plan("tune")
 def tune_usaxs_optics(side=False, md={}):
     """
     tune all the instrument optics currently in configuration
@@ -201,6 +220,7 @@ def tune_usaxs_optics(side=False, md={}):
     )
 
 
+@traced_plan("tune")
 def tune_saxs_optics(md={}):
     yield from tune_mr(md=md)
     yield from tune_m2rp(md=md)
@@ -210,6 +230,7 @@ def tune_saxs_optics(md={}):
     )
 
 
+@traced_plan("tune")
 def tune_after_imaging(md={}):
     epics_ar_tune_range = axis_tune_range.ar.get()  # remember
 
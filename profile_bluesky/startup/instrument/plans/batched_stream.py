@@ -0,0 +1,202 @@
+
+"""
+data stream of a step scan, emitted as pages of several points
+
+``addDeviceDataAsStream()`` (create, read, save) makes one event
+document per point and runs every callback (databroker, SPEC and
+NeXus writers, BEC, live plots) once per point.  A
+:class:`BatchedStream` reads the same devices at each point but
+keeps the readings until ``batch_size`` points (or ``flush_s``
+seconds) are waiting, then emits them with one ``collect``: a
+single ``bulk_events`` document.  Each point keeps its own time
+and timestamps.
+
+The callbacks of this session receive it as EventPages: the
+databroker inserter and the NeXus writers handle pages; the BEC,
+live plots, and SPEC writer are subscribed through
+``page_documents()``.
+
+EXAMPLE::
+
+    primary = BatchedStream(read_devices, "primary")
+    for ...:
+        ...
+        yield from primary.read_point()
+    yield from primary.flush()
+
+    In [1]: benchmark_batched_stream()
+"""
+
+__all__ = [
+    'BatchedStream',
+    'benchmark_batched_stream',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from bluesky import plan_stubs as bps
+from ophyd.status import StatusBase
+import pyRestTable
+import time
+
+from ..framework.document_queue import page_documents
+
+
+class BatchedStream(object):
+    """
+    Flyer-like: readings of ``devices`` at each point, emitted in pages.
+
+    PARAMETERS
+
+    devices : [obj]
+        ophyd objects to read at each point.
+    stream_name : str
+        Name of the document stream (such as ``"primary"``).
+    batch_size : int
+        Emit the readings when this many points are waiting.
+    flush_s : float
+        ... or when the oldest waiting point is this old (seconds).
+    """
+
+    parent = None
+
+    def __init__(self, devices, stream_name="primary", batch_size=20, flush_s=2):
+        self.devices = list(devices)
+        self.stream_name = stream_name
+        self.name = f"{stream_name}_points"     # for object_keys & hints
+        self.batch_size = batch_size
+        self.flush_s = flush_s
+        self.num_points = 0
+        self.num_pages = 0
+        self._points = []       # (time, reading)
+        self._oldest = None
+        self._describe = None
+        self._configuration = None
+
+    @property
+    def hints(self):
+        fields = []
+        for obj in self.devices:
+            fields += getattr(obj, "hints", {}).get("fields", [])
+        return dict(fields=fields)
+
+    def _merge_(self, method):
+        merged = {}
+        for obj in self.devices:
+            merged.update(getattr(obj, method)())
+        return merged
+
+    def kickoff(self):
+        """Flyer interface: nothing to start."""
+        status = StatusBase()
+        status.set_finished()
+        return status
+
+    def complete(self):
+        """Flyer interface: nothing to wait for."""
+        return self.kickoff()
+
+    def describe_collect(self):
+        if self._describe is None:
+            self._describe = self._merge_("describe")
+        return {self.stream_name: self._describe}
+
+    def describe_configuration(self):
+        return self._merge_("describe_configuration")
+
+    def read_configuration(self):
+        # only used for the descriptor, read once
+        if self._configuration is None:
+            self._configuration = self._merge_("read_configuration")
+        return self._configuration
+
+    def collect(self):
+        points, self._points = self._points, []
+        self._oldest = None
+        for t, reading in points:
+            yield dict(
+                time=t,
+                data={k: v["value"] for k, v in reading.items()},
+                timestamps={k: v["timestamp"] for k, v in reading.items()},
+            )
+
+    def read_point(self):
+        """plan: read the devices (one point), emit the waiting points when due"""
+        reading = {}
+        for obj in self.devices:
+            reading.update((yield from bps.read(obj)))
+        self._points.append((time.time(), reading))
+        self.num_points += 1
+        if self._oldest is None:
+            self._oldest = time.time()
+        if len(self._points) >= self.batch_size or time.time() - self._oldest > self.flush_s:
+            yield from self.flush()
+
+    def flush(self):
+        """plan: emit the waiting points (call before the run closes)"""
+        if len(self._points) > 0:
+            yield from bps.collect(self, stream=False, return_payload=False)
+            self.num_pages += 1
+
+
+def benchmark_batched_stream(num_points=1000, batch_size=20, print_enable=True):
+    """
+    Step scan of simulated devices: one event per point vs. batched pages.
+
+    A new RunEngine (not ``RE``) runs each scan with one subscribed
+    callback (through ``page_documents()``, as the BEC).
+
+    RETURNS
+
+    pyRestTable.Table with the documents and time of each method
+    """
+    from apstools.plans import addDeviceDataAsStream
+    from bluesky import preprocessors as bpp
+    from bluesky import RunEngine
+    from bluesky.callbacks.core import CallbackBase
+    from ophyd.sim import det, motor
+
+    class Receiver(CallbackBase):
+        def __init__(self):
+            super().__init__()
+            self.documents = 0
+            self.events = 0
+
+        def __call__(self, name, doc):
+            self.documents += 1
+            return super().__call__(name, doc)
+
+        def event(self, doc):
+            self.events += 1
+
+    def scan(stream):
+        @bpp.run_decorator()
+        def _scan_():
+            for i in range(num_points):
+                yield from bps.mv(motor, i)
+                yield from bps.trigger(det, wait=True)
+                if stream is None:
+                    yield from addDeviceDataAsStream([motor, det], "primary")
+                else:
+                    yield from stream.read_point()
+            if stream is not None:
+                yield from stream.flush()
+        return _scan_()
+
+    t = pyRestTable.Table()
+    t.labels = "method documents events time_s".split()
+    for method, stream in (
+            ("one event per point", None),
+            (f"pages of {batch_size}", BatchedStream([motor, det], batch_size=batch_size)),
+            ):
+        receiver = Receiver()
+        RE = RunEngine({})
+        RE.subscribe(page_documents(receiver))
+        t0 = time.time()
+        RE(scan(stream))
+        t.addRow((method, receiver.documents, receiver.events, f"{time.time()-t0:.3f}"))
+
+    if print_enable:
+        print(t)
+    return t
@@ -0,0 +1,249 @@
+
+"""
+benchmark representative plans, to track speed of data collection
+
+Not a plan: ``run_plan_benchmarks()`` calls ``RE()`` for each plan.
+Run it in a session connected to the simulated IOC
+(``usaxs_support/sim_ioc.py``), never at the beamline.
+
+For each plan, these are measured:
+
+* wall clock time
+* number of RunEngine messages, by command
+* number of Channel Access gets and puts (monitored values are not counted)
+* time spent in the RunEngine callbacks (databroker, BEC, file writers, ...)
+
+Results (one JSON object per benchmark) are appended to a file,
+with the git commit of this package, to compare across commits.
+
+EXAMPLE::
+
+    In [1]: run_plan_benchmarks("benchmarks.jsonl")
+    In [2]: compare_plan_benchmarks("benchmarks.jsonl")
+"""
+
+__all__ = """
+    compare_plan_benchmarks
+    PlanMetrics
+    run_plan_benchmarks
+""".split()
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from collections import defaultdict
+import datetime
+import epics
+import json
+import os
+import pyRestTable
+import subprocess
+import tempfile
+import time
+
+from ..framework import RE
+from .command_list import run_command_file
+from .scans import preUSAXStune, SAXS, USAXSscan, WAXS
+from .tune_guard_slits import tune_Gslits
+
+
+class PlanMetrics(object):
+    """
+    Context manager: count messages, CA gets & puts, and time callbacks.
+
+    EXAMPLE::
+
+        with PlanMetrics() as metrics:
+            RE(some_plan())
+        print(metrics.summary())
+    """
+
+    _ca_functions = "get get_with_metadata put".split()
+
+    def __init__(self):
+        self.messages = defaultdict(int)
+        self.ca_calls = defaultdict(int)
+        self.callback_time = 0
+        self.wall_time = 0
+        self._originals = {}
+
+    def _msg_hook_(self, msg):
+        self.messages[msg.command] += 1
+        if self._originals["msg_hook"] is not None:
+            self._originals["msg_hook"](msg)
+
+    def _counted_(self, name, function):
+        def wrapper(*args, **kwargs):
+            self.ca_calls[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def _timed_process_(self, name, doc):
+        t0 = time.time()
+        try:
+            return self._originals["process"](name, doc)
+        finally:
+            self.callback_time += time.time() - t0
+
+    def __enter__(self):
+        self._originals["msg_hook"] = RE.msg_hook
+        RE.msg_hook = self._msg_hook_
+        self._originals["process"] = RE.dispatcher.process
+        RE.dispatcher.process = self._timed_process_
+        for name in self._ca_functions:
+            function = getattr(epics.ca, name, None)
+            if function is not None:
+                self._originals[name] = function
+                setattr(epics.ca, name, self._counted_(name, function))
+        self._t0 = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_time = time.time() - self._t0
+        RE.msg_hook = self._originals.pop("msg_hook")
+        RE.dispatcher.process = self._originals.pop("process")
+        for name, function in self._originals.items():
+            setattr(epics.ca, name, function)
+        self._originals = {}
+
+    def summary(self):
+        """Return dictionary of the metrics."""
+        return dict(
+            wall_time_s=self.wall_time,
+            callback_time_s=self.callback_time,
+            messages=dict(self.messages),
+            num_messages=sum(self.messages.values()),
+            ca_gets=self.ca_calls["get"] + self.ca_calls["get_with_metadata"],
+            ca_puts=self.ca_calls["put"],
+        )
+
+
+def _git_commit_():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _write_command_file_(path, num_lines=20):
+    """Write a command file of num_lines sample measurements."""
+    actions = "USAXSscan SAXS WAXS".split()
+    with open(path, "w") as f:
+        f.write("# benchmark command file\n")
+        for i in range(num_lines):
+            f.write(f"{actions[i % 3]} {i % 5} {i // 5} 0 benchmark_{i+1}\n")
+    return path
+
+
+def _benchmark_plans_(command_file):
+    return dict(
+        USAXSscan=lambda: USAXSscan(0, 0, 0, "benchmark"),
+        SAXS=lambda: SAXS(0, 0, 0, "benchmark"),
+        WAXS=lambda: WAXS(0, 0, 0, "benchmark"),
+        command_file_20=lambda: run_command_file(command_file),
+        preUSAXStune=lambda: preUSAXStune(),
+        tune_Gslits=lambda: tune_Gslits(),
+    )
+
+
+def run_plan_benchmarks(results_file="plan_benchmarks.jsonl", names=None, print_enable=True):
+    """
+    Run the benchmark plans, append results to ``results_file``.
+
+    PARAMETERS
+
+    results_file : str
+        JSON lines file, one result per line
+    names : [str]
+        Run only these benchmarks (default: all of
+        ``USAXSscan SAXS WAXS command_file_20 preUSAXStune tune_Gslits``).
+    """
+    command_file = _write_command_file_(
+        os.path.join(tempfile.mkdtemp(), "benchmark_commands.txt"))
+    plans = _benchmark_plans_(command_file)
+    commit = _git_commit_()
+    timestamp = datetime.datetime.now().isoformat(" ")
+
+    results = []
+    for name in names or plans:
+        logger.info("benchmark: %s", name)
+        status = "success"
+        with PlanMetrics() as metrics:
+            try:
+                RE(plans[name]())
+            except Exception as exc:
+                logger.error("benchmark %s: %s", name, exc)
+                status = f"{exc.__class__.__name__}: {exc}"
+        result = dict(
+            benchmark=name, commit=commit, timestamp=timestamp, status=status)
+        result.update(metrics.summary())
+        results.append(result)
+        with open(results_file, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+    if print_enable:
+        t = pyRestTable.Table()
+        t.labels = "benchmark wall_s callbacks_s messages ca_gets ca_puts status".split()
+        for r in results:
+            t.addRow((
+                r["benchmark"],
+                f"{r['wall_time_s']:.2f}",
+                f"{r['callback_time_s']:.2f}",
+                r["num_messages"],
+                r["ca_gets"],
+                r["ca_puts"],
+                r["status"],
+            ))
+        print(t)
+    return results
+
+
+def compare_plan_benchmarks(results_file="plan_benchmarks.jsonl", commits=None):
+    """
+    Table comparing wall time of each benchmark between two commits.
+
+    Default: the last two commits in the results file.
+    """
+    with open(results_file, "r") as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    if commits is None:
+        commits = []
+        for r in results:
+            if r["commit"] in commits:
+                commits.remove(r["commit"])
+            commits.append(r["commit"])
+        commits = commits[-2:]
+    if len(commits) < 2:
+        raise ValueError(f"Need two commits to compare, found {commits}")
+    before, after = commits
+
+    def latest(commit):
+        # most recent successful result of each benchmark
+        return {
+            r["benchmark"]: r
+            for r in results
+            if r["commit"] == commit and r["status"] == "success"
+        }
+
+    old, new = latest(before), latest(after)
+    t = pyRestTable.Table()
+    t.labels = ["benchmark", f"{before} s", f"{after} s", "change %", "messages", "ca_gets", "ca_puts"]
+    for name in new:
+        if name not in old:
+            continue
+        o, n = old[name], new[name]
+        t.addRow((
+            name,
+            f"{o['wall_time_s']:.2f}",
+            f"{n['wall_time_s']:.2f}",
+            f"{100 * (n['wall_time_s'] / o['wall_time_s'] - 1):+.1f}",
+            f"{o['num_messages']} -> {n['num_messages']}",
+            f"{o['ca_gets']} -> {n['ca_gets']}",
+            f"{o['ca_puts']} -> {n['ca_puts']}",
+        ))
+    print(t)
+    return t
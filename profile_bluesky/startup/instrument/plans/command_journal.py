@@ -0,0 +1,206 @@
+
+"""
+progress journal of a command file, retry policy of its commands
+
+Each line of a command file executed by ``execute_command_list()``
+is recorded in a journal (one JSON line per change, written and
+synced to disk at once): the hash of the file, the line number,
+the status (``started``, ``done``, ``failed``, ``skipped``,
+``interrupted``), the attempt, the run uids, and a timestamp.
+After a crash of the session or ``RE.abort()``,
+``resume_command_file()`` skips the lines that are done.
+
+The journal of a file is found by the hash of its contents: an
+edited file has a new (empty) journal.  Each ``run_command_file()``
+records the start of a new *execution* (``status="start"``, with an
+``execution`` id, in each entry that follows): the status of the lines
+is taken only from the latest execution, so a file run again (same
+contents) runs all its lines.  ``resume_command_file()`` continues the
+latest execution (``status="resume"``).
+
+EXAMPLE::
+
+    In [1]: CommandJournal("overnight.txt").report()
+    In [2]: RE(resume_command_file("overnight.txt"))
+"""
+
+__all__ = [
+    'CommandJournal',
+    'JOURNAL_DIR',
+    'RetryPolicy',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+from bluesky import plan_stubs as bps
+from bluesky.run_engine import RequestAbort
+import datetime
+import hashlib
+import json
+import os
+import pyRestTable
+import uuid
+
+
+JOURNAL_DIR = os.path.join(os.getcwd(), ".logs", "command_journal")
+
+
+class CommandJournal(object):
+    """
+    Durable progress journal of one command file.
+
+    PARAMETERS
+
+    filename : str
+        Name of the command file (text or Excel).
+    path : str
+        Directory of the journals.
+    """
+
+    def __init__(self, filename, path=JOURNAL_DIR):
+        self.filename = os.path.abspath(filename)
+        with open(self.filename, "rb") as fp:
+            self.file_hash = hashlib.sha256(fp.read()).hexdigest()
+        base = os.path.splitext(os.path.basename(self.filename))[0]
+        self.journal_file = os.path.join(path, f"{base}-{self.file_hash[:12]}.jsonl")
+        self.execution = None   # id of the execution now recorded
+
+    def start_execution(self):
+        """Record the start of a new execution of the file, return its id."""
+        self.execution = uuid.uuid4().hex
+        self.record(None, "start")
+        return self.execution
+
+    def resume_execution(self):
+        """Continue the latest execution (new one if none), return its id."""
+        starts = self._starts_(self.entries())
+        if len(starts) == 0:
+            return self.start_execution()
+        self.execution = starts[-1][1].get("execution")
+        self.record(None, "resume")
+        return self.execution
+
+    @staticmethod
+    def _starts_(entries):
+        """[(index, entry)] of the execution starts"""
+        return [
+            (i, entry)
+            for i, entry in enumerate(entries)
+            if entry.get("line") is None and entry.get("status") == "start"
+        ]
+
+    def record(self, line_number, status, **kwargs):
+        """Append (and sync to disk) the status of a line."""
+        entry = dict(
+            timestamp=datetime.datetime.now().isoformat(sep=" "),
+            file=self.filename,
+            hash=self.file_hash,
+            execution=self.execution,
+            line=line_number,
+            status=status,
+        )
+        entry.update(kwargs)
+        os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+        with open(self.journal_file, "a") as fp:
+            fp.write(json.dumps(entry) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+        return entry
+
+    def entries(self):
+        """All entries in the journal (oldest first)."""
+        if not os.path.exists(self.journal_file):
+            return []
+        entries = []
+        with open(self.journal_file, "r") as fp:
+            for text in fp:
+                try:
+                    entries.append(json.loads(text))
+                except ValueError:
+                    pass    # last line incomplete (crash during the write)
+        return entries
+
+    def execution_entries(self):
+        """Entries of the latest execution (all, if none was started)."""
+        entries = self.entries()
+        starts = self._starts_(entries)
+        if len(starts) == 0:
+            return entries
+        return entries[starts[-1][0]:]
+
+    def status(self):
+        """Dictionary of the last status of each line (latest execution): {line: entry}."""
+        latest = {}
+        for entry in self.execution_entries():
+            if entry.get("line") is not None:
+                latest[entry["line"]] = entry
+        return latest
+
+    def completed_lines(self):
+        """Set of the line numbers that are done."""
+        return {
+            line
+            for line, entry in self.status().items()
+            if entry["status"] == "done"
+        }
+
+    def report(self, print_enable=True):
+        """Table of the last status of each line."""
+        t = pyRestTable.Table()
+        t.labels = "line status attempt timestamp uids".split()
+        for line, entry in sorted(self.status().items()):
+            t.addRow((
+                line,
+                entry["status"],
+                entry.get("attempt", ""),
+                entry["timestamp"],
+                " ".join(uid[:8] for uid in entry.get("uids", [])),
+            ))
+        if print_enable:
+            starts = self._starts_(self.entries())
+            print(f"journal: {self.journal_file}")
+            if len(starts) > 0:
+                print(f"execution: {starts[-1][1].get('execution')} ({starts[-1][1]['timestamp']})")
+            print(t)
+        return t
+
+
+class RetryPolicy(object):
+    """
+    How ``execute_command_list()`` retries a command that failed.
+
+    PARAMETERS
+
+    maximum_attempts : int
+        Tries of each command.
+    backoff_s : float
+        Wait before the second try (seconds).
+    backoff_factor : float
+        Multiplies the wait before each next try.
+    skip_on : [Exception]
+        Exception classes not retried: the command is skipped.
+    stop_on : [Exception]
+        Exception classes that stop the command list.
+    """
+
+    def __init__(self, maximum_attempts=5, backoff_s=0, backoff_factor=2,
+                 skip_on=(), stop_on=(RequestAbort,)):
+        self.maximum_attempts = maximum_attempts
+        self.backoff_s = backoff_s
+        self.backoff_factor = backoff_factor
+        self.skip_on = tuple(skip_on)
+        self.stop_on = tuple(stop_on)
+
+    def delay(self, attempt):
+        """Wait (seconds) after failed ``attempt`` (1-based)."""
+        return self.backoff_s * self.backoff_factor ** (attempt - 1)
+
+    def backoff(self, attempt):
+        """plan: wait after failed ``attempt``"""
+        delay = self.delay(attempt)
+        if delay > 0:
+            logger.info("retry in %.1f s", delay)
+            yield from bps.sleep(delay)
+        else:
+            yield from bps.null()
@@ -15,6 +15,7 @@ __all__ = """
     parse_Excel_command_file
     parse_text_command_file
     postCommandsListfile2WWW
+    resume_command_file
     run_command_file
     run_python_file
     summarize_command_file
@@ -28,8 +29,10 @@ logger.info(__file__)
 from apstools.utils import ExcelDatabaseFileGeneric
 from apstools.utils import rss_mem
 from bluesky import plan_stubs as bps
+from bluesky import preprocessors as bpp
 from IPython import get_ipython
 from usaxs_support.nexus import reset_manager
+from usaxs_support.surveillance import archive
 from usaxs_support.surveillance import instrument_archive
 import datetime
 import os
@@ -39,15 +42,22 @@ import sys
 from ..devices import constants
 from ..devices import email_notices
 from ..devices import measure_background
+from ..devices import measure_background_if_needed
 from ..devices import saxs_det, waxs_det
 from ..devices import terms
 from ..devices import ti_filter_shutter
 from ..devices import upd_controls, I0_controls, I00_controls, trd_controls
 from ..devices import user_data
+from ..framework import bookkeeping_writer
+from ..framework import message_profiler
+from ..framework import timeline, traced_plan
 from ..utils.quoted_line import split_quoted_line
 from .axis_tuning import instrument_default_tune_ranges
 from .axis_tuning import update_EPICS_tuning_widths
 from .axis_tuning import user_defined_settings
+from .command_journal import CommandJournal
+from .command_journal import RetryPolicy
+from .command_order import optimize_command_list
 from .doc_run import documentation_run
 from .mode_changes import mode_BlackFly
 from .mode_changes import mode_Radiography
@@ -64,7 +74,11 @@ def beforeScanComputeOtherStuff():
 
 
 def postCommandsListfile2WWW(commands):
-    """Post list of commands to WWW and archive the list for posterity."""
+    """
+    Post list of commands to WWW and archive the list for posterity.
+
+    The files are written by ``bookkeeping_writer`` (in the background).
+    """
     tbl_file = "commands.txt"
     tbl = command_list_as_table(commands)
     timestamp = datetime.datetime.now().isoformat().replace("T", " ")
@@ -75,8 +89,7 @@ def postCommandsListfile2WWW(commands):
     # post for livedata page
     # path = "/tmp"
     path = "/share1/local_livedata"
-    with open(os.path.join(path, tbl_file), "w") as fp:
-        fp.write(file_contents)
+    bookkeeping_writer.write_file(os.path.join(path, tbl_file), file_contents)
 
     # post to EPICS
     yield from bps.mv(
@@ -84,15 +97,12 @@ def postCommandsListfile2WWW(commands):
         user_data.macro_file_time, timestamp,
         )
 
-    # keep this list for posterity
-    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-    path = "/share1/log/macros"
-    posterity_file = f"{timestamp}-{tbl_file}"
-    with open(os.path.join(path, posterity_file), "w") as fp:
-        fp.write(file_contents)
+    # keep this list for posterity (each unique table only once)
+    archive.record(kind="commands", commands=archive.store(str(tbl.reST())))
 
 
 
+@traced_plan("command_list")
 def before_command_list(md=None, commands=None):
     """Actions before a command list is run."""
     from .scans import preUSAXStune
@@ -109,7 +119,11 @@ def before_command_list(md=None, commands=None):
         terms.WAXS.collecting, 0,
     )
     if constants["MEASURE_DARK_CURRENTS"]:
-        yield from measure_background(
+        if constants["CACHE_DARK_CURRENTS"]:
+            measure = measure_background_if_needed
+        else:
+            measure = measure_background
+        yield from measure(
             [upd_controls, I0_controls, I00_controls, trd_controls],
         )
 
@@ -138,6 +152,7 @@ def before_command_list(md=None, commands=None):
     reset_manager()
 
 
+@traced_plan("command_list")
 def after_command_list(md=None):
     """Actions after a command list is run."""
     # if md is None:
@@ -148,6 +163,7 @@ def after_command_list(md=None):
         user_data.collection_in_progress, 0,
         ti_filter_shutter, "close",
     )
+    message_profiler.dump()
 
 
 def before_plan(md=None):
@@ -330,20 +346,65 @@ def summarize_command_file(filename):
     )
 
 
-def run_command_file(filename, md=None):
+def run_command_file(filename, md=None, retry_policy=None, optimize=False):
     """
     Plan: execute a list of commands from a text or Excel file.
 
     * Parse the file into a command list
+    * (optional) reorder the command list (``optimize_command_list()``)
     * yield the command list to the RunEngine (or other)
+
+    The progress of each line is recorded in the journal of the file,
+    as a new execution (see ``resume_command_file()``).
     """
     if md is None:
         md = {}
     commands = get_command_list(filename)
-    yield from execute_command_list(filename, commands, md=md)
+    if optimize:
+        commands = optimize_command_list(commands)
+    journal = CommandJournal(filename)
+    journal.start_execution()
+    yield from execute_command_list(
+        filename, commands, md=md,
+        journal=journal,
+        retry_policy=retry_policy)
 
 
-def execute_command_list(filename, commands, md=None):
+def resume_command_file(filename, md=None, retry_policy=None, optimize=False):
+    """
+    Plan: execute the lines of a command file that are not done.
+
+    Continues the latest execution of the file (``run_command_file()``):
+    lines done in it (as recorded in the journal of this file, see
+    ``CommandJournal``) are skipped, the command list picks up at the
+    first line not done.  If the file was edited, its journal is new:
+    all lines are executed.
+
+    EXAMPLE::
+
+        RE(resume_command_file("overnight.txt"))
+    """
+    journal = CommandJournal(filename)
+    journal.resume_execution()
+    done = journal.completed_lines()
+    commands = [
+        command
+        for command in get_command_list(filename)
+        if command[2] not in done
+    ]
+    if len(done) > 0:
+        logger.info(
+            "resume %s: %d line(s) done, %d to run",
+            filename, len(done), len(commands))
+    if optimize:
+        commands = optimize_command_list(commands)
+    yield from execute_command_list(
+        filename, commands, md=md,
+        journal=journal,
+        retry_policy=retry_policy)
+
+
+def execute_command_list(filename, commands, md=None, journal=None, retry_policy=None):
     """
     Plan: execute the command list.
 
@@ -375,11 +436,31 @@ def execute_command_list(filename, commands, md=None):
     raw_command: obj (str or list(str)
         contents from input file, such as:
         ``SAXS 0 0 0 blank``
+    journal : CommandJournal
+        (optional) Record the progress of each line.
+    retry_policy : RetryPolicy
+        (optional) How a command that failed is retried.
+        default: ``RetryPolicy()`` (5 attempts)
     """
+    try:
+        yield from timeline.plan_span(
+            _execute_command_list_(
+                filename, commands, md=md,
+                journal=journal, retry_policy=retry_policy),
+            f"command file: {filename}",
+            "command_list",
+        )
+    finally:
+        timeline.dump()
+
+
+def _execute_command_list_(filename, commands, md=None, journal=None, retry_policy=None):
+    """Plan: execute the command list (see ``execute_command_list()``)."""
     from .scans import preUSAXStune, SAXS, USAXSscan, WAXS
 
     if md is None:
         md = {}
+    retry_policy = retry_policy or RetryPolicy()
 
     full_filename = os.path.abspath(filename)
 
@@ -409,6 +490,8 @@ def execute_command_list(filename, commands, md=None):
         _md["action"] = action
         _md["parameters"] = args    # args is shorter than parameters, means the same thing here
         _md["iso8601"] = datetime.datetime.now().isoformat(" ")
+        if journal is not None:
+            _md["command_file_hash"] = journal.file_hash
 
         _md.update(md or {})      # overlay with user-supplied metadata
 
@@ -454,6 +537,10 @@ def execute_command_list(filename, commands, md=None):
                 _md.update(dict(sx=sx, sy=sy, thickness=sth, title=snm))
                 yield from WAXS(sx, sy, sth, snm, md=_md)
 
+            elif action == "barrier":
+                # only for optimize_command_list(): lines do not move past it
+                yield from bps.null()
+
             elif action in ("run_python", "run"):
                 filename = args[0]
                 yield from run_python_file(filename, md={})
@@ -466,37 +553,62 @@ def execute_command_list(filename, commands, md=None):
                 yield from bps.null()
             logger.info("memory report: %s", rss_mem())
 
-        attempt = 0  # count the number of attempts
-        maximum_attempts = 5  # set an upper limit
+        uids = []       # runs of this line
+
+        def _collect_uid_(name, doc):
+            uids.append(doc["uid"])
+
+        maximum_attempts = retry_policy.maximum_attempts
+        errors = []     # (attempt, exception) of this line
         exit_requested = False
-        while attempt < maximum_attempts:
+        for attempt in range(1, maximum_attempts + 1):
+            if journal is not None:
+                journal.record(i, "started", attempt=attempt, command=str(raw_command))
             try:
                 # call the inner function (above)
-                yield from _handle_actions_()
-                break  # leave the while loop
+                yield from bpp.subs_wrapper(
+                    timeline.plan_span(
+                        _handle_actions_(),
+                        f"line {i}: {action}",
+                        "command",
+                        command=raw_command,
+                        attempt=attempt,
+                    ),
+                    {"start": [_collect_uid_]},
+                )
+                if journal is not None:
+                    journal.record(i, "done", attempt=attempt, uids=uids)
+                break  # leave the loop
             except Exception as exc:
-                if exc.__class__ in (RequestAbort,):
+                errors.append((attempt, exc))
+                if isinstance(exc, retry_policy.stop_on):
                     exit_requested = True
+                    if journal is not None:
+                        journal.record(i, "interrupted", attempt=attempt, uids=uids, error=repr(exc))
                     break  # we requested abort from EPICS
                 subject = (
                     f"{exc.__class__.__name__}"
-                    f" during attempt {attempt+1} of {maximum_attempts}"
+                    f" during attempt {attempt} of {maximum_attempts}"
                     f" of command '{command}''"
                 )
-                body = (
-                    f"subject: {subject}"
-                    f"\n"
-                    f"\ndate: {datetime.datetime.now().isoformat(' ')}"
-                    f"\ncommand file: {full_filename}"
-                    f"\nline number: {i}"
-                    f"\ncommand: {command}"
-                    f"\nraw command: {raw_command}"
-                    f"\nattempt: {attempt+1} of {maximum_attempts}"
-                    f"\nexception: {exc}"
-                )
-                logger.error("Exception %s\n%s", subject, body)
-                email_notices.send(subject, body)
-                attempt += 1
+                logger.error(
+                    "Exception %s\ncommand file: %s\nline number: %d\nexception: %s",
+                    subject, full_filename, i, exc)
+                timeline.instant(subject, "error", line_number=i)
+                skip = isinstance(exc, retry_policy.skip_on)
+                if skip or attempt == maximum_attempts:
+                    status = "skipped" if skip else "failed"
+                    if journal is not None:
+                        journal.record(i, status, attempt=attempt, uids=uids, error=repr(exc))
+                    _email_line_failure_(
+                        full_filename, i, command, raw_command, status, errors)
+                    break
+                yield from retry_policy.backoff(attempt)
+            except BaseException:
+                # RE.abort(), RE.stop(), ^C, ...
+                if journal is not None:
+                    journal.record(i, "interrupted", attempt=attempt, uids=uids)
+                raise
 
         if exit_requested:
             break
@@ -505,6 +617,27 @@ def execute_command_list(filename, commands, md=None):
     logger.info("memory report: %s", rss_mem())
 
 
+def _email_line_failure_(full_filename, line_number, command, raw_command, status, errors):
+    """Send one email about a command that failed (all its attempts)."""
+    attempt, exc = errors[-1]
+    subject = (
+        f"{exc.__class__.__name__}: command {status}"
+        f" after {attempt} attempt(s): '{command}'"
+    )
+    body = (
+        f"subject: {subject}"
+        f"\n"
+        f"\ndate: {datetime.datetime.now().isoformat(' ')}"
+        f"\ncommand file: {full_filename}"
+        f"\nline number: {line_number}"
+        f"\ncommand: {command}"
+        f"\nraw command: {raw_command}"
+    )
+    for attempt, exc in errors:
+        body += f"\nattempt {attempt}: {exc.__class__.__name__}: {exc}"
+    email_notices.send(subject, body)
+
+
 def sync_order_numbers():
     """
     Synchronize the order numbers between the various detectors.
@@ -0,0 +1,201 @@
+
+"""
+reorder a command list: fewer mode changes, shorter sample stage travel
+
+A command file often measures each sample with ``FlyScan``, then
+``SAXS``, then ``WAXS``.  Each change of technique moves the
+instrument to another mode (``mode_USAXS()``, ``mode_SAXS()``,
+``mode_WAXS()``: large stages move, tunes may follow) and the sample
+stage moves back and forth between the samples.
+
+:func:`optimize_command_list` reorders the output of
+``get_command_list()``:
+
+* lines between *barriers* form a block; lines never move out of
+  their block
+* barriers: ``barrier`` lines (an explicit barrier, does nothing),
+  ``run_python``, mode changes, and any other line that is not a
+  USAXS, SAXS, or WAXS measurement (or has no sample position)
+* in each block, the measurements are grouped by technique (first:
+  the technique of the block's first line)
+* in each group, the samples are ordered (nearest neighbor) to
+  shorten the sample stage path
+
+The predicted time saving (from ``MODE_CHANGE_S`` and
+``SAMPLE_STAGE_SPEED``) is printed.  The line numbers are kept (the
+progress journal and the messages refer to the file).
+
+EXAMPLE::
+
+    RE(run_command_file("overnight.txt", optimize=True))
+
+    In [1]: optimize_command_list(get_command_list("overnight.txt"))
+"""
+
+__all__ = [
+    'optimize_command_list',
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+import pyRestTable
+
+
+MODE_CHANGE_S = 60          # estimate: time to change the instrument mode
+SAMPLE_STAGE_SPEED = 2.0    # estimate: sx & sy speed, mm/s (move together)
+
+TECHNIQUES = dict(
+    # action (lower case): technique (instrument mode)
+    flyscan="USAXS",
+    usaxsscan="USAXS",
+    saxs="SAXS",
+    saxsexp="SAXS",
+    waxs="WAXS",
+    waxsexp="WAXS",
+)
+
+
+def _position_(command):
+    """(sx, sy) of a measurement command or None"""
+    args = command[1]
+    try:
+        return float(args[0]), float(args[1])
+    except (IndexError, TypeError, ValueError):
+        return None
+
+
+def _technique_(command):
+    """technique of a measurement command, None if a barrier"""
+    technique = TECHNIQUES.get(str(command[0]).lower())
+    if technique is None or _position_(command) is None:
+        return None
+    return technique
+
+
+def _travel_(p1, p2):
+    # sx and sy move at the same time
+    if p1 is None or p2 is None:
+        return 0
+    return max(abs(p2[0] - p1[0]), abs(p2[1] - p1[1]))
+
+
+def predict_cost(commands):
+    """
+    Mode changes and sample stage travel of a command list.
+
+    RETURNS
+
+    (mode_changes, travel_mm, predicted_s)
+    """
+    mode_changes = 0
+    travel = 0
+    mode = None
+    position = None
+    for command in commands:
+        technique = _technique_(command)
+        if technique is None:
+            if str(command[0]).lower().startswith("mode_"):
+                mode = None     # a mode change in the file
+            continue
+        if technique != mode:
+            mode_changes += mode is not None
+            mode = technique
+        p = _position_(command)
+        travel += _travel_(position, p)
+        position = p
+    predicted_s = mode_changes * MODE_CHANGE_S + travel / SAMPLE_STAGE_SPEED
+    return mode_changes, travel, predicted_s
+
+
+def _nearest_neighbor_(commands, start):
+    """order measurement commands: each next sample is the nearest"""
+    remaining = list(commands)
+    ordered = []
+    position = start
+    while len(remaining) > 0:
+        if position is None:
+            nearest = remaining[0]
+        else:
+            # min() keeps the first of equals: file order
+            nearest = min(remaining, key=lambda c: _travel_(position, _position_(c)))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+        position = _position_(nearest)
+    return ordered
+
+
+def _path_(commands, start):
+    """sample stage travel through the commands"""
+    travel = 0
+    position = start
+    for command in commands:
+        p = _position_(command)
+        travel += _travel_(position, p)
+        position = p
+    return travel
+
+
+def _optimize_block_(block, start):
+    """reorder the measurements of a block, return (commands, last position)"""
+    groups = {}     # technique: [commands], in order of first appearance
+    for command in block:
+        groups.setdefault(_technique_(command), []).append(command)
+    ordered = []
+    position = start
+    for technique, group in groups.items():
+        nearest = _nearest_neighbor_(group, position)
+        if _path_(nearest, position) < _path_(group, position):
+            group = nearest
+        ordered += group
+        position = _position_(group[-1])
+    return ordered, position
+
+
+def optimize_command_list(commands, print_enable=True):
+    """
+    Reorder a command list: fewer mode changes, shorter stage travel.
+
+    PARAMETERS
+
+    commands : list[command]
+        Command list, as from ``get_command_list()``.
+
+    RETURNS
+
+    list of commands (reordered)
+    """
+    optimized = []
+    block = []
+    position = None
+
+    def end_of_block():
+        nonlocal block, position
+        if len(block) > 0:
+            ordered, position = _optimize_block_(block, position)
+            optimized.extend(ordered)
+            block = []
+
+    for command in commands:
+        if _technique_(command) is None:
+            end_of_block()
+            optimized.append(command)   # barrier: stays in place
+        else:
+            block.append(command)
+    end_of_block()
+
+    before = predict_cost(commands)
+    after = predict_cost(optimized)
+    if after[2] >= before[2]:
+        optimized, after = list(commands), before    # no gain: keep file order
+    t = pyRestTable.Table()
+    t.labels = "order mode_changes stage_travel_mm predicted_s".split()
+    t.addRow(("file", before[0], f"{before[1]:.1f}", f"{before[2]:.0f}"))
+    t.addRow(("optimized", after[0], f"{after[1]:.1f}", f"{after[2]:.0f}"))
+    saving = before[2] - after[2]
+    logger.info(
+        "command list optimized: predicted saving %.0f s\n%s", saving, t)
+    if print_enable:
+        print(t)
+        print(f"predicted time saving: {saving:.0f} s")
+    return optimized
@@ -10,7 +10,7 @@ __all__ = [
 from ..session_logs import logger
 logger.info(__file__)
 
-from ..framework import bec
+from ..framework import bec, live_plots
 from bluesky import plan_stubs as bps
 from ophyd import Signal
 
@@ -26,7 +26,7 @@ def documentation_run(words, md=None, stream=None):
         plan_name="documentation_run",
     )
     _md.update(md or {})
-    bec.disable_plots()
+    live_plots.disable_plots()
     bec.disable_table()
     uid = yield from bps.open_run(md=_md)
     yield from bps.create(stream)
@@ -34,5 +34,5 @@ def documentation_run(words, md=None, stream=None):
     yield from bps.save()
     yield from bps.close_run()
     bec.enable_table()
-    bec.enable_plots()
+    live_plots.enable_plots()
     return uid
@@ -35,6 +35,7 @@ from ..devices.protection_plc import plc_protect
 from ..devices.scalers import scaler0
 from ..devices.general_terms import terms
 from ..devices.user_data import user_data
+from ..framework import traced_plan
 from .filters import insertBlackflyFilters
 from .filters import insertRadiographyFilters
 from .filters import insertScanFilters
@@ -62,6 +63,7 @@ def confirm_instrument_mode(mode_name):
     return terms.SAXS.UsaxsSaxsMode.get() in (expected_mode, mode_name)
 
 
+@traced_plan("mode")
 def mode_BlackFly(md=None):
     """
     Sets to imaging mode, using BlackFly camera.
@@ -92,6 +94,7 @@ def mode_BlackFly(md=None):
     )
 
 
+@traced_plan("mode")
 def mode_USAXS(md=None):
     # plc_protect.stop_if_tripped()
     yield from user_data.set_state_plan("Moving USAXS to USAXS mode")
@@ -152,6 +155,7 @@ def mode_USAXS(md=None):
 mode_SBUSAXS = mode_USAXS       # for now
 
 
+@traced_plan("mode")
 def mode_SAXS(md=None):
     # plc_protect.stop_if_tripped()
     yield from user_data.set_state_plan("Moving USAXS to SAXS mode")
@@ -179,6 +183,7 @@ def mode_SAXS(md=None):
     )
 
 
+@traced_plan("mode")
 def mode_WAXS(md=None):
     # plc_protect.stop_if_tripped()
     yield from user_data.set_state_plan("Moving USAXS to WAXS mode")
@@ -238,6 +243,7 @@ def mode_WAXS(md=None):
     )
 
 
+@traced_plan("mode")
 def mode_Radiography(md=None):
     """
     put in USAXS Radiography mode
@@ -311,6 +317,7 @@ def mode_Radiography(md=None):
             logger.info("The mono shutter is closed now.  APS beam dump?")
 
 
+@traced_plan("mode")
 def mode_imaging(md=None):
     """
     prepare the instrument for USAXS imaging
@@ -321,6 +328,7 @@ def mode_imaging(md=None):
     yield from mode_USAXS()
 
 
+@traced_plan("mode")
 def mode_OpenBeamPath(md=None):
     # plc_protect.stop_if_tripped()
     yield from user_data.set_state_plan("Moving USAXS to OpenBeamPath mode")
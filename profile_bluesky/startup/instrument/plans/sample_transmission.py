@@ -23,11 +23,13 @@ from ..devices import scaler0
 from ..devices import terms
 from ..devices import ti_filter_shutter
 from ..devices import user_data
+from ..framework import traced_plan
 from .filters import insertScanFilters, insertTransmissionFilters
 from .mode_changes import mode_SAXS, mode_USAXS
 from .no_run import no_run_trigger_and_wait
 
 
+@traced_plan("transmission")
 def measure_USAXS_Transmission(md={}):
     """
     measure the sample transmission in USAXS mode
@@ -100,6 +102,7 @@ def measure_USAXS_Transmission(md={}):
         logger.info("Did not measure USAXS transmission.")
 
 
+@traced_plan("transmission")
 def measure_SAXS_Transmission(md={}):
     """
     measure the sample transmission in SAXS mode
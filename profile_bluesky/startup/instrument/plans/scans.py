@@ -41,13 +41,14 @@ from ..devices import saxs_stage
 from ..devices import scaler0, scaler1
 from ..devices import struck
 from ..devices import terms
+from ..devices import tune_scheduler
 from ..devices import upd_controls, I0_controls, I00_controls, trd_controls
 from ..devices import usaxs_flyscan
 from ..devices import usaxs_q_calc
 from ..devices import user_data
 from ..devices import waxsx, waxs_det
 from ..devices.suspenders import suspend_BeamInHutch
-from ..framework import bec, RE, specwriter
+from ..framework import live_plots, RE, specwriter, traced_plan
 from ..utils.cleanup_text import cleanupText
 from ..utils.setup_new_user import techniqueSubdirectory
 from ..utils.user_sample_title import getSampleTitle
@@ -72,6 +73,7 @@ AD_FILE_TEMPLATE = "%s%s_%4.4d.hdf"
 LOCAL_FILE_TEMPLATE = "%s_%04d.hdf"
 MASTER_TIMEOUT = 60
 
+@traced_plan("tune")
 def preUSAXStune(md={}):
     """
     tune the USAXS optics *only* if in USAXS mode
@@ -130,10 +132,18 @@ def preUSAXStune(md={}):
     tuners[a_stage.r2p] = tune_a2rp        # make A stage crystals parallel
 
     # now, tune the desired axes, bail out if a tune fails
+    use_scheduler = constants["USE_TUNE_SCHEDULER"]
+    tune_downstream = False     # upstream axis moved, tune all that follow
+    axes_tuned = 0
     yield from bps.install_suspender(suspend_BeamInHutch)
     for axis, tune in tuners.items():
+        if use_scheduler and not tune_downstream:
+            if not tune_scheduler.tune_is_needed(axis):
+                logger.info("skip tune of axis %s, not drifted", axis.name)
+                continue
         yield from bps.mv(ti_filter_shutter, "open", timeout=MASTER_TIMEOUT)
         yield from tune(md=md)
+        axes_tuned += 1
         if not axis.tuner.tune_ok:
             logger.warning("!!! tune failed for axis %s !!!", axis.name)
             if NOTIFY_ON_BADTUNE:
@@ -141,6 +151,11 @@ def preUSAXStune(md={}):
                     f"USAXS tune failed for axis {axis.name}",
                     f"USAXS tune failed for axis {axis.name}"
                     )
+        elif use_scheduler:
+            # once set, stays set: every axis downstream is tuned
+            tune_downstream = (
+                tune_downstream
+                or tune_scheduler.shift_exceeded_tolerance(axis))
 
         # If we don't wait, the next tune often fails
         # intensity stays flat, statistically
@@ -156,15 +171,23 @@ def preUSAXStune(md={}):
         # user_data.collection_in_progress, 0,
         user_data.state,            "pre-USAXS optics tuning done",
 
-        terms.preUSAXStune.num_scans_last_tune, 0,
         terms.preUSAXStune.run_tune_next,       0,
-        terms.preUSAXStune.epoch_last_tune,     time.time(),
         timeout=MASTER_TIMEOUT,
     )
+    if axes_tuned > 0:
+        # (not if the scheduler skipped every axis: no tune was done)
+        yield from bps.mv(
+            terms.preUSAXStune.num_scans_last_tune, 0,
+            terms.preUSAXStune.epoch_last_tune,     time.time(),
+            timeout=MASTER_TIMEOUT,
+        )
+    else:
+        logger.info("no axis tuned: time of last tune not changed")
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 
+@traced_plan("tune")
 def preSWAXStune(md={}):
     """
     tune the SAXS & WAXS optics in any mode, is safe
@@ -253,6 +276,7 @@ def USAXSscan(x, y, thickness_mm, title, md=None):
         yield from USAXSscanStep(x, y, thickness_mm, title, md=_md)
 
 
+@traced_plan("acquisition")
 def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
     """
     general scan macro for step USAXS for both 1D & 2D collimation
@@ -269,15 +293,19 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
 
     yield from mode_USAXS()
 
+    saxs = terms.snapshot("SAXS").SAXS
     yield from bps.mv(
-        usaxs_slit.v_size, terms.SAXS.usaxs_v_size.get(),
-        usaxs_slit.h_size, terms.SAXS.usaxs_h_size.get(),
-        guard_slit.v_size, terms.SAXS.usaxs_guard_v_size.get(),
-        guard_slit.h_size, terms.SAXS.usaxs_guard_h_size.get(),
+        usaxs_slit.v_size, saxs.usaxs_v_size,
+        usaxs_slit.h_size, saxs.usaxs_h_size,
+        guard_slit.v_size, saxs.usaxs_guard_v_size,
+        guard_slit.h_size, saxs.usaxs_guard_h_size,
         timeout=MASTER_TIMEOUT,
     )
     yield from before_plan()
 
+    # terms used by this plan, all read now (after any tune)
+    snap = terms.snapshot("USAXS", "FlyScan")
+
     yield from bps.mv(
         s_stage.x, pos_X,
         s_stage.y, pos_Y,
@@ -313,15 +341,15 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
     # ar0_calc_offset = terms.USAXS.ar_val_center.get() + angle_offset
 
     yield from bps.mv(
-        a_stage.r, terms.USAXS.ar_val_center.get(),
+        a_stage.r, snap.USAXS.ar_val_center,
         # these two were moved by mode_USAXS(), belt & suspenders here
-        d_stage.y, terms.USAXS.diode.dy.get(),
-        a_stage.y, terms.USAXS.AY0.get(),
+        d_stage.y, snap.USAXS.diode.dy,
+        a_stage.y, snap.USAXS.AY0,
         timeout=MASTER_TIMEOUT,
     )
     yield from user_data.set_state_plan("Moving to Q=0")
     yield from bps.mv(
-        usaxs_q_calc.channels.B.input_value, terms.USAXS.ar_val_center.get(),
+        usaxs_q_calc.channels.B.input_value, snap.USAXS.ar_val_center,
         timeout=MASTER_TIMEOUT,
     )
 
@@ -341,7 +369,7 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
         )
 
     # enable asrp link to ar for 2D USAXS
-    if terms.USAXS.is2DUSAXSscan.get():
+    if snap.USAXS.is2DUSAXSscan:
         RECORD_SCAN_INDEX_10x_per_second = 9
         yield from bps.mv(
             terms.FlyScan.asrp_calc_SCAN, RECORD_SCAN_INDEX_10x_per_second,
@@ -353,8 +381,8 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
     old_femto_change_gain_down = upd_controls.auto.gainD.get()
 
     yield from bps.mv(
-        upd_controls.auto.gainU, terms.USAXS.setpoint_up.get(),
-        upd_controls.auto.gainD, terms.USAXS.setpoint_down.get(),
+        upd_controls.auto.gainU, snap.USAXS.setpoint_up,
+        upd_controls.auto.gainD, snap.USAXS.setpoint_down,
         ti_filter_shutter, "open",
         timeout=MASTER_TIMEOUT,
     )
@@ -377,28 +405,28 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
         scan_title = scan_title,
         )
 
-    startAngle = terms.USAXS.ar_val_center.get()- q2angle(terms.USAXS.start_offset.get(),monochromator.dcm.wavelength.get())
-    endAngle = terms.USAXS.ar_val_center.get()-q2angle(terms.USAXS.finish.get(),monochromator.dcm.wavelength.get())
-    bec.disable_plots()
+    startAngle = snap.USAXS.ar_val_center- q2angle(snap.USAXS.start_offset,monochromator.dcm.wavelength.get())
+    endAngle = snap.USAXS.ar_val_center-q2angle(snap.USAXS.finish,monochromator.dcm.wavelength.get())
+    live_plots.disable_plots()
 
     yield from record_sample_image_on_demand("usaxs", scan_title_clean, _md)
 
     yield from uascan(
         startAngle,
-        terms.USAXS.ar_val_center.get(),
+        snap.USAXS.ar_val_center,
         endAngle,
-        terms.USAXS.usaxs_minstep.get(),
-        terms.USAXS.uaterm.get(),
-        terms.USAXS.num_points.get(),
-        terms.USAXS.usaxs_time.get(),
-        terms.USAXS.DY0.get(),
-        terms.USAXS.SDD.get(),
-        terms.USAXS.AY0.get(),
-        terms.USAXS.SAD.get(),
-        useDynamicTime=terms.USAXS.useDynamicTime.get(),
+        snap.USAXS.usaxs_minstep,
+        snap.USAXS.uaterm,
+        snap.USAXS.num_points,
+        snap.USAXS.usaxs_time,
+        snap.USAXS.DY0,
+        snap.USAXS.SDD,
+        snap.USAXS.AY0,
+        snap.USAXS.SAD,
+        useDynamicTime=snap.USAXS.useDynamicTime,
         md=_md
     )
-    bec.enable_plots()
+    live_plots.enable_plots()
 
     yield from bps.mv(
         user_data.scanning, "no",          # for sure, we are not scanning now
@@ -428,9 +456,9 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
     yield from user_data.set_state_plan("Moving USAXS back and saving data")
     # file writing is handled by the nxwriter callback, by a RE subscription
     yield from bps.mv(
-        a_stage.r, terms.USAXS.ar_val_center.get(),
-        a_stage.y, terms.USAXS.AY0.get(),
-        d_stage.y, terms.USAXS.DY0.get(),
+        a_stage.r, snap.USAXS.ar_val_center,
+        a_stage.y, snap.USAXS.AY0,
+        d_stage.y, snap.USAXS.DY0,
         timeout=MASTER_TIMEOUT,
         )
 
@@ -442,6 +470,7 @@ def USAXSscanStep(pos_X, pos_Y, thickness, scan_title, md=None):
     yield from after_plan(weight=3)
 
 
+@traced_plan("acquisition")
 def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
     """
     do one USAXS Fly Scan
@@ -459,15 +488,19 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
 
     yield from mode_USAXS()
 
+    saxs = terms.snapshot("SAXS").SAXS
     yield from bps.mv(
-        usaxs_slit.v_size, terms.SAXS.usaxs_v_size.get(),
-        usaxs_slit.h_size, terms.SAXS.usaxs_h_size.get(),
-        guard_slit.v_size, terms.SAXS.usaxs_guard_v_size.get(),
-        guard_slit.h_size, terms.SAXS.usaxs_guard_h_size.get(),
+        usaxs_slit.v_size, saxs.usaxs_v_size,
+        usaxs_slit.h_size, saxs.usaxs_h_size,
+        guard_slit.v_size, saxs.usaxs_guard_v_size,
+        guard_slit.h_size, saxs.usaxs_guard_h_size,
         timeout=MASTER_TIMEOUT,
     )
     yield from before_plan()
 
+    # terms used by this plan, all read now (after any tune)
+    snap = terms.snapshot("USAXS", "FlyScan")
+
     yield from bps.mv(
         s_stage.x, pos_X,
         s_stage.y, pos_Y,
@@ -486,7 +519,7 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
     flyscan_file_name = (
         f"{scan_title_clean}"
         #f"_{plan_name}"
-        f"_{terms.FlyScan.order_number.get():04d}"
+        f"_{snap.FlyScan.order_number:04d}"
         ".h5"
     )
 
@@ -516,15 +549,15 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
     # ar0_calc_offset = terms.USAXS.ar_val_center.get() + angle_offset
 
     yield from bps.mv(
-        a_stage.r, terms.USAXS.ar_val_center.get(),
+        a_stage.r, snap.USAXS.ar_val_center,
         # these two were moved by mode_USAXS(), belt & suspenders here
-        d_stage.y, terms.USAXS.diode.dy.get(),
-        a_stage.y, terms.USAXS.AY0.get(),
+        d_stage.y, snap.USAXS.diode.dy,
+        a_stage.y, snap.USAXS.AY0,
         timeout=MASTER_TIMEOUT,
     )
     yield from user_data.set_state_plan("Moving to Q=0")
     yield from bps.mv(
-        usaxs_q_calc.channels.B.input_value, terms.USAXS.ar_val_center.get(),
+        usaxs_q_calc.channels.B.input_value, snap.USAXS.ar_val_center,
         timeout=MASTER_TIMEOUT,
     )
 
@@ -546,7 +579,7 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
         )
 
     # enable asrp link to ar for 2D USAXS
-    if terms.USAXS.is2DUSAXSscan.get():
+    if snap.USAXS.is2DUSAXSscan:
         RECORD_SCAN_INDEX_10x_per_second = 9
         yield from bps.mv(
             terms.FlyScan.asrp_calc_SCAN, RECORD_SCAN_INDEX_10x_per_second,
@@ -558,8 +591,8 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
     old_femto_change_gain_down = upd_controls.auto.gainD.get()
 
     yield from bps.mv(
-        upd_controls.auto.gainU, terms.FlyScan.setpoint_up.get(),
-        upd_controls.auto.gainD, terms.FlyScan.setpoint_down.get(),
+        upd_controls.auto.gainU, snap.FlyScan.setpoint_up,
+        upd_controls.auto.gainD, snap.FlyScan.setpoint_down,
         ti_filter_shutter, "open",
         timeout=MASTER_TIMEOUT,
     )
@@ -666,9 +699,9 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
 
     yield from user_data.set_state_plan("Moving USAXS back and saving data")
     yield from bps.mv(
-        a_stage.r, terms.USAXS.ar_val_center.get(),
-        a_stage.y, terms.USAXS.AY0.get(),
-        d_stage.y, terms.USAXS.DY0.get(),
+        a_stage.r, snap.USAXS.ar_val_center,
+        a_stage.y, snap.USAXS.AY0,
+        d_stage.y, snap.USAXS.DY0,
         timeout=MASTER_TIMEOUT,
         )
 
@@ -682,6 +715,7 @@ def Flyscan(pos_X, pos_Y, thickness, scan_title, md=None):
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+@traced_plan("acquisition")
 def SAXS(pos_X, pos_Y, thickness, scan_title, md=None):
     """
     collect SAXS data
@@ -699,12 +733,15 @@ def SAXS(pos_X, pos_Y, thickness, scan_title, md=None):
 
     yield from mode_SAXS()
 
-    pinz_target = terms.SAXS.z_in.get() + constants["SAXS_PINZ_OFFSET"]
+    # terms used by this plan, all read now (after any tune)
+    snap = terms.snapshot("SAXS")
+
+    pinz_target = snap.SAXS.z_in + constants["SAXS_PINZ_OFFSET"]
     yield from bps.mv(
-        usaxs_slit.v_size, terms.SAXS.v_size.get(),
-        usaxs_slit.h_size, terms.SAXS.h_size.get(),
-        guard_slit.v_size, terms.SAXS.guard_v_size.get(),
-        guard_slit.h_size, terms.SAXS.guard_h_size.get(),
+        usaxs_slit.v_size, snap.SAXS.v_size,
+        usaxs_slit.h_size, snap.SAXS.h_size,
+        guard_slit.v_size, snap.SAXS.guard_v_size,
+        guard_slit.h_size, snap.SAXS.guard_h_size,
         saxs_stage.z, pinz_target,      # MUST move before sample stage moves!
         user_data.sample_thickness, thickness,
         terms.SAXS.collecting, 1,
@@ -775,9 +812,9 @@ def SAXS(pos_X, pos_Y, thickness, scan_title, md=None):
         mono_shutter, "open",
         monochromator.feedback.on, MONO_FEEDBACK_OFF,
         ti_filter_shutter, "open",
-        saxs_det.cam.num_images, terms.SAXS.num_images.get(),
-        saxs_det.cam.acquire_time, terms.SAXS.acquire_time.get(),
-        saxs_det.cam.acquire_period, terms.SAXS.acquire_time.get() + 0.004,
+        saxs_det.cam.num_images, snap.SAXS.num_images,
+        saxs_det.cam.acquire_time, snap.SAXS.acquire_time,
+        saxs_det.cam.acquire_period, snap.SAXS.acquire_time + 0.004,
         timeout=MASTER_TIMEOUT,
     )
     old_det_stage_sigs = OrderedDict()
@@ -800,8 +837,8 @@ def SAXS(pos_X, pos_Y, thickness, scan_title, md=None):
     SCAN_N = RE.md["scan_id"]+1     # update with next number
     old_delay = scaler0.delay.get()
     yield from bps.mv(
-        scaler1.preset_time, terms.SAXS.acquire_time.get() + 1,
-        scaler0.preset_time, 1.2*terms.SAXS.acquire_time.get() + 1,
+        scaler1.preset_time, snap.SAXS.acquire_time + 1,
+        scaler0.preset_time, 1.2*snap.SAXS.acquire_time + 1,
         scaler0.count_mode, "OneShot",
         scaler1.count_mode, "OneShot",
 
@@ -812,7 +849,7 @@ def SAXS(pos_X, pos_Y, thickness, scan_title, md=None):
 
         scaler0.delay, 0,
         terms.SAXS_WAXS.start_exposure_time, ts,
-        user_data.state, f"SAXS collection for {terms.SAXS.acquire_time.get()} s",
+        user_data.state, f"SAXS collection for {snap.SAXS.acquire_time} s",
         user_data.spec_scan, str(SCAN_N),
         timeout=MASTER_TIMEOUT,
     )
@@ -857,6 +894,7 @@ def SAXS(pos_X, pos_Y, thickness, scan_title, md=None):
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 
+@traced_plan("acquisition")
 def WAXS(pos_X, pos_Y, thickness, scan_title, md=None):
     """
     collect WAXS data
@@ -878,13 +916,16 @@ def WAXS(pos_X, pos_Y, thickness, scan_title, md=None):
 
     yield from mode_WAXS()
 
+    # terms used by this plan, all read now (after any tune)
+    snap = terms.snapshot("SAXS", "WAXS")
+
     logger.debug(f"waxsx after mode_WAXS ={waxsx.position}")
 
     yield from bps.mv(
-        usaxs_slit.v_size, terms.SAXS.v_size.get(),
-        usaxs_slit.h_size, terms.SAXS.h_size.get(),
-        guard_slit.v_size, terms.SAXS.guard_v_size.get(),
-        guard_slit.h_size, terms.SAXS.guard_h_size.get(),
+        usaxs_slit.v_size, snap.SAXS.v_size,
+        usaxs_slit.h_size, snap.SAXS.h_size,
+        guard_slit.v_size, snap.SAXS.guard_v_size,
+        guard_slit.h_size, snap.SAXS.guard_h_size,
         user_data.sample_thickness, thickness,
         terms.WAXS.collecting, 1,
         #user_data.collection_in_progress, 1,
@@ -953,9 +994,9 @@ def WAXS(pos_X, pos_Y, thickness, scan_title, md=None):
         mono_shutter, "open",
         monochromator.feedback.on, MONO_FEEDBACK_OFF,
         ti_filter_shutter, "open",
-        waxs_det.cam.num_images, terms.WAXS.num_images.get(),
-        waxs_det.cam.acquire_time, terms.WAXS.acquire_time.get(),
-        waxs_det.cam.acquire_period, terms.WAXS.acquire_time.get() + 0.004,
+        waxs_det.cam.num_images, snap.WAXS.num_images,
+        waxs_det.cam.acquire_time, snap.WAXS.acquire_time,
+        waxs_det.cam.acquire_period, snap.WAXS.acquire_time + 0.004,
         timeout=MASTER_TIMEOUT,
     )
     yield from bps.install_suspender(suspend_BeamInHutch)
@@ -978,8 +1019,8 @@ def WAXS(pos_X, pos_Y, thickness, scan_title, md=None):
 
     old_delay = scaler0.delay.get()
     yield from bps.mv(
-        scaler1.preset_time, terms.WAXS.acquire_time.get() + 1,
-        scaler0.preset_time, 1.2*terms.WAXS.acquire_time.get() + 1,
+        scaler1.preset_time, snap.WAXS.acquire_time + 1,
+        scaler0.preset_time, 1.2*snap.WAXS.acquire_time + 1,
         scaler0.count_mode, "OneShot",
         scaler1.count_mode, "OneShot",
 
@@ -991,7 +1032,7 @@ def WAXS(pos_X, pos_Y, thickness, scan_title, md=None):
         scaler0.delay, 0,
         terms.SAXS_WAXS.start_exposure_time, ts,
         user_data.state,
-            f"WAXS collection for {terms.WAXS.acquire_time.get()} s",
+            f"WAXS collection for {snap.WAXS.acquire_time} s",
         timeout=MASTER_TIMEOUT,
     )
 
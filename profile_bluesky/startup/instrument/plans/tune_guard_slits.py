@@ -18,6 +18,7 @@ from bluesky import plan_stubs as bps
 from bluesky.utils import FailedStatus
 from collections import defaultdict
 import datetime
+import numpy as np
 from ophyd import Kind
 import pyRestTable
 
@@ -29,8 +30,9 @@ from ..devices import terms
 from ..devices import ti_filter_shutter
 from ..devices import UPD_SIGNAL
 from ..devices import user_data
-from ..framework import RE
+from ..framework import RE, traced_plan
 from ..utils.derivative import numerical_derivative
+from ..utils.derivative import savitzky_golay_derivative
 from ..utils.peak_centers import peak_center
 from .filters import insertTransmissionFilters
 from .mode_changes import mode_USAXS
@@ -40,6 +42,90 @@ from .requested_stop import IfRequestedStopBeforeNextScan
 class GuardSlitTuneError(RuntimeError): ...    # custom error
 
 
+def _blade_edge_scan_(axis, center, width, num):
+    """plan: (internal) scan blade across ``center``, returns (x, y) arrays"""
+    yield from bps.mv(axis, center)
+    scaler0.select_channels([UPD_SIGNAL.chname.get()])
+    scaler0.channels.chan01.kind = Kind.config
+
+    tuner = TuneAxis([scaler0], axis, signal_name=UPD_SIGNAL.chname.get())
+    yield from tuner.tune(width=width, num=num)
+    return np.array(tuner.peaks.x_data), np.array(tuner.peaks.y_data)
+
+
+def _adaptive_blade_edge_(axis, start, end, ct_time):
+    """
+    plan: (internal) find blade edge with a coarse scan, then finer scans
+
+    The first scan (``guard_slit.edge_coarse_points``) brackets
+    the edge over the full range, from start to end.
+    Each refinement scan (``guard_slit.edge_fine_points``) covers
+    ``guard_slit.edge_span_factor`` edge widths around the edge
+    found by the previous scan.  The edge is the peak of the
+    smoothed derivative of diode vs. position.
+
+    Returns (position, width) of the edge from the last scan.
+    Raises ``GuardSlitTuneError`` (or ``ValueError`` from
+    the analysis) if the edge is not found.
+    Restores the axis position and count time in all cases.
+    """
+    old_ct_time = scaler0.preset_time.get()
+    old_position = axis.position
+    center = (start + end)/2
+    scan_width = end - start
+    yield from bps.mv(scaler0.preset_time, ct_time)
+
+    try:
+        num = guard_slit.edge_coarse_points
+        for scan_number in range(1 + guard_slit.edge_refinements):
+            x, y = yield from _blade_edge_scan_(axis, center, scan_width, num)
+            if len(x) < num:
+                raise GuardSlitTuneError(f"{axis.name}: scan incomplete")
+            if scan_number == 0:
+                diff = abs(y[0] - y[-1])
+                if diff < guard_slit.tuning_intensity_threshold:
+                    raise GuardSlitTuneError(
+                        f"{axis.name}: Not enough intensity change,"
+                        f" {diff} < {guard_slit.tuning_intensity_threshold}."
+                    )
+
+            xp, yp = savitzky_golay_derivative(x, y)
+            # edge as a positive peak of dy/dx: orient by the overall
+            # change of intensity *and* the scan direction (top and
+            # outboard blades scan with negative width: x descends)
+            yp = np.clip(np.sign((y[-1] - y[0]) * (x[-1] - x[0])) * yp, 0, None)
+            if yp.sum() <= 0:
+                raise GuardSlitTuneError(
+                    f"{axis.name}: no edge in the derivative of the scan."
+                )
+            position, width = peak_center(xp, yp)
+            if not min(x) <= position <= max(x):
+                raise GuardSlitTuneError(
+                    f"{axis.name}: Computed edge position {position}"
+                    f" outside of scan {min(x)} .. {max(x)}."
+                )
+            logger.info(
+                "%s: scan %d of %d points, edge at %g, width %g",
+                axis.name, scan_number+1, len(x), position, width)
+
+            # next scan: finer steps around this edge
+            step = abs(x[-1] - x[0]) / (len(x) - 1)
+            span = max(guard_slit.edge_span_factor * abs(width), 4 * step)
+            scan_width = np.copysign(min(abs(scan_width), span), scan_width)
+            center = position
+            num = guard_slit.edge_fine_points
+    except Exception:
+        yield from bps.mv(scaler0.preset_time, old_ct_time, axis, old_position)
+        raise
+
+    yield from bps.mv(
+        scaler0.preset_time, old_ct_time,
+        axis, old_position,             # reset position for other scans
+        )
+    return position, abs(width)
+
+
+@traced_plan("tune")
 def tune_GslitsCenter():
     """
     plan: optimize the guard slits' position
@@ -203,6 +289,22 @@ def _USAXS_tune_guardSlits():
 
     def tune_blade_edge(axis, start, end, steps, ct_time, results):
         logger.info(f"{axis.name}: scan from {start} to {end}")
+        if guard_slit.adaptive_edge_search:
+            try:
+                position, width = yield from _adaptive_blade_edge_(
+                    axis, start, end, ct_time)
+                width *= guard_slit.scale_factor   # expand a bit
+                logger.info(f"{axis.name}: will be tuned to {position}")
+                logger.info(f"{axis.name}: width = {width}")
+                results["width"] = width
+                results["position"] = position
+                return
+            except (GuardSlitTuneError, ValueError) as exc:
+                logger.warning(
+                    "%s: adaptive edge search failed: %s"
+                    "  Scan full range with %d points.",
+                    axis.name, exc, steps)
+
         old_ct_time = scaler0.preset_time.get()
         old_position = axis.position
 
@@ -368,6 +470,7 @@ def _unstick_GslitsSizeMotors():
 
     logger.info("Workaround Complete.")
 
+@traced_plan("tune")
 def tune_GslitsSize():
     """
     plan: optimize the guard slits' gap
@@ -403,6 +506,7 @@ def tune_GslitsSize():
     logger.info(f"Guard slit now: V={guard_slit.v_size.get()} and H={guard_slit.h_size.get()}")
 
 
+@traced_plan("tune")
 def tune_Gslits():
     """
     plan: scan and find optimal guard slit positions
@@ -10,7 +10,6 @@ __all__ = [
 from ..session_logs import logger
 logger.info(__file__)
 
-from apstools.plans import addDeviceDataAsStream
 from bluesky import plan_stubs as bps
 from bluesky import preprocessors as bpp
 from collections import OrderedDict
@@ -26,6 +25,7 @@ from ..devices import terms
 from ..devices import ti_filter_shutter
 from ..devices import upd_controls, I0_controls, I00_controls, trd_controls
 from ..devices import user_data
+from .batched_stream import BatchedStream
 
 
 ### notes for preliminary testing
@@ -162,8 +162,10 @@ def uascan(
         """triangulate offset, given angle of rotation"""
         return dist * math.tan(angle*math.pi/180)
 
-    @bpp.run_decorator(md=_md)
-    def _scan_():
+    # readings of each point, emitted in pages of several points
+    primary = BatchedStream(read_devices, "primary")
+
+    def _points_():
         count_time = count_time_base
 
         ar0 = terms.USAXS.center.AR.get()
@@ -222,7 +224,7 @@ def uascan(
             yield from bps.wait(group="uascan_count")               # wait for the scaler
 
             # collect data for the primary stream
-            yield from addDeviceDataAsStream(read_devices, "primary")
+            yield from primary.read_point()
 
             if useDynamicTime:
                 if i < intervals/3:
@@ -232,6 +234,11 @@ def uascan(
                 else:
                     count_time = 2*count_time_base
 
+    @bpp.run_decorator(md=_md)
+    def _scan_():
+        # emit the waiting points, also when the scan is interrupted
+        yield from bpp.finalize_wrapper(_points_(), primary.flush)
+
     def _after_scan_():
         yield from bps.mv(
             # indicate USAXS scan is not running
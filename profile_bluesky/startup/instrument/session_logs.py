@@ -1,11 +1,29 @@
 """
 configure session logging
+
+The handlers of the session logger (console and rotating file)
+run in a separate thread (``logging.handlers.QueueListener``).
+A logging call only puts its record on a queue: the message is
+formatted (``%``-style arguments merged) and written by the
+listener thread.  Pass arguments, not f-strings, so that messages
+which are not logged are never formatted::
+
+    logger.debug("saveFile(name=%r, data=%s)", label, value)
+
+Only arguments that cannot change before the listener formats them
+(``str``, numbers, ``None``, ``short_repr``) are left for the
+listener.  With any other argument (a list, an array, a device),
+the message is merged in the caller's thread.
 """
 
-__all__ = ['logger', ]
+__all__ = ['logger', 'queue_handler', ]
 
+import atexit
 import logging
+import logging.handlers
+import numbers
 import os
+import queue
 import stdlogpj
 
 _log_path = os.path.join(os.getcwd(), ".logs")
@@ -30,6 +48,42 @@ logger = stdlogpj.standard_logging_setup(
     backupCount=9)
 logger.setLevel(logging.DEBUG)
 
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Put records on the queue as-is: the listener formats the message."""
+
+    # arguments with these types are formatted later, by the listener
+    deferred_types = (str, bytes, numbers.Number, type(None))
+    # usaxs_support.saveFlyData.short_repr (that module runs standalone)
+    deferred_type_names = ("short_repr",)
+
+    def _deferred_(self, arg):
+        return (
+            isinstance(arg, self.deferred_types)
+            or type(arg).__name__ in self.deferred_type_names)
+
+    def prepare(self, record):
+        # QueueHandler.prepare() formats the message in the caller's thread
+        args = record.args or ()
+        if isinstance(args, dict):
+            args = args.values()    # logger.debug("%(name)s", dict(name=...))
+        if not all(self._deferred_(arg) for arg in args):
+            # the argument might change before the listener formats it
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_log_queue = queue.SimpleQueue()
+queue_handler = DeferredQueueHandler(_log_queue)
+_listener = logging.handlers.QueueListener(
+    _log_queue, *logger.handlers, respect_handler_level=True)
+for _handler in list(logger.handlers):
+    logger.removeHandler(_handler)
+logger.addHandler(queue_handler)
+_listener.start()
+atexit.register(_listener.stop)     # write the waiting records at exit
+
 logger.info('#'*60 + " startup")
 logger.info('logging started')
-logger.info(f'logging level = {logger.level}')
+logger.info('logging level = %d', logger.level)
@@ -0,0 +1,79 @@
+
+"""
+measure the time to import each module of the instrument package
+
+Import this module as early as possible (just after ``session_logs``).
+Modules imported after this are timed.
+
+EXAMPLE::
+
+    In [1]: startup_report()
+"""
+
+__all__ = ['startup_report', ]
+
+from .session_logs import logger
+logger.info(__file__)
+
+import importlib.machinery
+import pyRestTable
+import sys
+import time
+
+PACKAGE = __name__.rsplit(".", 1)[0]
+
+import_times = {}       # module name: (total seconds, self seconds)
+_child_time_stack = []  # time spent in imports nested within each import
+
+
+class _ImportTimer(object):
+    """meta path finder: time execution of each module in this package"""
+
+    def find_spec(self, fullname, path, target=None):
+        if not fullname.startswith(PACKAGE + "."):
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def timed_exec_module(module):
+            t0 = time.time()
+            _child_time_stack.append(0)
+            try:
+                exec_module(module)
+            finally:
+                total = time.time() - t0
+                children = _child_time_stack.pop()
+                if len(_child_time_stack) > 0:
+                    _child_time_stack[-1] += total
+                import_times[fullname] = (total, total - children)
+
+        spec.loader.exec_module = timed_exec_module
+        return spec
+
+
+_import_timer = _ImportTimer()
+sys.meta_path.insert(0, _import_timer)
+
+
+def startup_report(print_enable=True):
+    """
+    Table of module import times, then device connection times.
+
+    Modules are sorted by the time spent in each module itself
+    (*self*), not counting the other package modules it imports.
+    """
+    t = pyRestTable.Table()
+    t.labels = "module self_s total_s".split()
+    for name, (total, own) in sorted(
+            import_times.items(), key=lambda kv: -kv[1][1]):
+        t.addRow((name, f"{own:.3f}", f"{total:.3f}"))
+    t.addRow(("TOTAL", f"{sum(v[1] for v in import_times.values()):.3f}", ""))
+    if print_enable:
+        print(t)
+
+    if f"{PACKAGE}.devices" in sys.modules:
+        from .devices import device_connections
+        device_connections.report(print_enable=print_enable)
+    return t
@@ -3,7 +3,7 @@
 derivative of two vectors: y(x), returns y'(x)
 """
 
-__all__ = ["numerical_derivative",]
+__all__ = ["numerical_derivative", "savitzky_golay_derivative",]
 
 from ..session_logs import logger
 logger.info(__file__)
@@ -28,3 +28,37 @@ def numerical_derivative(x, y):
     xp = (x2+x1)/2              # midpoint
     yp = (y2-y1) / (x2-x1)      # slope
     return xp, yp
+
+
+def savitzky_golay_derivative(x, y, window=7, order=2):
+    """
+    smoothed first derivative yp(xp) of y(x), returns tuple (xp, yp)
+
+    Savitzky-Golay: a polynomial of ``order`` is fitted (least squares)
+    to each ``window`` of points, all windows at once with numpy.
+    The slope of each fit is the derivative at the window center.
+    Less sensitive to counting noise than :func:`numerical_derivative`.
+    The x values need not be evenly spaced.
+
+    here, xp is x without ``window//2`` points at each end
+    """
+    if len(x) != len(y):
+        raise ValueError(f"X & Y arrays must be same length to analyze, x:{len(x)} y:{len(y)}")
+    if window % 2 == 0:
+        window += 1     # must be odd
+    if order >= window:
+        raise ValueError(f"order ({order}) must be less than window ({window})")
+    if len(x) < window:
+        raise ValueError(f"Need more points to analyze, received {len(x)}")
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+
+    half = window // 2
+    # indices of every window, one row per window
+    windows = np.arange(len(x) - 2*half)[:, None] + np.arange(window)
+    xp = x[half:len(x)-half]
+    dx = x[windows] - xp[:, None]
+    vandermonde = dx[..., None] ** np.arange(order+1)
+    coefficients = np.linalg.pinv(vandermonde) @ y[windows][..., None]
+    yp = coefficients[:, 1, 0]     # slope at the window center
+    return xp, yp
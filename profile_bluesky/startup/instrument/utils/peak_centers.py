@@ -3,7 +3,7 @@
 center-of-mass and sqrt(variance) of y(x)
 """
 
-__all__ = ["peak_center",]
+__all__ = ["peak_center", "peak_statistics",]
 
 from ..session_logs import logger
 logger.info(__file__)
@@ -40,3 +40,53 @@ def peak_center(x, y, use_area=False):
     variance = sum_yxx / sum_y - x_bar*x_bar
     width = 2 * np.sqrt(abs(variance))
     return x_bar, width
+
+
+def peak_statistics(x, y):
+    """
+    peak statistics of y vs. x, same terms as ``PeakStats``
+
+    Computed with numpy arrays in one pass (no callback needed).
+    Returns dictionary with keys:
+    ``x y cen com fwhm min max crossings``
+    where ``min`` and ``max`` are ``(x, y)`` tuples and
+    ``x`` & ``y`` locate the maximum.
+    """
+    if len(x) != len(y):
+        raise ValueError(f"X & Y arrays must be same length to analyze, x:{len(x)} y:{len(y)}")
+    if len(x) < 3:
+        raise ValueError(f"Need more points to analyze, received {len(x)}")
+
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+    order = np.argsort(x)
+    x = x[order]
+    y = y[order]
+
+    i_max = y.argmax()
+    i_min = y.argmin()
+    sum_y = y.sum()
+    com = (x*y).sum() / sum_y if sum_y != 0 else None
+
+    # interpolate where y crosses the half-way value
+    mid = (y[i_max] + y[i_min]) / 2
+    above = (y > mid).astype(int)
+    i = np.flatnonzero(np.diff(above))
+    crossings = x[i] + (mid - y[i]) * (x[i+1] - x[i]) / (y[i+1] - y[i])
+    if len(crossings) >= 2:
+        cen = (crossings[0] + crossings[-1]) / 2
+        fwhm = abs(crossings[-1] - crossings[0])
+    else:
+        cen = x[i_max]
+        fwhm = None
+
+    return dict(
+        x=x[i_max],
+        y=y[i_max],
+        cen=cen,
+        com=com,
+        fwhm=fwhm,
+        min=(x[i_min], y[i_min]),
+        max=(x[i_max], y[i_max]),
+        crossings=crossings,
+    )
@@ -0,0 +1,263 @@
+"""
+least-squares fit of a peak profile to y(x)
+
+Profiles: gaussian, lorentzian, pseudo_voigt (each with a constant background).
+The fit locates the center with fewer points than ``PeakStats`` needs.
+"""
+
+__all__ = [
+    "benchmark_peak_fits",
+    "fit_peak",
+    "PEAK_FIT_PROFILES",
+    "tune_data_from_runs",
+    ]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+import numpy as np
+import pyRestTable
+import time
+
+from .peak_centers import peak_statistics
+
+FOUR_LN2 = 4 * np.log(2)
+LOGIT_LIMIT = 12        # fitted logit(eta) within +/- this: 6e-6 < eta < 1 - 6e-6
+
+
+def _gaussian_(x, amplitude, center, fwhm, background):
+    return amplitude * np.exp(-FOUR_LN2 * ((x - center) / fwhm)**2) + background
+
+
+def _lorentzian_(x, amplitude, center, fwhm, background):
+    return amplitude / (1 + 4 * ((x - center) / fwhm)**2) + background
+
+
+def _pseudo_voigt_(x, amplitude, center, fwhm, background, eta):
+    g = np.exp(-FOUR_LN2 * ((x - center) / fwhm)**2)
+    lz = 1 / (1 + 4 * ((x - center) / fwhm)**2)
+    return amplitude * (eta * lz + (1 - eta) * g) + background
+
+
+PEAK_FIT_PROFILES = dict(
+    gaussian=_gaussian_,
+    lorentzian=_lorentzian_,
+    pseudo_voigt=_pseudo_voigt_,
+)
+PARAMETER_NAMES = "amplitude center fwhm background eta".split()
+
+
+def fit_peak(x, y, profile="gaussian", max_iterations=50, tolerance=1e-8):
+    """
+    fit a peak profile to y(x) by Levenberg-Marquardt, returns dict
+
+    Points are weighted by counting statistics (``1/max(y,1)``).
+    The Jacobian is computed for all points at once by
+    finite differences (steps scaled by the data, not by the
+    parameter values, which may be zero).  The pseudo-Voigt
+    ``eta`` is fitted as ``logit(eta)`` so it stays within [0, 1]
+    without a zero Jacobian column.
+
+    PARAMETERS
+
+    x, y : [float]
+        data to be fitted (at least one more point than parameters)
+    profile : str
+        one of ``PEAK_FIT_PROFILES``
+
+    RETURNS
+
+    dictionary with keys:
+    ``profile converged iterations`` and each fitted parameter with
+    its uncertainty (``center``, ``center_error``, ...),
+    ``chi2_reduced`` and ``r_squared`` (fit quality)
+    """
+    if profile not in PEAK_FIT_PROFILES:
+        raise ValueError(
+            f"profile must be one of {list(PEAK_FIT_PROFILES)}, gave {profile}"
+        )
+    profile_func = PEAK_FIT_PROFILES[profile]
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+    n_params = 5 if profile == "pseudo_voigt" else 4
+    if len(x) != len(y):
+        raise ValueError(f"X & Y arrays must be same length to analyze, x:{len(x)} y:{len(y)}")
+    if len(x) <= n_params:
+        raise ValueError(f"Need more points to analyze, received {len(x)}")
+
+    # starting values from the peak statistics
+    stats = peak_statistics(x, y)
+    x_span = x.max() - x.min()
+    fwhm = stats["fwhm"] or x_span / 4
+    amplitude = stats["max"][1] - stats["min"][1]
+    p = np.array(
+        # eta: logit(0.5) = 0
+        [amplitude, stats["cen"], fwhm, stats["min"][1], 0]
+    )[:n_params]
+    # finite-difference step of each parameter
+    steps = 1e-6 * np.array(
+        [max(abs(amplitude), 1), x_span, x_span, max(abs(amplitude), 1), 1]
+    )[:n_params]
+
+    def func(x, *params):
+        if n_params == 5:
+            # fitted: logit(eta), limited so the slope is never zero
+            params = params[:4] + (1 / (1 + np.exp(-params[4])),)
+        return profile_func(x, *params)
+
+    weights = 1 / np.maximum(np.abs(y), 1)      # Poisson: 1/sigma^2
+
+    def chi2(params):
+        r = y - func(x, *params)
+        return (weights * r * r).sum()
+
+    def jacobian(params):
+        f0 = func(x, *params)
+        # one column per parameter
+        shifted = params + np.diag(steps)
+        return np.array([(func(x, *q) - f0) / h for q, h in zip(shifted, steps)]).T
+
+    lam = 1e-3
+    c2 = chi2(p)
+    converged = False
+    for iteration in range(1, max_iterations+1):
+        J = jacobian(p)
+        JTW = J.T * weights
+        A = JTW @ J
+        g = JTW @ (y - func(x, *p))
+        # Marquardt damping, never zero on the diagonal
+        damping = np.maximum(np.diag(A), 1e-12 * np.trace(A))
+        M = A + lam * np.diag(damping)
+        try:
+            step = np.linalg.solve(M, g)
+            if n_params == 5 and abs(p[4]) >= LOGIT_LIMIT and step[4] * p[4] > 0:
+                # eta at its limit, pushed outward: fit the others
+                step[4] = 0
+                step[:4] = np.linalg.solve(M[:4, :4], g[:4])
+        except np.linalg.LinAlgError:
+            break
+        trial = p + step
+        if n_params == 5:
+            trial[4] = np.clip(trial[4], -LOGIT_LIMIT, LOGIT_LIMIT)
+        c2_trial = chi2(trial)
+        if c2_trial < c2:
+            improvement = (c2 - c2_trial) / max(c2, 1e-300)
+            # step relative to the data scales (not eta: it may saturate)
+            relative_step = np.abs((trial - p)[:4] / (1e6 * steps[:4])).max()
+            p, c2 = trial, c2_trial
+            lam /= 10
+            if improvement < tolerance or relative_step < tolerance:
+                converged = True
+                break
+        else:
+            lam *= 10
+            if lam > 1e10:
+                converged = True    # cannot improve further
+                break
+
+    dof = max(len(x) - n_params, 1)
+    chi2_reduced = c2 / dof
+    J = jacobian(p)
+    try:
+        covariance = np.linalg.inv((J.T * weights) @ J) * chi2_reduced
+        errors = np.sqrt(np.abs(np.diag(covariance)))
+    except np.linalg.LinAlgError:
+        errors = np.full(n_params, np.inf)
+
+    ss_res = ((y - func(x, *p))**2).sum()
+    ss_tot = ((y - y.mean())**2).sum()
+
+    result = dict(
+        profile=profile,
+        converged=converged,
+        iterations=iteration,
+        chi2_reduced=chi2_reduced,
+        r_squared=1 - ss_res / ss_tot if ss_tot > 0 else 0,
+    )
+    for key, value, error in zip(PARAMETER_NAMES, p, errors):
+        result[key] = value
+        result[f"{key}_error"] = error
+    if n_params == 5:
+        eta = 1 / (1 + np.exp(-p[4]))
+        result["eta"] = eta
+        result["eta_error"] = eta * (1 - eta) * errors[4]   # d(eta)/d(logit)
+    result["fwhm"] = abs(result["fwhm"])
+    return result
+
+
+def tune_data_from_runs(runs):
+    """
+    return list of (x, y) arrays from previous tune runs (databroker headers)
+
+    The axis & signal names are taken from the ``tune_parameters``
+    in each run's start document.
+    """
+    data = []
+    for run in runs:
+        tp = run.start.get("tune_parameters", {})
+        x_name, y_name = tp.get("x_axis"), tp.get("y_axis")
+        if x_name is None or y_name is None:
+            continue
+        table = run.table()
+        if x_name in table and y_name in table and len(table) > 0:
+            data.append((table[x_name].values, table[y_name].values))
+    return data
+
+
+def benchmark_peak_fits(tune_data, strides=(1, 2, 3, 5), time_per_point=0.2,
+                        choices=("com", "cen", "gaussian", "lorentzian", "pseudo_voigt"),
+                        reference="com"):
+    """
+    compare tune accuracy against tune time on recorded tune data, returns table
+
+    For each recorded tune, use every ``stride``-th point to mimic
+    a tune with fewer points.  Each result is compared with the
+    ``reference`` choice using *all* points (default: center of
+    mass, as used now for tuning).
+    ``time_per_point`` (count time plus settling) estimates
+    the tune time saved.
+
+    EXAMPLE::
+
+        runs = db(plan_name="UsaxsTuneAxis.tune")
+        tune_data = tune_data_from_runs(list(runs)[-50:])
+        print(benchmark_peak_fits(tune_data))
+    """
+    t = pyRestTable.Table()
+    t.labels = "choice stride points tune_time_s rms_error/fwhm failures analysis_ms".split()
+    for choice in choices:
+        for stride in strides:
+            errors, points, failures, elapsed = [], [], 0, 0
+            for x, y in tune_data:
+                stats = peak_statistics(x, y)
+                if not stats["fwhm"]:
+                    continue
+                if reference in PEAK_FIT_PROFILES:
+                    target = fit_peak(x, y, reference)["center"]
+                else:
+                    target = stats[reference]
+                xs, ys = x[::stride], y[::stride]
+                t0 = time.time()
+                try:
+                    if choice in PEAK_FIT_PROFILES:
+                        center = fit_peak(xs, ys, choice)["center"]
+                    else:
+                        center = peak_statistics(xs, ys)[choice]
+                except (ValueError, TypeError):
+                    failures += 1
+                    continue
+                elapsed += time.time() - t0
+                errors.append((center - target) / stats["fwhm"])
+                points.append(len(xs))
+            if len(errors) == 0:
+                continue
+            t.addRow((
+                choice,
+                stride,
+                f"{np.mean(points):.1f}",
+                f"{np.mean(points)*time_per_point:.1f}",
+                f"{np.sqrt(np.mean(np.square(errors))):.4f}",
+                failures,
+                f"{1000*elapsed/len(errors):.2f}",
+            ))
+    return t
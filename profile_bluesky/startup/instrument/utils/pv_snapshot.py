@@ -0,0 +1,151 @@
+
+"""
+snapshot of all EPICS PVs used by the instrument
+
+The snapshot (a JSON file) is the PV database of the simulated IOC
+(``usaxs_support/sim_ioc.py``) used to run this package offline.
+Write it at the beamline, with the IOCs running.
+
+EXAMPLE::
+
+    In [1]: write_pv_snapshot("usaxs_pvs.json")
+"""
+
+__all__ = [
+    'pv_names',
+    'write_pv_snapshot',
+]
+
+from ..session_logs import logger
+logger.info(__file__)
+
+import epics
+import json
+import numpy as np
+from ophyd import Device
+from ophyd.signal import EpicsSignalBase
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+
+# PVs read directly (with PyEpics) instead of by ophyd
+EXTRA_PVS = [
+    "9idcLAX:femto:model",
+]
+SAVE_FLY_DATA_CONFIG = "usaxs_support/saveFlyData.xml"
+
+
+def pv_names(namespace=None):
+    """
+    Return set of EPICS PV names of all ophyd signals in namespace.
+
+    Default: all modules of the instrument package and the IPython
+    user namespace.
+    """
+    if namespace is None:
+        from IPython import get_ipython
+        package = __name__.split(".")[0]
+        namespaces = [
+            vars(module)
+            for name, module in list(sys.modules.items())
+            if name.startswith(package + ".") and module is not None
+        ]
+        ipython = get_ipython()
+        if ipython is not None:
+            namespaces.append(ipython.user_ns)
+    else:
+        namespaces = [namespace]
+
+    names = set()
+
+    def add_signal(signal):
+        for attr in ("pvname", "setpoint_pvname"):
+            pvname = getattr(signal, attr, None)
+            if pvname:
+                names.add(pvname)
+
+    for ns in namespaces:
+        for obj in list(ns.values()):
+            if isinstance(obj, Device):
+                for walk in obj.walk_signals(include_lazy=True):
+                    add_signal(walk.item)
+            elif isinstance(obj, EpicsSignalBase):
+                add_signal(obj)
+    return names
+
+
+def _xml_pv_names_(filename):
+    """PV names in the fly scan configuration file"""
+    if not os.path.exists(filename):
+        return set()
+    root = ET.parse(filename).getroot()
+    return set(
+        node.attrib["pvname"]
+        for node in root.iter()
+        if "pvname" in node.attrib
+    )
+
+
+def _json_value_(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _native_type_(pv_type):
+    """native type of a PyEpics PV type name, such as "double" for "time_double"."""
+    for prefix in ("time_", "ctrl_"):
+        if pv_type.startswith(prefix):
+            return pv_type[len(prefix):]
+    return pv_type
+
+
+def write_pv_snapshot(filename, namespace=None, extra_pvs=(), timeout=5):
+    """
+    Write name, type, value, and limits of every instrument PV to JSON file.
+
+    PVs are connected in parallel, waiting up to ``timeout`` seconds
+    for all of them.  PVs not connected are recorded (not served by
+    the simulated IOC).
+
+    RETURNS
+
+    number of PVs connected and not connected
+    """
+    names = pv_names(namespace)
+    names |= set(EXTRA_PVS) | set(extra_pvs)
+    names |= _xml_pv_names_(SAVE_FLY_DATA_CONFIG)
+
+    # all connect at once; form="native": pv.type is the native type ("double", "enum", ...)
+    pvs = {nm: epics.get_pv(nm, form="native") for nm in sorted(names)}
+    expires = time.time() + timeout
+    snapshot = {}
+    for nm, pv in pvs.items():
+        connected = pv.wait_for_connection(timeout=max(0.001, expires - time.time()))
+        entry = dict(connected=connected)
+        if connected:
+            ctrl = pv.get_ctrlvars() or {}
+            char_array = _native_type_(pv.type) == "char" and pv.count > 1
+            entry.update(
+                type=_native_type_(pv.type),
+                count=pv.count,
+                value=_json_value_(pv.get(as_string=char_array, use_monitor=False)),
+                enum_strs=list(pv.enum_strs or []) if _native_type_(pv.type) == "enum" else None,
+                units=ctrl.get("units"),
+                precision=ctrl.get("precision"),
+                lower_ctrl_limit=_json_value_(ctrl.get("lower_ctrl_limit")),
+                upper_ctrl_limit=_json_value_(ctrl.get("upper_ctrl_limit")),
+            )
+        snapshot[nm] = entry
+
+    with open(filename, "w") as f:
+        json.dump(snapshot, f, indent=1)
+    num_connected = sum(1 for v in snapshot.values() if v["connected"])
+    logger.info(
+        "Wrote %d PVs to %s (%d not connected)",
+        len(snapshot), filename, len(snapshot) - num_connected)
+    return num_connected, len(snapshot) - num_connected
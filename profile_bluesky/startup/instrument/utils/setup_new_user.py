@@ -17,6 +17,7 @@ from ..devices import apsbss as apsbss_object
 from ..devices import user_data
 from ..framework import RE
 from ..framework import specwriter
+from ..framework import specwriter_submit
 from .check_file_exists import filename_exists
 from apstools.utils import cleanupText
 import apstools.beamtime.apsbss
@@ -189,10 +190,11 @@ def _setSpecFileName(path, scan_id=1):
     fname = os.path.join(path, f"{os.path.basename(path)}.dat")
     if filename_exists(fname):
         logger.warning(">>> file already exists: %s <<<", fname)
-        specwriter.newfile(fname, RE=RE)
+        # wait: the SPEC file is written from another thread
+        specwriter_submit(specwriter.newfile, fname, RE=RE).result()
         handled = "appended"
     else:
-        specwriter.newfile(fname, scan_id=scan_id, RE=RE)
+        specwriter_submit(specwriter.newfile, fname, scan_id=scan_id, RE=RE).result()
         handled = "created"
     logger.info(f"SPEC file name : {specwriter.spec_filename}")
     logger.info(f"File will be {handled} at end of next bluesky scan.")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Live plots of bluesky documents, in a process separate from data collection.
+
+Receives documents from the bluesky session (``live_plots`` in
+``instrument.framework``) over a local socket and plots them with a
+BestEffortCallback (plots and peak statistics, no table).  The
+bluesky session starts this viewer, it can also be started by hand
+(only one viewer can listen on the port).
+
+Besides the documents, the session can send:
+
+* ``("trim", dict(n=5))``: keep only the last 5 lines on each plot
+
+USAGE::
+
+    python live_plot_viewer.py [--host localhost] [--port 5578]
+"""
+
+from bluesky.callbacks.best_effort import BestEffortCallback
+from multiprocessing.connection import Listener
+import argparse
+import logging
+import matplotlib.pyplot as plt
+
+logger = logging.getLogger("live_plot_viewer")
+
+AUTHKEY = b"usaxs live plots"   # same as VIEWER_AUTHKEY in the session
+REFRESH_S = 0.05                # GUI event loop runs this long between reads
+
+
+def trim_lines(n):
+    """Keep only the last ``n`` lines on each axes of every figure."""
+    for num in plt.get_fignums():
+        for ax in plt.figure(num).axes:
+            lines = ax.get_lines()
+            for line in lines[:-n]:
+                line.remove()
+            if len(lines) > n:
+                ax.legend()
+
+
+class Viewer(object):
+    """Receive documents from one session at a time, plot them."""
+
+    def __init__(self, host, port):
+        self.listener = Listener((host, port), authkey=AUTHKEY)
+        self.bec = BestEffortCallback()
+        self.bec.disable_table()
+        self.bec.disable_baseline()
+        self.bec.disable_heading()
+
+    def handle(self, name, doc):
+        if name == "trim":
+            trim_lines(doc["n"])
+            return
+        self.bec(name, doc)
+        if name == "stop" and len(self.bec.peaks.cen) > 0:
+            logger.info("peaks: %s", self.bec.peaks)
+
+    def serve(self):
+        plt.ion()
+        while True:
+            logger.info("waiting for a session at %s", self.listener.address)
+            connection = self.listener.accept()
+            logger.info("session connected")
+            try:
+                while True:
+                    # read all waiting documents, then let the GUI draw
+                    while connection.poll():
+                        self.handle(*connection.recv())
+                    plt.pause(REFRESH_S)
+            except (EOFError, OSError):
+                logger.info("session disconnected")
+            finally:
+                connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5578)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    Viewer(args.host, args.port).serve()
+
+
+if __name__ == "__main__":
+    main()
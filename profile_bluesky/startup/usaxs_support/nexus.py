@@ -93,26 +93,26 @@ class NeXus_Structure(object):
         # first, validate configuration file against an XML Schema
         path = os.path.split(os.path.abspath(__file__))[0]
         xml_schema_file = os.path.join(path, XSD_SCHEMA_FILE)
-        logger.debug(f"XML Schema file: {xml_schema_file}")
+        logger.debug("XML Schema file: %s", xml_schema_file)
         xmlschema_doc = lxml_etree.parse(xml_schema_file)
         xmlschema = lxml_etree.XMLSchema(xmlschema_doc)
 
-        logger.debug(f"XML configuration file: {self.config_filename}")
+        logger.debug("XML configuration file: %s", self.config_filename)
         config = lxml_etree.parse(self.config_filename)
         if not xmlschema.validate(config):
             # XML file is not valid, let lxml report what is wrong as an exception
             log = xmlschema.error_log    # access more details
-            logger.debug(f"XML file invalid: {log}")
+            logger.debug("XML file invalid: %s", log)
             xmlschema.assertValid(config)   # basic exception report
 
         # safe to proceed parsing the file
         root = config.getroot()
         if root.tag != "saveFlyData":
-            logger.debug(f"XML root tag incorrect: '{root.tag}' != 'saveFlyData'")
+            logger.debug("XML root tag incorrect: '%s' != 'saveFlyData'", root.tag)
             raise RuntimeError("XML file not valid for configuring saveFlyData")
 
         self.creator_version = root.attrib['version']
-        logger.debug(f"XML file creator version: {self.creator_version}")
+        logger.debug("XML file creator version: %s", self.creator_version)
 
         node = root.xpath('/saveFlyData/triggerPV')[0]
         self.trigger_pv = node.attrib['pvname']
@@ -124,7 +124,7 @@ class NeXus_Structure(object):
 
         node = root.xpath('/saveFlyData/timeoutPV')[0]
         self.timeout_pv = node.attrib['pvname']
-        logger.debug(f"XML file timeout PV: {self.timeout_pv}")
+        logger.debug("XML file timeout PV: %s", self.timeout_pv)
 
         # initial default value set in this code
         # pull default poll_interval_s from XML Schema (XSD) file
@@ -135,7 +135,7 @@ class NeXus_Structure(object):
         # allow XML configuration to override default trigger_poll_interval_s
         default_value = float(xsd_node[0].get('default', TRIGGER_POLL_INTERVAL_s))
         self.trigger_poll_interval_s = node.get('poll_time_s', default_value)
-        logger.debug(f"trigger_poll_interval_s: {self.trigger_poll_interval_s}")
+        logger.debug("trigger_poll_interval_s: %s", self.trigger_poll_interval_s)
 
         nx_structure = root.xpath('/saveFlyData/NX_structure')[0]
         for node in nx_structure.xpath('//group'):
@@ -382,7 +382,7 @@ def _developer():
     for _i in range(500):   # limited wait to connect
         verdict = mgr.connected
         t = time.time() - t0
-        logger.debug(f"connected: {verdict}  time:{t}")
+        logger.debug("connected: %s  time:%.4f", verdict, t)
         if verdict or t > timeout:
             break       # seems to take about 60-70 ms with current XML file
         time.sleep(0.005)
@@ -394,7 +394,7 @@ def _developer():
     conn = [pv
             for pv in mgr.pv_registry.values()
             if pv.ophyd_signal.connected]
-    logger.debug(f"connected {len(conn)} of {len(mgr.pv_registry)} PVs in {time.time()-t0:.04f} s")
+    logger.debug("connected %d of %d PVs in %.04f s", len(conn), len(mgr.pv_registry), time.time()-t0)
 
 
 if __name__ == "__main__":
@@ -10,6 +10,7 @@ import datetime
 import logging
 import numpy
 import os
+import reprlib
 import sys
 import time
 # from importlib import import_module
@@ -44,6 +45,33 @@ NOT_CONNECTED_TEXT = "not connected"
 NO_DATA_TEXT = "no data"
 
 
+class short_repr(object):
+    '''
+    abbreviated repr of a (large) value, made only if the message is logged
+
+    Use as an argument of a logging call (%-style)::
+
+        logger.debug("makeDataset(name=%r, data=%s)", name, short_repr(data))
+    '''
+
+    __slots__ = ("value",)
+    _repr = reprlib.Repr()
+    _repr.maxstring = 80
+    _repr.maxother = 80
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        v = self.value
+        if isinstance(v, numpy.ndarray):
+            text = numpy.array2string(v, threshold=6, edgeitems=3)
+            return f"{text} shape={v.shape} dtype={v.dtype}"
+        return self._repr.repr(v)
+
+    __repr__ = __str__
+
+
 class SaveFlyScan(object):
     '''watch trigger PV, save data to NeXus file after scan is done'''
 
@@ -107,7 +135,7 @@ class SaveFlyScan(object):
                 value = pv_spec.ophyd_signal.get()
             if value is None:
                 value = NO_DATA_TEXT
-            logger.debug("saveFile(): writing {pv_spec}")
+            logger.debug("preliminaryWriteFile(): writing %s", pv_spec.label)
             if not isinstance(value, numpy.ndarray):
                 value = [value]
             else:
@@ -120,16 +148,16 @@ class SaveFlyScan(object):
 
             hdf5_parent = pv_spec.group_parent.hdf5_group
             try:
-                logger.debug('preliminaryWriteFile(name="%s", data=%s)', pv_spec.label, value)
+                logger.debug('preliminaryWriteFile(name="%s", data=%s)', pv_spec.label, short_repr(value))
                 ds = makeDataset(hdf5_parent, pv_spec.label, value)
                 if ds is None:
-                    logger.debug(f"Could not create {pv_spec.label}")
+                    logger.debug("Could not create %s", pv_spec.label)
                     continue
                 self._attachEpicsAttributes(ds, pv_spec)
                 addAttributes(ds, **pv_spec.attrib)
             except IOError as e:
                 logger.debug("preliminaryWriteFile():")
-                logger.debug("ERROR: pv_spec.label=%s, value=%s", pv_spec.label, str(value))
+                logger.debug("ERROR: pv_spec.label=%s, value=%s", pv_spec.label, short_repr(value))
                 logger.debug("MESSAGE: %s", e)
                 logger.debug("RESOLUTION: writing as error message string")
                 makeDataset(hdf5_parent, pv_spec.label, [str(e).encode('utf8')])
@@ -169,13 +197,13 @@ class SaveFlyScan(object):
 
             hdf5_parent = pv_spec.group_parent.hdf5_group
             try:
-                logger.debug(f"saveFile(name=\"{pv_spec.label}\", data={value})")
+                logger.debug('saveFile(name="%s", data=%s)', pv_spec.label, short_repr(value))
                 ds = makeDataset(hdf5_parent, pv_spec.label, value)
                 self._attachEpicsAttributes(ds, pv_spec)
                 addAttributes(ds, **pv_spec.attrib)
             except Exception as e:
                 logger.debug("saveFile():")
-                logger.debug("ERROR: pv_spec.label=%s, value=%s", pv_spec.label, str(value))
+                logger.debug("ERROR: pv_spec.label=%s, value=%s", pv_spec.label, short_repr(value))
                 logger.debug("MESSAGE: %s", e)
                 logger.debug("RESOLUTION: writing as error message string")
                 makeDataset(hdf5_parent, pv_spec.label, [str(e).encode('utf8')])
@@ -198,7 +226,7 @@ class SaveFlyScan(object):
             self.mgr._connect_ophyd()
             for _i in range(50):   # limited wait to connect
                 verdict = self.mgr.connected
-                logger.debug(f"connected: {verdict}  time:{time.time()-t0}")
+                logger.debug("connected: %s  time:%.4f", verdict, time.time()-t0)
                 if verdict:
                     break       # seems to take about 60-70 ms with current XML file
                 time.sleep(0.01)
@@ -302,14 +330,14 @@ def makeDataset(parent, name, data = None, **attr):
             if len(data) == 1 and isinstance(data[0], str):
                 data = [numpy.string_(data[0])]
                 # logger.debug("converting [string] to [numpy.string_]")
-            logger.debug(f"makeDataset(name='{name}', data={data})")
+            logger.debug("makeDataset(name=%r, data=%s)", name, short_repr(data))
             obj = parent.create_dataset(name, data=data)
         except TypeError as _exc:
-            logger.debug(f"Could not save name = {name} : {_exc}")
+            logger.debug("Could not save name = %s : %s", name, _exc)
             obj = None
             # raise _exc            # if want to re-raise the exception
         except Exception as _exc:
-            logger.debug(f"Unexpected Exception: {name} : {_exc}")
+            logger.debug("Unexpected Exception: %s : %s", name, _exc)
             obj = None
 
         #obj = parent.create_dataset(name, data=data, compression="gzip")
@@ -370,7 +398,7 @@ def main():
     except TimeoutException as _exception_message:
         logger.warning("exiting because of timeout!!!!!!!")
         sys.exit(1)     # exit silently with error, 1=TIMEOUT
-    logger.debug('wrote file: ' + dataFile)
+    logger.debug('wrote file: %s', dataFile)
 
 
 def developer_bluesky():
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+
+"""
+Simulated 9-ID-C USAXS IOC, to run the instrument package offline.
+
+Serves (with caproto) every PV in a snapshot file, written at the
+beamline by ``write_pv_snapshot()`` (in ``instrument.utils``).
+Each PV starts with its snapshot value and accepts puts.
+These records are also simulated:
+
+* scaler records: ``.CNT`` counts for ``.TP`` seconds, channel counts
+  from the photocurrents in ``DETECTORS`` and the amplifier gains
+* motor records: ``.VAL`` moves ``.RBV`` at ``.VELO``,
+  with ``.DMOV`` & ``.MOVN``, ``.STOP`` stops
+* Femto autorange sequence programs: ``reqrange`` sets ``gain``,
+  in automatic modes the gain follows the count rate after each count
+* Struck 3820 MCS: ``EraseStart`` acquires channels of ``Dwell``
+  seconds until ``StopAll``, ``PresetReal``, or ``NuseAll`` channels
+* fly scan busy record (``9idcLAX:USAXSfly:Start``): acquires
+  ``FS_NumberOfPoints`` MCS channels in ``FS_ScanTime``, then done
+
+Intensities of detectors listed in ``PEAKS`` depend on motor
+positions (peak centered where the motor was in the snapshot).
+The fly scan does not move the motors, so its data has no peak.
+
+USAGE::
+
+    # at the beamline, in the bluesky session:
+    write_pv_snapshot("usaxs_pvs.json")
+
+    # offline, start the simulator:
+    python sim_ioc.py usaxs_pvs.json
+
+    # then, in another shell, start the bluesky session:
+    export EPICS_CA_ADDR_LIST=127.0.0.1
+    export EPICS_CA_AUTO_ADDR_LIST=NO
+    blueskyUSAXS
+"""
+
+from caproto import ChannelChar
+from caproto import ChannelDouble
+from caproto import ChannelEnum
+from caproto import ChannelInteger
+from caproto import ChannelString
+from caproto.asyncio.server import run
+
+import argparse
+import asyncio
+import json
+import logging
+import numpy as np
+import time
+
+logger = logging.getLogger("sim_ioc")
+
+UPDATE_PERIOD = 0.05        # seconds between updates of moving things
+VFC_MAX_RATE = 1.0e6        # voltage-to-frequency converter saturates, counts/s
+AUTORANGE_DOWN_RATE = 900000    # counts/s, sequence program lowers gain above
+AUTORANGE_UP_RATE = 30000       # counts/s, sequence program raises gain below
+
+SCALERS = ["9idcLAX:vsc:c0", "9idcLAX:vsc:c1"]
+STRUCK = "9idcLAX:3820:"
+FLY_SCAN = dict(
+    busy="9idcLAX:USAXSfly:Start",
+    scan_time="9idcLAX:USAXS:FS_ScanTime",
+    num_points="9idcLAX:USAXS:FS_NumberOfPoints",
+)
+FEMTO_MODEL = "9idcLAX:femto:model"
+UPD_AMPLIFIER = {
+    "DLCPA200": "9idcLAX:pd01:seq01:",
+    "DDPCA300": "9idcLAX:pd01:seq02:",
+}
+
+# photocurrent (A) of each detector, read by scaler channel
+# amplifier: prefix of autorange sequence program, "UPD": from femto model
+DETECTORS = {
+    "9idcLAX:vsc:c0.S2": dict(amplifier="9idcLAX:pd02:seq01:", current=2e-7),    # I0
+    "9idcLAX:vsc:c0.S3": dict(amplifier="9idcLAX:pd03:seq01:", current=1e-7),    # I00
+    "9idcLAX:vsc:c0.S4": dict(amplifier="UPD", current=5e-8),                     # UPD
+    "9idcLAX:vsc:c0.S5": dict(amplifier="9idcLAX:pd05:seq01:", current=1e-8),    # TRD
+}
+# Struck MCS channel: detector (scaler channel) it also reads
+MCS_DETECTORS = {
+    "mca2": "9idcLAX:vsc:c0.S2",    # I0
+    "mca3": "9idcLAX:vsc:c0.S4",    # UPD
+}
+# detector intensity vs. motor position, relative to the motor's snapshot position
+PEAKS = {
+    "9idcLAX:vsc:c0.S4": [
+        dict(motor="9idcLAX:aero:c0:m1", fwhm=0.0005, background=1e-4),   # ar
+    ],
+}
+DARK_RATE = 20      # counts/s
+
+
+class _PutHook(object):
+    """Call ``on_put(value)`` (a coroutine) after each put from a client."""
+
+    on_put = None
+
+    async def write_from_dbr(self, *args, **kwargs):
+        result = await super().write_from_dbr(*args, **kwargs)
+        if self.on_put is not None:
+            await self.on_put(self.value)
+        return result
+
+
+class SimChar(_PutHook, ChannelChar): ...
+class SimDouble(_PutHook, ChannelDouble): ...
+class SimEnum(_PutHook, ChannelEnum): ...
+class SimInteger(_PutHook, ChannelInteger): ...
+class SimString(_PutHook, ChannelString): ...
+
+
+INTEGER_TYPES = ("short", "int", "long")
+
+
+def make_channel(entry):
+    """Return caproto channel for this snapshot entry (ValueError: unknown type)."""
+    pv_type = entry["type"]
+    for prefix in ("time_", "ctrl_"):     # snapshot written with a promoted type
+        if pv_type.startswith(prefix):
+            pv_type = pv_type[len(prefix):]
+    count = entry.get("count") or 1
+    value = entry["value"]
+    if pv_type == "enum":
+        enum_strs = entry["enum_strs"] or ["0"]
+        if not isinstance(value, str):
+            value = enum_strs[int(value or 0)]
+        return SimEnum(value=value, enum_strings=enum_strs)
+    if pv_type == "string":
+        return SimString(value=str(value or ""))
+    if pv_type == "char" and count > 1:
+        return SimChar(value=str(value or ""), max_length=count)
+
+    kwargs = {}
+    if count > 1:
+        kwargs["max_length"] = count
+        value = list(value or [0])
+    for key in "lower_ctrl_limit upper_ctrl_limit units".split():
+        if entry.get(key) is not None:
+            kwargs[key] = entry[key]
+    if pv_type in ("double", "float"):
+        if entry.get("precision") is not None:
+            kwargs["precision"] = entry["precision"]
+        return SimDouble(value=value if count > 1 else float(value or 0), **kwargs)
+    if pv_type in INTEGER_TYPES or pv_type == "char":
+        return SimInteger(value=value if count > 1 else int(value or 0), **kwargs)
+    raise ValueError(f"unknown PV type: {entry['type']}")
+
+
+class Simulator(object):
+    """
+    Behavior of the simulated records.
+
+    PARAMETERS
+
+    pvdb : dict
+        caproto channels, keyed by PV name
+    speed : float
+        run this many times faster than real time
+    """
+
+    def __init__(self, pvdb, speed=1.0, seed=None):
+        self.pvdb = pvdb
+        self.speed = speed
+        self.rng = np.random.default_rng(seed)
+        self.tasks = {}
+
+        model = self.value(FEMTO_MODEL, "DLCPA200")
+        self.detectors = {}
+        for channel, cfg in DETECTORS.items():
+            cfg = dict(cfg)
+            if cfg["amplifier"] == "UPD":
+                cfg["amplifier"] = UPD_AMPLIFIER.get(model, UPD_AMPLIFIER["DLCPA200"])
+            self.detectors[channel] = cfg
+        self.peaks = {
+            channel: [
+                dict(peak, center=self.value(peak["motor"] + ".RBV", 0))
+                for peak in peaks
+            ]
+            for channel, peaks in PEAKS.items()
+        }
+
+    def value(self, pvname, default=None):
+        channel = self.pvdb.get(pvname)
+        return default if channel is None else channel.value
+
+    async def write(self, pvname, value):
+        channel = self.pvdb.get(pvname)
+        if channel is not None:
+            if isinstance(channel, ChannelEnum) and not isinstance(value, str):
+                value = channel.enum_strings[int(value)]
+            await channel.write(value)
+
+    def on_put(self, pvname, coroutine):
+        channel = self.pvdb.get(pvname)
+        if channel is not None:
+            channel.on_put = coroutine
+            return True
+        return False
+
+    def start_task(self, key, coroutine):
+        """Start a background task, replacing any running with same key."""
+        self.stop_task(key)
+        self.tasks[key] = asyncio.get_event_loop().create_task(coroutine)
+
+    def stop_task(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self.speed)
+
+    # - - - - - - - - - - - - - - - - detectors
+
+    def amplifier_range(self, prefix):
+        """index of present range of this autorange sequence program"""
+        channel = self.pvdb[prefix + "reqrange"]
+        return channel.enum_strings.index(channel.value)
+
+    def detector_rate(self, detector):
+        """count rate (counts/s) of detector (scaler channel name)"""
+        cfg = self.detectors[detector]
+        current = cfg["current"]
+        for peak in self.peaks.get(detector, []):
+            x = self.value(peak["motor"] + ".RBV", 0) - peak["center"]
+            g = np.exp(-4 * np.log(2) * (x / peak["fwhm"])**2)
+            current *= peak["background"] + (1 - peak["background"]) * g
+        gain = self.value(cfg["amplifier"] + "gain", 1e6)
+        counts_per_volt = self.value(cfg["amplifier"] + "vfc", 1e5) or 1e5
+        return min(current * gain * counts_per_volt, VFC_MAX_RATE) + DARK_RATE
+
+    def counts(self, rate, seconds):
+        return float(self.rng.poisson(max(rate * seconds, 0)))
+
+    async def autorange(self, detector, rate):
+        """sequence program: step the gain one range, if needed"""
+        prefix = self.detectors[detector]["amplifier"]
+        if self.value(prefix + "mode") not in ("automatic", "auto+background"):
+            return
+        gains = [self.value(f"{prefix}gain{n}", 0) for n in range(5)]
+        order = list(np.argsort(gains))     # lowest to highest gain
+        position = order.index(self.amplifier_range(prefix))
+        if rate > AUTORANGE_DOWN_RATE and position > 0:
+            position -= 1
+        elif rate < AUTORANGE_UP_RATE and position < len(order) - 1:
+            position += 1
+        else:
+            return
+        await self.set_amplifier_range(prefix, int(order[position]))
+
+    async def set_amplifier_range(self, prefix, index):
+        channel = self.pvdb[prefix + "reqrange"]
+        await channel.write(channel.enum_strings[index])
+        await self.write(prefix + "gain", self.value(f"{prefix}gain{index}"))
+
+    def add_amplifier(self, prefix):
+        async def put_reqrange(value):
+            await self.set_amplifier_range(prefix, self.amplifier_range(prefix))
+
+        return self.on_put(prefix + "reqrange", put_reqrange)
+
+    # - - - - - - - - - - - - - - - - scaler
+
+    def add_scaler(self, prefix):
+        async def put_count(value):
+            if value in (0, "Done"):
+                return
+            preset = self.value(prefix + ".TP", 1.0)
+            await self.sleep(self.value(prefix + ".DLY", 0) + preset)
+            for n in range(1, 33):
+                pvname = f"{prefix}.S{n}"
+                if pvname not in self.pvdb:
+                    continue
+                if n == 1:      # clock
+                    counts = self.value(prefix + ".FREQ", 1e7) * preset
+                elif pvname in self.detectors:
+                    rate = self.detector_rate(pvname)
+                    counts = self.counts(rate, preset)
+                    await self.autorange(pvname, rate)
+                else:
+                    counts = 0
+                await self.write(pvname, counts)
+            await self.write(prefix + ".T", preset)
+            await self.write(prefix + ".CNT", 0)    # done
+
+        return self.on_put(prefix + ".CNT", put_count)
+
+    # - - - - - - - - - - - - - - - - motor
+
+    def add_motor(self, prefix):
+        async def move(target):
+            start = self.value(prefix + ".RBV", 0)
+            velocity = abs(self.value(prefix + ".VELO", 1)) or 1
+            await self.write(prefix + ".DMOV", 0)
+            await self.write(prefix + ".MOVN", 1)
+            try:
+                t0 = time.time()
+                duration = abs(target - start) / velocity / self.speed
+                while time.time() - t0 < duration:
+                    await asyncio.sleep(UPDATE_PERIOD)
+                    fraction = min(1, (time.time() - t0) / duration)
+                    await self.write(prefix + ".RBV", start + fraction * (target - start))
+                await self.write(prefix + ".RBV", target)
+            finally:
+                await self.write(prefix + ".MOVN", 0)
+                await self.write(prefix + ".DMOV", 1)
+
+        async def put_setpoint(value):
+            self.start_task(prefix, move(value))
+
+        async def put_stop(value):
+            if value:
+                self.stop_task(prefix)
+                await self.write(prefix + ".VAL", self.value(prefix + ".RBV"))
+
+        for field in ".RBV .DMOV .VELO".split():
+            if prefix + field not in self.pvdb:
+                return False
+        self.on_put(prefix + ".STOP", put_stop)
+        return self.on_put(prefix + ".VAL", put_setpoint)
+
+    # - - - - - - - - - - - - - - - - Struck MCS & fly scan
+
+    async def acquire_mcs(self, dwell, max_channels, preset_time=0):
+        """acquire channels of Struck MCS, each ``dwell`` seconds"""
+        clock_rate = self.value(STRUCK + "clock_frequency", 50e6)
+        spectra = {f"mca{n}": [] for n in range(1, 5)}
+        await self.write(STRUCK + "Acquiring", 1)
+        t0 = time.time()
+        try:
+            while len(spectra["mca1"]) < max_channels:
+                await asyncio.sleep(UPDATE_PERIOD)
+                elapsed = (time.time() - t0) * self.speed
+                if 0 < preset_time < elapsed:
+                    break
+                while len(spectra["mca1"]) < min(int(elapsed / dwell), max_channels):
+                    spectra["mca1"].append(clock_rate * dwell)
+                    for mca in "mca2 mca3 mca4".split():
+                        detector = MCS_DETECTORS.get(mca)
+                        rate = 0 if detector is None else self.detector_rate(detector)
+                        spectra[mca].append(self.counts(rate, dwell))
+                await self.write(STRUCK + "CurrentChannel", len(spectra["mca1"]))
+                await self.write(STRUCK + "ElapsedReal", elapsed)
+        finally:
+            for mca, spectrum in spectra.items():
+                await self.write(f"{STRUCK}{mca}.VAL", spectrum or [0])
+                await self.write(f"{STRUCK}{mca}.NORD", len(spectrum))
+            await self.write(STRUCK + "Acquiring", 0)
+
+    def add_struck(self):
+        async def put_erase_start(value):
+            if value:
+                dwell = self.value(STRUCK + "Dwell", 0.001) or 0.001
+                self.start_task(STRUCK, self.acquire_mcs(
+                    dwell,
+                    int(self.value(STRUCK + "NuseAll", 8000)),
+                    self.value(STRUCK + "PresetReal", 0)))
+
+        async def put_stop_all(value):
+            if value:
+                self.stop_task(STRUCK)
+
+        self.on_put(STRUCK + "StopAll", put_stop_all)
+        return self.on_put(STRUCK + "EraseStart", put_erase_start)
+
+    def add_fly_scan(self):
+        async def put_busy(value):
+            if value in (0, "Done"):
+                return
+            scan_time = self.value(FLY_SCAN["scan_time"], 60)
+            num_points = max(1, int(self.value(FLY_SCAN["num_points"], 8000)))
+            await self.acquire_mcs(scan_time / num_points, num_points)
+            await self.write(FLY_SCAN["busy"], 0)   # done
+
+        return self.on_put(FLY_SCAN["busy"], put_busy)
+
+    def setup(self):
+        """Add the simulated records found in the PV database."""
+        added = []
+        for prefix in SCALERS:
+            if self.add_scaler(prefix):
+                added.append(prefix)
+        for cfg in self.detectors.values():
+            if self.add_amplifier(cfg["amplifier"]):
+                added.append(cfg["amplifier"])
+        for pvname in self.pvdb:
+            if pvname.endswith(".VAL") and self.add_motor(pvname[:-4]):
+                added.append(pvname[:-4])
+        if self.add_struck():
+            added.append(STRUCK)
+        if self.add_fly_scan():
+            added.append(FLY_SCAN["busy"])
+        return added
+
+
+def load_snapshot(filename):
+    """Return PV database (caproto channels) from snapshot file."""
+    with open(filename, "r") as f:
+        snapshot = json.load(f)
+    pvdb = {}
+    for pvname, entry in snapshot.items():
+        if not entry["connected"]:
+            continue
+        try:
+            pvdb[pvname] = make_channel(entry)
+        except Exception as exc:
+            logger.warning("%s not served: %s", pvname, exc)
+    return pvdb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("snapshot", help="JSON file from write_pv_snapshot()")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="run this many times faster than real time")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random number seed, for repeatable counts")
+    parser.add_argument("--interfaces", nargs="*", default=["127.0.0.1"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    pvdb = load_snapshot(args.snapshot)
+    added = Simulator(pvdb, speed=args.speed, seed=args.seed).setup()
+    logger.info("serving %d PVs, simulating %d records", len(pvdb), len(added))
+    run(pvdb, interfaces=args.interfaces)
+
+
+if __name__ == "__main__":
+    main()
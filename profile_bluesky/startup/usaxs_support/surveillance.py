@@ -20,76 +20,239 @@ EXAMPLE::
             yield from bp.scan([detector], motor, 10, 20, 120)
             t += t_step
 
+The archive (``ARCHIVE_PATH``) keeps each unique text and source
+file once, named by its content hash, and an index (``index.jsonl``)
+of every call.  Repeated calls with the same code cost a hash lookup.
 """
 
 from collections import OrderedDict
 import datetime
+import hashlib
 import inspect
+import json
 import logging
 import os
 import psutil
+import queue
 import resource
+import threading
+import uuid
 
 logger = logging.getLogger(os.path.split(__file__)[-1])
 
+ARCHIVE_PATH = "/share1/log/macros"
 
-def _write_archive_dict_(archive_dict):
+
+class ContentArchive(object):
     """
-    writes dictionary contents to USAXS archive file as text, returns revised dict
+    archive that stores each unique text once, by its content hash
+
+    Each text is written once to ``objects/<hh>/<sha256>.txt``
+    (``hh``: first two digits of the hash).  Each call of
+    :meth:`record` appends one line (JSON) to ``index.jsonl`` with the
+    hashes of its texts (and a unique ``id``), so the history of
+    invocations is kept while repeated texts are not written again.
+    An index entry is written in one ``write()``; if a try is repeated
+    (after an error), an entry already in the index is not written
+    again.  The writes are done, in order, by a background thread:
+    :meth:`flush` waits for them.
+    If ``writer`` is set (an object with ``submit(func, *args)`` and
+    ``flush()``), it does the writes instead.  The caller only computes
+    hashes: the search of the archive and the reading of source files
+    are also done in the background.
+
+    EXAMPLE::
+
+        archive = ContentArchive("/share1/log/macros")
+        digest = archive.store(text)            # hash lookup if known
+        archive.record(kind="commands", text=digest)
+        archive.flush()                         # (optional) wait for the writes
     """
-    ts = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-
-    archive_path = "/share1/log/macros"
-    archive_file = os.path.join(archive_path, f"{ts}-usaxs.txt")
-    archive_dict["archive_file"] = archive_file
-    archive_dict["archive_timestamp"] = ts
-
-    with open(archive_file, "w") as fp:
-        for k, v in archive_dict.items():
-            fp.write(f"# {k}:\n")
-            if k == "source_contents":
-                fp.write("-"*20 + " source " + "-"*20 + "\n")
-                fp.writelines(v)
-                fp.write("-"*20 + " source " + "-"*20 + "\n")
-            else:
-                fp.write(f"{v}\n")
-            fp.write("\n")
-        logger.debug("Archive: %s", archive_file)
-    return archive_dict
-
-
-def _create_archive_dict_(frame, text):
-    """creates an archive dictionary from a stack frame (from usaxs_support)"""
-    archive = OrderedDict()
-    archive["text"] = text
-    archive["source"] = frame.filename
-    archive["is_file"] = not frame.filename.startswith('<')
-    archive["line"] = frame.lineno
-    archive["caller"] = frame.function
-    archive["caller_code"] = ''.join(frame.code_context)
-    if archive["is_file"]:
-        if os.path.exists(frame.filename):
-            with open(frame.filename, "r") as fp:
-                archive["source_contents"] = fp.readlines()
-            logger.debug("source code file: %s", frame.filename)
-        else:
-            logger.debug("FileNotFound: %s", frame.filename)
-            archive["source_contents"] = "source not found"
-    return archive
+
+    index_file = "index.jsonl"
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self._known = None          # hashes already in the archive
+        self._index_tries = set()   # ids of index entries with a failed try
+        self._source_hashes = {}    # filename: ((mtime, size), hash)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self.writer = None          # optional: does the writes
+        self.stored = 0             # texts written
+        self.repeats = 0            # texts already archived
+
+    def object_file(self, digest):
+        """full name of the file with the text of ``digest``"""
+        return os.path.join(self.path, "objects", digest[:2], f"{digest}.txt")
+
+    def _load_known_(self):
+        known = set()
+        objects = os.path.join(self.path, "objects")
+        if os.path.exists(objects):
+            for _root, _dirs, files in os.walk(objects):
+                known.update(os.path.splitext(f)[0] for f in files)
+        return known
+
+    def store(self, text):
+        """archive ``text`` (if new), return its hash (sha256, hex)"""
+        digest = hashlib.sha256(text.encode("utf8")).hexdigest()
+        with self._lock:
+            if self._known is not None and digest in self._known:
+                self.repeats += 1
+                return digest
+        # the archive is searched (first use) by the writer, not the caller
+        self._submit_(self._store_, digest, text)
+        return digest
+
+    def record(self, source_files=None, **entry):
+        """
+        append an invocation (with archive hashes) to the index
+
+        ``source_files`` (``{key: filename}``): each file is archived
+        by the writer and its hash is added to the entry as ``key``.
+        """
+        entry = OrderedDict(
+            timestamp=datetime.datetime.now().isoformat(sep=" "),
+            id=uuid.uuid4().hex,
+            **entry)
+        self._submit_(self._record_, entry, dict(source_files or {}))
+        return entry
+
+    def read(self, digest):
+        """return the archived text of ``digest``"""
+        with open(self.object_file(digest), "r") as fp:
+            return fp.read()
+
+    def flush(self, timeout=None):
+        """wait for the waiting writes, return True if all were written"""
+        if self.writer is not None:
+            return self.writer.flush(timeout)
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put((done.set, ()))
+        return done.wait(timeout)
+
+    def _submit_(self, func, *args):
+        if self.writer is not None:
+            self.writer.submit(func, *args, description=f"archive {func.__name__}")
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._worker_, name="instrument_archive", daemon=True)
+            self._thread.start()
+        self._queue.put((func, args))
+
+    def _worker_(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception as exc:
+                logger.error("archive %s%s: %s", func.__name__, args[:1], exc)
+
+    def _store_(self, digest, text):
+        with self._lock:
+            if self._known is None:
+                self._known = self._load_known_()
+            if digest in self._known:
+                self.repeats += 1
+                return
+            self._known.add(digest)
+        self._write_object_(digest, text)
+
+    def _store_file_(self, filename):
+        """archive a source file, return its hash"""
+        if filename.startswith('<'):
+            return None
+        try:
+            st = os.stat(filename)
+        except FileNotFoundError:
+            logger.debug("FileNotFound: %s", filename)
+            return None
+        signature = (st.st_mtime, st.st_size)
+        cached = self._source_hashes.get(filename)
+        if cached is not None and cached[0] == signature:
+            return cached[1]    # same file as before: already archived
+        with open(filename, "r") as fp:
+            text = fp.read()
+        digest = hashlib.sha256(text.encode("utf8")).hexdigest()
+        self._store_(digest, text)
+        logger.debug("source code file: %s", filename)
+        self._source_hashes[filename] = (signature, digest)
+        return digest
+
+    def _record_(self, entry, source_files):
+        for key, filename in source_files.items():
+            entry[key] = self._store_file_(filename)
+        self._write_index_(json.dumps(entry), entry["id"])
+
+    def _write_object_(self, digest, text):
+        filename = self.object_file(digest)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            # write complete file then rename: no partial object if interrupted
+            with open(filename + ".part", "w") as fp:
+                fp.write(text)
+            os.replace(filename + ".part", filename)
+            with self._lock:
+                self._known.add(digest)     # (again, if a try failed)
+            self.stored += 1
+            logger.debug("Archive: %s", filename)
+        except Exception:
+            with self._lock:
+                self._known.discard(digest)     # try again next time
+            raise
+
+    def _write_index_(self, line, entry_id):
+        filename = os.path.join(self.path, self.index_file)
+        if entry_id in self._index_tries and self._in_index_(filename, entry_id):
+            self._index_tries.discard(entry_id)
+            return      # the failed try did write it
+        self._index_tries.add(entry_id)
+        os.makedirs(self.path, exist_ok=True)
+        # one write() of the complete line, appended
+        fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (line + "\n").encode("utf8"))
+        finally:
+            os.close(fd)
+        self._index_tries.discard(entry_id)
+
+    def _in_index_(self, filename, entry_id, tail=65536):
+        """is ``entry_id`` in the last ``tail`` bytes of the index?"""
+        if not os.path.exists(filename):
+            return False
+        with open(filename, "rb") as fp:
+            fp.seek(max(0, os.path.getsize(filename) - tail))
+            return f'"id": "{entry_id}"'.encode("utf8") in fp.read()
+
+
+archive = ContentArchive()
 
 
 def instrument_archive(text=None):
     """
-    copies caller function (and its source file) to permanent archive, returns dict
+    copies caller function (and its source file) to permanent archive, returns text
 
-    Any text supplied by the caller will be written at the start of the archive.
+    Any text supplied by the caller is archived with the source file.
+    Each unique text and source file is written only once
+    (see :class:`ContentArchive`), each call is added to the index.
     """
     frameinfo = inspect.getouterframes(inspect.currentframe(), 2)
-    logger.debug("instrument_archive() called from: %s", frameinfo[1].filename)
-    
-    # archive text and caller source file
-    _write_archive_dict_(
-        _create_archive_dict_(frameinfo[1], text or "")
+    frame = frameinfo[1]
+    logger.debug("instrument_archive() called from: %s", frame.filename)
+
+    archive.record(
+        kind="instrument_archive",
+        text=archive.store(text or ""),
+        source=frame.filename,
+        source_files=dict(source_contents=frame.filename),
+        line=frame.lineno,
+        caller=frame.function,
+        caller_code=''.join(frame.code_context or []),
     )
 
     # only return the text